@@ -0,0 +1,232 @@
+# async_robot.py - asyncio orchestrator mode (run with: python main.py --async)
+import asyncio
+import robot_clock
+from main import DeliveryRobot
+from route_planner import LivePlan
+from config import FIREBASE_POLL_INTERVAL, SENSOR_SAMPLE_INTERVAL
+
+
+class CompartmentActuator:
+    """Stand-in for CompartmentController that routes servo moves through
+    the orchestrator's actuation task. Called from worker threads; blocks
+    the calling thread until the servo move is done."""
+
+    def __init__(self, get_controller, loop, queue):
+        self.get_controller = get_controller  # Waits for servo homing on first use
+        self.loop = loop
+        self.queue = queue
+
+    @property
+    def controller(self):
+        return self.get_controller()
+
+    async def _request(self, method, compartment):
+        done = self.loop.create_future()
+        await self.queue.put((method, compartment, done))
+        await done
+
+    def _submit(self, method, compartment):
+        future = asyncio.run_coroutine_threadsafe(self._request(method, compartment), self.loop)
+        future.result()
+
+    def open_compartment(self, compartment_num):
+        self._submit('open_compartment', compartment_num)
+
+    def close_compartment(self, compartment_num):
+        self._submit('close_compartment', compartment_num)
+
+    def close_all(self):
+        # Used during cleanup, when the event loop may already be gone
+        self.controller.close_all()
+
+    def cleanup(self):
+        self.controller.cleanup()
+
+
+class AsyncDeliveryRobot(DeliveryRobot):
+    """DeliveryRobot driven by independent asyncio tasks.
+
+    - firebase_task:   polls /delivery_requests into a shared snapshot
+    - navigation_task: plans and drives the live route, one marker at a time
+    - sensor_task:     samples IR + ultrasonic while stationary
+    - actuation_task:  executes servo moves (parallel across compartments)
+
+    Blocking hardware and network calls run in the default executor, so the
+    robot keeps watching for new requests while it waits at a stop. The
+    theft monitor runs on its own thread, as in DeliveryRobot.
+    """
+
+    def __init__(self):
+        self.actuator = None
+        super().__init__()
+        self.snapshot = []
+        self.sensors = None
+        self.loop = None
+
+    @property
+    def compartments(self):
+        if self.actuator is not None:
+            return self.actuator
+        return DeliveryRobot.compartments.fget(self)
+
+    def create_theft_monitor(self, line_follower, firebase):
+        # Distance comes from sensor_task's samples - one ultrasonic user at a time
+        return super().create_theft_monitor(line_follower, firebase,
+                                            read_distance=lambda: (self.sensors or {}).get('distance'))
+
+    def start(self):
+        """Run the orchestrator until shutdown"""
+        print("🚀 Starting delivery robot (async orchestrator)...")
+        interrupted_tasks = self.prepare_run()
+        self.firebase.start_heartbeat()
+        if self.theft is not None:
+            self.theft.start()
+        print("📡 Listening for new delivery requests...\n")
+
+        try:
+            asyncio.run(self.run(interrupted_tasks))
+        except KeyboardInterrupt:
+            print("\n⚠️ Interrupted by user")
+        except Exception as e:
+            print(f"\n❌ Error in orchestrator: {e}")
+            self.handle_critical_error(e)
+        finally:
+            self.cleanup()
+
+    async def run(self, interrupted_tasks=()):
+        self.loop = asyncio.get_running_loop()
+        self.snapshot_event = asyncio.Event()
+        self.moving = asyncio.Event()
+        self.compartment_queue = asyncio.Queue()
+        self.compartment_locks = {}
+        self.actuator = CompartmentActuator(lambda: DeliveryRobot.compartments.fget(self),
+                                            self.loop, self.compartment_queue)
+
+        background = [
+            asyncio.create_task(self.firebase_task()),
+            asyncio.create_task(self.sensor_task()),
+            asyncio.create_task(self.actuation_task())
+        ]
+        try:
+            if interrupted_tasks and self.can_accept_work():
+                print(f"\n♻️  Resuming {len(interrupted_tasks)} interrupted task(s) at Room {self.current_location}")
+                await self.in_executor(self.handle_tasks, interrupted_tasks, True)
+            await self.navigation_task()
+        finally:
+            for task in background:
+                task.cancel()
+            await asyncio.gather(*background, return_exceptions=True)
+            self.actuator = None
+
+    def in_executor(self, func, *args):
+        return self.loop.run_in_executor(None, func, *args)
+
+    # ---------- tasks ----------
+
+    async def firebase_task(self):
+        """Keep self.snapshot fresh; wake the navigator on every poll"""
+        while self.running:
+            deliveries = await self.in_executor(
+                lambda: self.firebase.get_active_deliveries(
+                    statuses=('pending', 'at_pickup', 'in_progress'), strict=True))
+            if deliveries is not None:
+                self.snapshot = deliveries
+                self.snapshot_event.set()
+            await asyncio.sleep(FIREBASE_POLL_INTERVAL)
+
+    async def sensor_task(self):
+        """Sample sensors while parked (line following owns them when moving)"""
+        while self.running:
+            if not self.moving.is_set():
+                ir = await self.in_executor(self.line_follower.read_sensors)
+                distance = await self.in_executor(self.obstacle_detector.get_distance)
+                self.sensors = {'ir': ir, 'distance': distance, 'time': robot_clock.monotonic()}
+            await asyncio.sleep(SENSOR_SAMPLE_INTERVAL)
+
+    async def actuation_task(self):
+        """Run servo moves - one at a time per compartment, compartments in parallel"""
+        while True:
+            method, compartment, done = await self.compartment_queue.get()
+            asyncio.create_task(self._actuate(method, compartment, done))
+
+    async def _actuate(self, method, compartment, done):
+        lock = self.compartment_locks.setdefault(compartment, asyncio.Lock())
+        async with lock:
+            try:
+                controller = self.actuator.controller
+                await self.in_executor(getattr(controller, method), compartment)
+                done.set_result(None)
+            except Exception as e:
+                done.set_exception(e)
+
+    async def navigation_task(self):
+        while self.running:
+            await self.snapshot_event.wait()
+            self.snapshot_event.clear()
+
+            # filter_new claims leases in fleet mode - keep it off the loop
+            deliveries = await self.in_executor(self.filter_new, [
+                d for d in self.snapshot if d.get('status') in ('pending', 'in_progress')
+            ])
+            if not deliveries:
+                self.moving.set()
+                try:
+                    await self.in_executor(self.idle)
+                finally:
+                    self.moving.clear()
+                continue
+
+            if not self.can_accept_work():
+                break
+            print(f"\n📋 Found {len(deliveries)} active delivery request(s)")
+            self.idle_since = None
+            route = self.plan_route(deliveries)
+            if not route:
+                print("📍 No deliveries to handle from current location")
+                continue
+
+            await self.execute_route_async(route)
+            print("\n✅ Current route completed!\n")
+
+    async def execute_route_async(self, route):
+        """Async twin of execute_route - merges the latest poll snapshot at
+        every marker instead of making a blocking Firebase request"""
+        plan = LivePlan(route, graph=self.graph)
+        await self.in_executor(self.allocate_compartments, plan)
+        self.state.set_route(plan.stops)
+        await self.in_executor(self.publish_etas, plan)
+
+        while plan.stops and self.running:
+            room, tasks = plan.stops[0]
+
+            if room != self.current_location:
+                await self.drive_segment(room, tasks)
+                await self.in_executor(self.merge_into_plan, plan, self.snapshot)
+                continue
+
+            plan.pop_stop()
+            self.state.set_route(plan.stops)
+            await self.in_executor(self.handle_tasks, tasks)
+
+            for delivery, action in tasks:
+                if delivery['id'] in self.cancelled_deliveries:
+                    plan.remove(delivery['id'])
+            await self.in_executor(self.merge_into_plan, plan, self.snapshot)
+
+    async def drive_segment(self, room, tasks):
+        next_room = self.graph.next_node(self.current_location, room)
+        if next_room == room:
+            print(f"\n🗺️ Next stop: Room {room}")
+        current_delivery_id = tasks[0][0]['id'] if tasks else None
+        if self.fleet is not None:
+            await self.in_executor(self.fleet.wait_for_clearance, next_room)
+
+        self.moving.set()
+        started = robot_clock.monotonic()
+        try:
+            await self.in_executor(self.drive, next_room, current_delivery_id)
+        finally:
+            self.moving.clear()
+        self.eta_model.record_segment(self.current_location, next_room, robot_clock.monotonic() - started)
+        self.current_location = next_room
+        self.state.set_location(next_room)
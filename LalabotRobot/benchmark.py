@@ -0,0 +1,199 @@
+"""
+Benchmark Suite - Fixed delivery scenarios with regression checks
+
+Runs the simulator (simulator.py) on a handful of seeded scenarios and
+compares the results with a saved baseline, so a change to the robot,
+planner or Firebase layer that costs throughput, latency, network traffic
+or CPU shows up as a FAIL instead of on the robot.
+
+    python benchmark.py                       # run all, compare with benchmark_baseline.json
+    python benchmark.py --save                # run all, make this the baseline
+    python benchmark.py --scenario flaky_network --out run.json
+
+Exit code 1 when any metric regressed past its tolerance.
+"""
+
+import json
+import os
+import sys
+import time
+
+from simulator import Simulation, DEFAULT_START
+from workload import Workload, RoomChoice
+from track_graph import TrackGraph
+from config import COMPARTMENT_COUNT, ROOM_COUNT
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# metric: (direction, tolerance) - 'higher' means bigger is better
+TOLERANCES = {
+    'deliveriesPerHour': ('higher', 0.05),
+    'pickupLatencyP50': ('lower', 0.10),
+    'pickupLatencyP90': ('lower', 0.10),
+    'deliveryLatencyP50': ('lower', 0.10),
+    'deliveryLatencyP90': ('lower', 0.10),
+    'firebaseCallsPerDelivery': ('lower', 0.05),
+    'firebaseBytesPerDelivery': ('lower', 0.05),
+    'cpuMsPerTick': ('lower', 0.5),  # Noisy and machine dependent - compare on the same box
+}
+
+
+# ---------- scenarios ----------
+
+def benchmark_graph():
+    """The default loop from config.py - never the locally surveyed
+    track_map.json / track_graph.json, so a re-survey never shows up as a regression"""
+    return TrackGraph.ring(ROOM_COUNT + 1)
+
+
+def _rooms():
+    return [node for node in benchmark_graph().stop_nodes() if node != 0]
+
+
+def single_delivery():
+    """One request on an idle robot - the latency floor"""
+    rooms = _rooms()
+    requests = [{'at': 60.0, 'pickup': rooms[0], 'destination': rooms[-1],
+                 'senderDelay': 30.0, 'receiverDelay': 60.0, 'noShow': False}]
+    return dict(requests=requests, hours=0.5)
+
+
+def full_compartments():
+    """Three requests per compartment within ten minutes, slow receivers"""
+    workload = Workload.bursty(18 * COMPARTMENT_COUNT, burst_size=3 * COMPARTMENT_COUNT, burst_spread=600,
+                               rooms=RoomChoice.uniform(_rooms()),
+                               receiver={'dist': 'uniform', 'low': 120, 'high': 300}, no_show_rate=0.0)
+    requests = workload.generate(1 / 6, DEFAULT_START, seed=1)
+    return dict(requests=requests, hours=2.0)
+
+
+def bursty_arrivals():
+    """Same mean rate as a steady day, arriving in bursts"""
+    workload = Workload.bursty(8, burst_size=4, burst_spread=300, rooms=RoomChoice.uniform(_rooms()))
+    return dict(requests=workload.generate(4, DEFAULT_START, seed=2), hours=4.0)
+
+
+def flaky_network():
+    """Steady traffic with 10% of Firebase requests failing"""
+    workload = Workload.poisson(6, rooms=RoomChoice.uniform(_rooms()))
+    return dict(requests=workload.generate(4, DEFAULT_START, seed=3), hours=4.0, failure_rate=0.1)
+
+
+SCENARIOS = {
+    'single_delivery': single_delivery,
+    'full_compartments': full_compartments,
+    'bursty_arrivals': bursty_arrivals,
+    'flaky_network': flaky_network,
+}
+
+
+# ---------- running and comparing ----------
+
+def run_scenario(name, seed=0):
+    """Simulate one scenario, return its benchmark metrics"""
+    setup = SCENARIOS[name]()
+    started = time.perf_counter()
+    simulation = Simulation(setup['requests'], hours=setup['hours'], seed=seed,
+                            failure_rate=setup.get('failure_rate', 0.0), graph=benchmark_graph())
+    report = simulation.run()
+    summary = report.summary()
+    delivered = max(1, len(report.completed))
+    return {
+        'requests': summary['requested'],
+        'completed': summary['completed'],
+        'deliveriesPerHour': summary['throughputPerHour'],
+        'pickupLatencyP50': summary['pickupLatency']['p50'],
+        'pickupLatencyP90': summary['pickupLatency']['p90'],
+        'deliveryLatencyP50': summary['deliveryLatency']['p50'],
+        'deliveryLatencyP90': summary['deliveryLatency']['p90'],
+        'firebaseCallsPerDelivery': round(report.firebase_requests / delivered, 1),
+        'firebaseBytesPerDelivery': round(report.firebase_bytes / delivered),
+        'firebaseFailures': report.firebase_failures,
+        'cpuMsPerTick': round(report.cpu_time * 1000 / max(1, report.ticks), 4),
+        'wallSeconds': round(time.perf_counter() - started, 2)
+    }
+
+
+def compare(results, baseline):
+    """[(scenario, metric, baseline, current, ok)] for every metric with a tolerance"""
+    rows = []
+    for name, metrics in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric, (direction, tolerance) in TOLERANCES.items():
+            before, now = previous.get(metric), metrics.get(metric)
+            if before is None or now is None:
+                continue
+            if direction == 'higher':
+                ok = now >= before * (1 - tolerance)
+            else:
+                ok = now <= before * (1 + tolerance) + 1e-9
+            rows.append((name, metric, before, now, ok))
+    return rows
+
+
+def load_baseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f).get('scenarios', {})
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"⚠ Could not read baseline {path}: {e}")
+        return {}
+
+
+def save_results(path, results):
+    try:
+        with open(path, 'w') as f:
+            json.dump({'savedAt': time.strftime('%Y-%m-%dT%H:%M:%S'), 'scenarios': results}, f, indent=2)
+        print(f"✓ Results saved to {path}")
+    except Exception as e:
+        print(f"❌ Error saving results: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the delivery benchmarks and check for regressions")
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help="Run only this scenario (repeatable)")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save', action='store_true', help="Store this run as the new baseline")
+    parser.add_argument('--out', help="Also write this run's results here")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        print(f"🤖 [BENCH] {name}...")
+        results[name] = run_scenario(name, args.seed)
+        m = results[name]
+        print(f"   {m['completed']}/{m['requests']} delivered, {m['deliveriesPerHour']}/h, "
+              f"pickup p50 {m['pickupLatencyP50']}s, {m['firebaseCallsPerDelivery']} calls/delivery, "
+              f"{m['cpuMsPerTick']}ms/tick ({m['wallSeconds']}s)")
+
+    if args.out:
+        save_results(args.out, results)
+
+    baseline = load_baseline(args.baseline)
+    rows = compare(results, baseline)
+    if args.save:
+        merged = dict(baseline)
+        merged.update(results)
+        save_results(args.baseline, merged)
+    if not rows:
+        if not args.save:
+            print(f"⚠ No baseline to compare with ({args.baseline}) - run with --save first")
+        sys.exit(0)
+
+    print(f"\n📊 Compared with {args.baseline}")
+    failed = 0
+    for name, metric, before, now, ok in rows:
+        failed += not ok
+        print(f"   {'PASS' if ok else 'FAIL'}  {name:<18} {metric:<25} {before:>10} → {now}")
+    if failed:
+        print(f"❌ {failed} metric(s) regressed")
+        sys.exit(0 if args.save else 1)
+    print("✓ No regressions")
@@ -0,0 +1,76 @@
+# compartment_allocator.py - Assign compartments along the planned route
+from config import COMPARTMENT_COUNT
+
+
+class CompartmentAllocator:
+    """Interval scheduling of compartments over a planned route.
+
+    A compartment is busy from a delivery's pickup until its drop-off. The
+    route is walked in execution order (drop-offs at a stop come before
+    pickups, so a compartment emptied at a room can be refilled there) and
+    each pickup gets a compartment that is free at that moment. Taking
+    intervals in start order never needs more compartments than the peak
+    load, so any route the planner accepts under its capacity limit fits.
+
+    Files already on board keep their compartment. A pickup keeps the
+    compartment it already has when that one is free, to avoid needless
+    changes in the app.
+    """
+
+    def __init__(self, count=COMPARTMENT_COUNT):
+        self.count = count
+
+    def allocate(self, stops, loaded):
+        """Assign compartments for the route.
+
+        stops:  [(room, [(delivery, action), ...]), ...]
+        loaded: {delivery_id: compartment} for deliveries already on board
+
+        Returns (assignments, occupancy, unassigned):
+          assignments - {delivery_id: compartment} for every planned pickup
+          occupancy   - {compartment: delivery_id or ""}, the delivery each
+                        compartment holds now (or will take next)
+          unassigned  - delivery_ids that found no free compartment
+        """
+        free = set(range(1, self.count + 1)) - set(loaded.values())
+        holding = dict(loaded)  # delivery_id: compartment, while on board
+        occupancy = {compartment: d_id for d_id, compartment in loaded.items()}
+        assignments = {}
+        unassigned = []
+
+        for room, tasks in stops:
+            for delivery, action in tasks:
+                delivery_id = delivery['id']
+                if action == 'deliver':
+                    compartment = holding.pop(delivery_id, None)
+                    if compartment is not None:
+                        free.add(compartment)
+                    continue
+
+                if not free:
+                    unassigned.append(delivery_id)
+                    continue
+                current = delivery.get('compartment')
+                compartment = current if current in free else min(free)
+                free.discard(compartment)
+                holding[delivery_id] = compartment
+                assignments[delivery_id] = compartment
+                occupancy.setdefault(compartment, delivery_id)
+
+        for compartment in range(1, self.count + 1):
+            occupancy.setdefault(compartment, "")
+        return assignments, occupancy, unassigned
+
+    def apply(self, stops, assignments):
+        """Write assignments into the planned delivery dicts (pickup and
+        drop-off tasks share one dict). Returns {delivery_id: (old, new)}
+        for compartments that changed."""
+        changed = {}
+        for room, tasks in stops:
+            for delivery, action in tasks:
+                compartment = assignments.get(delivery['id'])
+                if action == 'pickup' and compartment is not None:
+                    if delivery.get('compartment') != compartment:
+                        changed[delivery['id']] = (delivery.get('compartment'), compartment)
+                    delivery['compartment'] = compartment
+        return changed
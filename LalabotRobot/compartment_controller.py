@@ -1,14 +1,17 @@
-from gpiozero import Servo, Device
-from gpiozero.pins.lgpio import LGPIOFactory
 from time import sleep
 from config import *
 import warnings
 
 warnings.filterwarnings('ignore', category=RuntimeWarning)
-Device.pin_factory = LGPIOFactory()
 
 class CompartmentController:
     def __init__(self):
+        # gpiozero is slow to import - load it only when servos are created
+        from gpiozero import Servo, Device
+        from gpio_backend import pin_factory
+        if Device.pin_factory is not pin_factory():
+            Device.pin_factory = pin_factory()
+        
         # Initialize servos with correct pulse widths
         self.servos = {
             1: Servo(SERVO1_PIN, min_pulse_width=1/1000, max_pulse_width=2/1000),
@@ -16,11 +19,10 @@ class CompartmentController:
             3: Servo(SERVO3_PIN, min_pulse_width=1/1000, max_pulse_width=2/1000)
         }
         
-        # Close all compartments on startup
+        # Close all compartments on startup (close_all waits for the servos)
         self.close_all()
         
         # Detach servos after positioning to stop jitter
-        sleep(1)
         for servo in self.servos.values():
             servo.detach()
         
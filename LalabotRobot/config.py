@@ -34,3 +34,86 @@ SERVO_CLOSED = 180  #(180) 12 o'clock position
 OBSTACLE_DISTANCE = 40  # cm - stop if obstacle closer than this
 WHITE_LINE_THRESHOLD = 3  # Number of sensors needed to detect white line
 ROOM_COUNT = 4  # Total rooms (1, 2, 3, 4) + base (0)
+
+# Warm restart
+STATE_FILE = "robot_state.json"  # Local state snapshot (relative to LalabotRobot/)
+
+# Route planning
+COMPARTMENT_COUNT = 3  # Compartments available for simultaneous deliveries
+SEGMENT_TRAVEL_TIME = 10  # Seconds to drive from one room marker to the next (estimate)
+TASK_DWELL_TIME = 30  # Seconds spent per pickup/delivery at a stop (estimate)
+EXACT_PLANNER_MAX_DELIVERIES = 7  # Solve exactly up to this many unpicked deliveries
+
+# Confirmation timeouts (seconds)
+PICKUP_TIMEOUT = 100  # Sender must confirm files placed
+DELIVERY_TIMEOUT = 300  # Receiver must verify and collect
+
+# Async orchestrator (python main.py --async)
+FIREBASE_POLL_INTERVAL = 3  # Seconds between /delivery_requests polls
+SENSOR_SAMPLE_INTERVAL = 0.2  # Seconds between sensor samples while parked
+THEFT_CHECK_INTERVAL = 0.1  # Seconds between theft monitor checks (fixed rate)
+
+# Connectivity heartbeat (firebase_handler.py)
+HEARTBEAT_INTERVAL = 10  # Seconds between /robot_status/heartbeat writes
+HEARTBEAT_TIMEOUT = 5  # Seconds before a heartbeat request gives up
+CONNECTION_TIMEOUT = 25  # Seconds without a successful heartbeat before is_connected() is False
+
+# Theft detection and alarm (theft_protection.py)
+BUZZER_PIN = 16  # Active buzzer
+THEFT_OFF_LINE_THRESHOLD = 2.0  # Seconds of all-white IR (parked) before "lifted"
+THEFT_FUSED_THRESHOLD = 0.5  # Seconds of all-white IR + ultrasonic jump before "lifted"
+THEFT_DISTANCE_JUMP = 25  # cm the distance ahead must move from its parked baseline
+THEFT_CLEAR_TIME = 0.3  # Seconds of line under the robot before all-white evidence resets
+WIFI_CHECK_INTERVAL = 5  # Seconds between connectivity checks
+THEFT_WIFI_TIMEOUT = 30  # Seconds without Firebase before the alarm sounds
+ALARM_BEEPS = 20  # Beeps per alarm (generated by lgpio PWM - the caller never waits)
+ALARM_BEEP_FREQUENCY = 5  # Beeps per second (0.1 s on / 0.1 s off)
+THEFT_REPORT_RETRY_INTERVAL = 5  # Seconds between attempts to report a theft to Firebase
+
+# Control process (line following + obstacle loop isolated from networking)
+CONTROL_PROCESS = False  # True = run control loop in its own process (control_process.py)
+CONTROL_POLL_INTERVAL = 0.01  # Seconds between shared-memory polls
+
+# Fleet mode (several robots sharing one track - fleet.py)
+FLEET_MODE = False  # True = claim deliveries through leases before serving them
+ROBOT_ID = "lalabot-1"  # Must be unique per robot
+LEASE_SECONDS = 600  # Claim lifetime - longer than the longest stop (renewed at every marker)
+FLEET_STALE_SECONDS = 600  # Ignore robots that haven't published status for this long
+FLEET_PARKING_ROOMS = (0,)  # Rooms where several robots may wait at once (base)
+
+# Compartment allocation
+ROBOT_ALLOCATES_COMPARTMENTS = True  # Robot reassigns compartments of unpicked deliveries along its route
+
+# Priorities and deadlines (optional `priority` / `deadline` on delivery records)
+PRIORITY_WEIGHTS = {'low': 0.5, 'normal': 1, 'high': 2, 'urgent': 4}  # Lateness weight per priority
+PRIORITY_RESPONSE_TIMES = {'high': 900, 'urgent': 300}  # Implied deadline (s after createdAt) if none given
+ADMISSION_CONTROL = True  # Defer requests that would make on-time deliveries late
+
+# Learned ETAs (eta_model.py)
+ETA_FILE = "eta_model.json"  # Learned segment/dwell times (relative to LalabotRobot/)
+ETA_SMOOTHING = 0.2  # EWMA weight of the newest measurement
+ETA_UPDATE_THRESHOLD = 30  # Seconds an ETA must move before it is pushed again
+
+# Track map (python track_map.py surveys the track and writes it)
+TRACK_MAP_FILE = "track_map.json"  # Relative to LalabotRobot/ - overrides ROOM_COUNT when present
+TRACK_MAP_VERSION = 1  # Schema version of the track map file
+TRACK_SURVEY_LAPS = 2  # Laps driven per survey
+MARKER_PASS_TIME = 1.5  # Seconds to drive past a marker when it wasn't surveyed
+MARKER_PASS_MARGIN = 2.0  # Surveyed pass time = marker width (seconds on white) x margin
+MARKER_SETTLE_TIME = 0.5  # Pause after passing a marker
+SENSOR_NOISE_LIMIT = 0.02  # Spike rate above which markers need 2 consecutive white readings
+
+# Track graph (junctions / spurs - track_graph.py; without the file the track is one loop)
+TRACK_GRAPH_FILE = "track_graph.json"  # Relative to LalabotRobot/
+TRACK_GRAPH_VERSION = 1  # Schema version of the track graph file
+JUNCTION_TURN_TIME = 0.6  # Seconds of spin to leave the line before searching for the branch
+UTURN_TIME = 1.2  # Seconds of spin to turn around at a spur end
+BRANCH_SEARCH_TIMEOUT = 3.0  # Give up searching for the branch line after this many seconds
+
+# Idle positioning (demand_model.py)
+IDLE_POSITIONING = True  # Park where the next pickup is expected instead of at base
+DEMAND_MODEL_FILE = "demand_model.json"  # Local demand model (relative to LalabotRobot/)
+DEMAND_HALF_LIFE_DAYS = 28  # Older history counts half as much every this many days
+DEMAND_REFRESH_INTERVAL = 3600  # Seconds between rebuilds from /delivery_history
+IDLE_MIN_DEMAND = 1.0  # Below this (recency-weighted requests in the hour) → return to base
+IDLE_RETURN_TO_BASE_AFTER = 1800  # Seconds idle before returning to base to charge
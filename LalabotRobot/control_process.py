@@ -0,0 +1,357 @@
+# control_process.py - Line following / obstacle control loop in its own process
+#
+# The orchestrator (Firebase, planning, JSON parsing) and the control loop
+# talk through one shared-memory block with a fixed layout. Each half of the
+# block has a single writer and is guarded by a sequence counter (seqlock):
+# the writer makes the counter odd while writing and even when done, and the
+# reader retries until it sees the same even value before and after reading.
+import json
+import multiprocessing
+import os
+import struct
+import tempfile
+import time
+from multiprocessing import shared_memory
+from config import CONTROL_POLL_INTERVAL, OBSTACLE_DISTANCE
+
+# Commands (orchestrator → control)
+CMD_NONE = 0
+CMD_NAVIGATE = 1
+CMD_STOP = 2
+CMD_SHUTDOWN = 3
+
+# Control states (control → orchestrator)
+STATE_STARTING = 0
+STATE_IDLE = 1
+STATE_NAVIGATING = 2
+STATE_FAILED = 3
+
+MOTOR_COMMANDS = ['stop', 'forward', 'turn_left', 'turn_right']
+
+# seq, command id, command, target node, start node (track graph node ids can exceed a byte),
+# edge cost revision (see costs_path)
+COMMAND_LAYOUT = struct.Struct('<I I B i i I')
+# seq, state, done command id, location, markers seen, last marker time,
+# IR left/center/right, distance (cm, -1 = none), obstacle, motor command,
+# tick count, max tick period (ms), heartbeat (monotonic seconds)
+STATUS_LAYOUT = struct.Struct('<I B I i I d B B B f B B I f d')
+
+COMMAND_OFFSET = 0
+STATUS_OFFSET = 64  # Keep the two writers on separate cache lines
+BLOCK_SIZE = STATUS_OFFSET + STATUS_LAYOUT.size
+
+STATUS_FIELDS = ('state', 'done_command', 'location', 'markers_seen', 'last_marker_time',
+                 'ir_left', 'ir_center', 'ir_right', 'distance', 'obstacle',
+                 'motor_command', 'tick_count', 'max_tick_ms', 'heartbeat')
+
+
+class SharedBlock:
+    """Fixed-layout command/status block in multiprocessing.shared_memory"""
+
+    def __init__(self, name=None):
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=BLOCK_SIZE)
+            self.shm.buf[:BLOCK_SIZE] = bytes(BLOCK_SIZE)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.command_seq = 0
+        self.status_seq = 0
+
+    def _write(self, layout, offset, seq, values):
+        # Odd sequence = write in progress
+        struct.pack_into('<I', self.shm.buf, offset, seq + 1)
+        layout.pack_into(self.shm.buf, offset, seq + 1, *values)
+        struct.pack_into('<I', self.shm.buf, offset, seq + 2)
+        return seq + 2
+
+    def _read(self, layout, offset):
+        while True:
+            before = struct.unpack_from('<I', self.shm.buf, offset)[0]
+            if before % 2:
+                continue
+            values = layout.unpack_from(self.shm.buf, offset)
+            after = struct.unpack_from('<I', self.shm.buf, offset)[0]
+            if before == after:
+                return values[1:]
+
+    def write_command(self, command_id, command, target_room=0, start_room=0, costs_revision=0):
+        self.command_seq = self._write(COMMAND_LAYOUT, COMMAND_OFFSET, self.command_seq,
+                                       (command_id, command, target_room, start_room, costs_revision))
+
+    def read_command(self):
+        return self._read(COMMAND_LAYOUT, COMMAND_OFFSET)
+
+    def write_status(self, status):
+        self.status_seq = self._write(STATUS_LAYOUT, STATUS_OFFSET, self.status_seq,
+                                      [status[field] for field in STATUS_FIELDS])
+
+    def read_status(self):
+        return dict(zip(STATUS_FIELDS, self._read(STATUS_LAYOUT, STATUS_OFFSET)))
+
+    def close(self, unlink=False):
+        self.shm.close()
+        if unlink:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def costs_path(block_name):
+    """File with the orchestrator's learned edge costs - too big for the block"""
+    return os.path.join(tempfile.gettempdir(), f"lalabot-costs-{block_name.strip('/')}.json")
+
+
+# ---------- control process side ----------
+
+def control_main(block_name):
+    """Entry point of the control process - owns motors, IR and ultrasonic"""
+    from motor_controller import MotorController
+    from obstacle_detector import ObstacleDetector
+    from line_follower import LineFollower
+
+    block = SharedBlock(block_name)
+    status = {field: 0 for field in STATUS_FIELDS}
+    status['distance'] = -1.0
+    status['state'] = STATE_STARTING
+    block.write_status(status)
+
+    try:
+        motors = MotorController()
+        obstacle_detector = ObstacleDetector()
+        line_follower = LineFollower(motors, obstacle_detector)
+    except Exception as e:
+        print(f"❌ Control process failed to start: {e}")
+        status['state'] = STATE_FAILED
+        block.write_status(status)
+        block.close()
+        return
+
+    last_tick = [None]
+    handled_command = [0]
+    costs_revision = [0]
+
+    def load_costs(revision):
+        """Drive the paths the planner planned: same graph file, its learned costs"""
+        try:
+            with open(costs_path(block_name)) as f:
+                costs = {(a, b): cost for a, b, cost in json.load(f)}
+            line_follower.graph.update_costs(lambda a, b: costs.get((a, b)))
+            costs_revision[0] = revision
+        except (OSError, ValueError) as e:
+            print(f"⚠ Control process kept its edge costs: {e}")
+
+    def publish():
+        status['heartbeat'] = time.monotonic()
+        status['motor_command'] = MOTOR_COMMANDS.index(motors.last_command)
+        distance = obstacle_detector.last_distance
+        status['distance'] = -1.0 if distance is None else distance
+        status['obstacle'] = int(distance is not None and distance <= OBSTACLE_DISTANCE)
+        block.write_status(status)
+
+    def on_tick(left, center, right):
+        now = time.monotonic()
+        if last_tick[0] is not None:
+            period_ms = (now - last_tick[0]) * 1000
+            status['max_tick_ms'] = max(status['max_tick_ms'], period_ms)
+        last_tick[0] = now
+        status['tick_count'] += 1
+        status['ir_left'], status['ir_center'], status['ir_right'] = left, center, right
+        publish()
+
+    def on_marker(location):
+        status['location'] = location
+        status['markers_seen'] += 1
+        status['last_marker_time'] = time.monotonic()
+        last_tick[0] = None  # Driving past the marker is not a control tick
+        publish()
+
+    def should_abort():
+        command_id, command, target, start, revision = block.read_command()
+        return command_id != handled_command[0] and command in (CMD_STOP, CMD_SHUTDOWN)
+
+    line_follower.on_tick = on_tick
+    line_follower.on_marker = on_marker
+    line_follower.should_abort = should_abort
+
+    status['state'] = STATE_IDLE
+    publish()
+    print("✓ Control process running")
+
+    try:
+        while True:
+            command_id, command, target, start, revision = block.read_command()
+            if command_id == handled_command[0]:
+                publish()  # Heartbeat while idle
+                time.sleep(CONTROL_POLL_INTERVAL)
+                continue
+
+            handled_command[0] = command_id
+            if command == CMD_SHUTDOWN:
+                break
+            if command == CMD_NAVIGATE:
+                if revision != costs_revision[0]:
+                    load_costs(revision)
+                status['state'] = STATE_NAVIGATING
+                status['location'] = start
+                if line_follower.current_location != start:
+                    # Moved without us (warm restart) - arrival direction unknown
+                    line_follower.current_location = start
+                    line_follower.previous_location = None
+                status['max_tick_ms'] = 0.0
+                last_tick[0] = None
+                publish()
+                line_follower.navigate_to_room(target, None, None)
+                status['location'] = line_follower.current_location
+            else:
+                motors.stop()
+
+            status['state'] = STATE_IDLE
+            status['done_command'] = command_id
+            publish()
+    finally:
+        line_follower.cleanup()
+        obstacle_detector.cleanup()
+        motors.cleanup()
+        block.close()
+
+
+# ---------- orchestrator side ----------
+
+class _MotorsView:
+    """Minimal MotorController stand-in for the orchestrator process"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def stop(self):
+        self.client.send(CMD_STOP)
+
+    def cleanup(self):
+        pass
+
+
+class _ObstacleView:
+    """ObstacleDetector stand-in that reads the control process snapshot"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get_distance(self):
+        distance = self.client.status()['distance']
+        return None if distance < 0 else round(distance, 2)
+
+    def is_path_clear(self):
+        return not self.client.status()['obstacle']
+
+    def cleanup(self):
+        pass
+
+
+class ControlProcessClient:
+    """LineFollower-compatible front end for the control process.
+
+    navigate_to_room() sends a command and follows marker events from the
+    status block; Firebase location updates happen here, in the
+    orchestrator process, never in the control loop. The edge costs of
+    `graph` (set by the robot) go with every navigate command, so both
+    processes pick the same path.
+    """
+
+    def __init__(self, start_timeout=10):
+        self.block = SharedBlock()
+        self.command_id = 0
+        self.current_location = 0
+        self.on_marker = None
+        self.graph = None
+        self.sent_costs = None
+        self.costs_revision = 0
+        self.motors = _MotorsView(self)
+        self.obstacle_detector = _ObstacleView(self)
+
+        # spawn: don't fork the orchestrator's threads into the control loop
+        context = multiprocessing.get_context('spawn')
+        self.process = context.Process(target=control_main, args=(self.block.name,),
+                                       name="lalabot-control", daemon=True)
+        self.process.start()
+
+        deadline = time.monotonic() + start_timeout
+        while self.status()['state'] == STATE_STARTING:
+            if not self.process.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("Control process did not start")
+            time.sleep(0.01)
+        if self.status()['state'] == STATE_FAILED:
+            raise RuntimeError("Control process failed to initialize hardware")
+
+        print(f"✓ Line follower initialized in control process (pid {self.process.pid})")
+
+    def status(self):
+        return self.block.read_status()
+
+    def send(self, command, target_room=0, start_room=0):
+        self.command_id += 1
+        self.block.write_command(self.command_id, command, target_room, start_room,
+                                 self.costs_revision)
+        return self.command_id
+
+    def share_costs(self):
+        """Write the graph's edge costs for the control process if they changed"""
+        if self.graph is None:
+            return
+        costs = {edge: values['cost'] for edge, values in self.graph.edges.items()}
+        if costs == self.sent_costs:
+            return
+        path = costs_path(self.block.name)
+        try:
+            with open(path + '.tmp', 'w') as f:
+                json.dump([[a, b, cost] for (a, b), cost in costs.items()], f)
+            os.replace(path + '.tmp', path)  # Never a half-written file
+            self.sent_costs = costs
+            self.costs_revision += 1
+        except OSError as e:
+            print(f"⚠ Could not share edge costs with the control process: {e}")
+
+    def read_sensors(self):
+        status = self.status()
+        return status['ir_left'], status['ir_center'], status['ir_right']
+
+    def navigate_to_room(self, target_room, firebase_handler, delivery_id):
+        """Navigate to target room, updating Firebase along the way"""
+        print(f"\n🎯 Navigating from Room {self.current_location} → Room {target_room} (control process)")
+        markers_seen = self.status()['markers_seen']
+        self.share_costs()
+        command_id = self.send(CMD_NAVIGATE, target_room, self.current_location)
+
+        while True:
+            status = self.status()
+            if status['markers_seen'] != markers_seen:
+                markers_seen = status['markers_seen']
+                self.current_location = status['location']
+                if delivery_id is not None:
+                    firebase_handler.update_current_location(delivery_id, self.current_location)
+                if self.on_marker is not None:
+                    self.on_marker(self.current_location)
+            # A later STOP also ends this navigation
+            if status['done_command'] >= command_id:
+                self.current_location = status['location']
+                break
+            if not self.process.is_alive():
+                raise RuntimeError("Control process died during navigation")
+            time.sleep(CONTROL_POLL_INTERVAL)
+
+        print(f"✓ Arrived at Room {self.current_location}  "
+              f"[{status['tick_count']} ticks, max tick period {status['max_tick_ms']:.1f}ms]\n")
+
+    def cleanup(self):
+        if self.process.is_alive():
+            self.send(CMD_SHUTDOWN)
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.block.close(unlink=True)
+        try:
+            os.remove(costs_path(self.block.name))
+        except FileNotFoundError:
+            pass
+        print("✓ Control process stopped")
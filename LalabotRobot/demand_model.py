@@ -0,0 +1,141 @@
+# demand_model.py - Pickup demand by weekday/hour, mined from /delivery_history
+import json
+import os
+import time
+import robot_clock
+from route_planner import parse_timestamp
+from config import (ROOM_COUNT, DEMAND_MODEL_FILE, DEMAND_HALF_LIFE_DAYS,
+                    DEMAND_REFRESH_INTERVAL)
+
+
+class DemandModel:
+    """Recency-weighted pickup counts per (weekday, hour, room).
+
+    The distribution for "now" blends the same weekday + hour (and the next
+    hour), the same hour on any weekday, and all-time counts, so a sparse
+    history still gives a sensible answer. Persisted locally so the robot
+    can position itself while offline.
+    """
+
+    def __init__(self, path=DEMAND_MODEL_FILE, node_count=ROOM_COUNT + 1,
+                 half_life_days=DEMAND_HALF_LIFE_DAYS):
+        if not os.path.isabs(path):
+            path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+        self.path = path
+        self.node_count = node_count
+        self.half_life_days = half_life_days
+        self.slots = {}  # "weekday-hour": {room: weight}
+        self.built_at = None
+        self.attempted_at = None  # Last refresh attempt (successful or not)
+        self.load()
+
+    # ---------- persistence ----------
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.slots = {slot: {int(room): w for room, w in rooms.items()}
+                          for slot, rooms in data.get('slots', {}).items()}
+            self.built_at = data.get('builtAt')
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"⚠ Could not read demand model ({e}) - starting empty")
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'builtAt': self.built_at, 'slots': self.slots}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠ Could not save demand model: {e}")
+
+    # ---------- building ----------
+
+    def build(self, history, now=None):
+        """Rebuild counts from delivery_history records (pickup + createdAt)"""
+        now = robot_clock.time() if now is None else now
+        slots = {}
+        for record in history:
+            created = parse_timestamp(record.get('createdAt'))
+            pickup = record.get('pickup')
+            if created is None or pickup is None:
+                continue
+            age_days = max(0.0, now - created) / 86400
+            weight = 0.5 ** (age_days / self.half_life_days)
+            local = time.localtime(created)
+            rooms = slots.setdefault(f"{local.tm_wday}-{local.tm_hour}", {})
+            room = int(pickup) % self.node_count
+            rooms[room] = rooms.get(room, 0.0) + weight
+        self.slots = slots
+        self.built_at = now
+
+    def needs_refresh(self, now=None):
+        now = robot_clock.time() if now is None else now
+        last = max(self.built_at or 0, self.attempted_at or 0)
+        return now - last > DEMAND_REFRESH_INTERVAL
+
+    def refresh(self, firebase):
+        """Rebuild from Firebase - keeps the current model if unreachable"""
+        self.attempted_at = robot_clock.time()
+        history = firebase.get_delivery_history()
+        if history is None:
+            return False
+        self.build(history)
+        self.save()
+        print(f"📈 Demand model rebuilt from {len(history)} past deliveries")
+        return True
+
+    # ---------- queries ----------
+
+    def _sum(self, slots):
+        total = {}
+        for slot in slots:
+            for room, weight in self.slots.get(slot, {}).items():
+                total[room] = total.get(room, 0.0) + weight
+        return total
+
+    def _window(self, when):
+        local = time.localtime(robot_clock.time() if when is None else when)
+        next_hour = (local.tm_hour + 1) % 24
+        return local.tm_wday, local.tm_hour, next_hour
+
+    def window_demand(self, when=None):
+        """Recency-weighted requests seen on this weekday in this hour and the next"""
+        weekday, hour, next_hour = self._window(when)
+        return sum(self._sum([f"{weekday}-{hour}", f"{weekday}-{next_hour}"]).values())
+
+    def demand(self, when=None):
+        """Blended pickup weights per room for the hour starting at `when`"""
+        weekday, hour, next_hour = self._window(when)
+        layers = [
+            (1.0, [f"{weekday}-{hour}", f"{weekday}-{next_hour}"]),
+            (0.3, [f"{day}-{h}" for day in range(7) for h in (hour, next_hour)]),
+            (0.1, list(self.slots))
+        ]
+        blended = {}
+        for factor, slots in layers:
+            for room, weight in self._sum(slots).items():
+                blended[room] = blended.get(room, 0.0) + factor * weight
+        return blended
+
+    def best_position(self, travel_time, when=None, positions=None):
+        """Room minimizing the expected travel time to the next pickup.
+
+        travel_time(start, room) → seconds; positions are the candidate
+        parking spots (default: every node). Returns (room, expected
+        seconds, window_demand), or None if there is no history.
+        """
+        demand = self.demand(when)
+        total = sum(demand.values())
+        if total <= 0:
+            return None
+        best = None
+        for position in (range(self.node_count) if positions is None else positions):
+            expected = sum(weight * travel_time(position, room)
+                           for room, weight in demand.items()) / total
+            if best is None or expected < best[1]:
+                best = (position, expected)
+        return best[0], best[1], self.window_demand(when)
@@ -0,0 +1,139 @@
+# eta_model.py - Learned travel/dwell times and per-delivery ETAs
+import json
+import os
+import threading
+import robot_clock
+from track_graph import TrackGraph
+from config import (ROOM_COUNT, SEGMENT_TRAVEL_TIME, TASK_DWELL_TIME,
+                    ETA_FILE, ETA_SMOOTHING, ETA_UPDATE_THRESHOLD)
+
+
+class EtaModel:
+    """Exponentially weighted travel time per segment and dwell time per
+    task type, persisted locally so the robot keeps what it learned.
+
+    Segment times include the pause at the marker; dwell is measured from
+    arrival at a stop until a task's confirmation arrives.
+    """
+
+    def __init__(self, path=ETA_FILE, alpha=ETA_SMOOTHING, graph=None, track_map=None):
+        if not os.path.isabs(path):
+            path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+        self.path = path
+        self.alpha = alpha
+        self.graph = graph or TrackGraph.ring(ROOM_COUNT + 1)
+        self.track_map = track_map  # Surveyed times seed segments not yet learned
+        self.segments = {}  # "from-to": seconds
+        self.dwell = {}     # 'pickup'/'deliver': seconds
+        self.lock = threading.Lock()
+        self.load()
+
+    # ---------- persistence ----------
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.segments = data.get('segments', {})
+            self.dwell = data.get('dwell', {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"⚠ Could not read ETA model ({e}) - using defaults")
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'segments': self.segments, 'dwell': self.dwell}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠ Could not save ETA model: {e}")
+
+    # ---------- learning ----------
+
+    def _update(self, table, key, seconds):
+        with self.lock:
+            previous = table.get(key)
+            if previous is None:
+                table[key] = seconds
+            else:
+                table[key] = previous + self.alpha * (seconds - previous)
+            self.save()
+
+    def record_segment(self, start, end, seconds):
+        self._update(self.segments, f"{start}-{end}", seconds)
+
+    def record_dwell(self, action, seconds):
+        self._update(self.dwell, action, seconds)
+
+    # ---------- estimates ----------
+
+    def learned_segment_time(self, start, end):
+        """Learned time for one edge, or None if it was never driven"""
+        return self.segments.get(f"{start}-{end}")
+
+    def segment_time(self, start, end):
+        learned = self.learned_segment_time(start, end)
+        if learned is not None:
+            return learned
+        if self.track_map is not None:
+            surveyed = self.track_map.segment_time(start, end)
+            if surveyed is not None:
+                return surveyed
+        configured = self.graph.edge_cost(start, end)
+        return configured if configured is not None else SEGMENT_TRAVEL_TIME
+
+    def travel_time(self, start, target):
+        """Travel time along the graph's shortest path, summed edge by edge"""
+        path = self.graph.path(start, target)
+        return sum(self.segment_time(a, b) for a, b in zip(path, path[1:]))
+
+    def stop_time(self, tasks):
+        """Tasks at a stop run concurrently - the slowest one decides"""
+        return max((self.dwell.get(action, TASK_DWELL_TIME) for delivery, action in tasks),
+                   default=0.0)
+
+    def etas(self, stops, start, now=None):
+        """Arrival estimates for every delivery on a [(room, tasks), ...] route
+
+        Returns {delivery_id: {'pickup': epoch, 'dropoff': epoch}} - 'pickup'
+        only for deliveries not yet picked up.
+        """
+        clock = robot_clock.time() if now is None else now
+        position = start
+        etas = {}
+        for room, tasks in stops:
+            clock += self.travel_time(position, room)
+            position = room
+            for delivery, action in tasks:
+                key = 'pickup' if action == 'pickup' else 'dropoff'
+                etas.setdefault(delivery['id'], {})[key] = round(clock)
+            clock += self.stop_time(tasks)
+        return etas
+
+
+class EtaPublisher:
+    """Push ETAs to Firebase only when they moved by more than the threshold"""
+
+    def __init__(self, firebase, threshold=ETA_UPDATE_THRESHOLD):
+        self.firebase = firebase
+        self.threshold = threshold
+        self.published = {}  # delivery_id: last pushed ETA dict
+
+    def publish(self, etas):
+        changed = {}
+        for delivery_id, eta in etas.items():
+            last = self.published.get(delivery_id, {})
+            if (eta.keys() != last.keys()
+                    or any(abs(eta[key] - last[key]) > self.threshold for key in eta)):
+                changed[delivery_id] = eta
+
+        # Forget deliveries that left the route
+        for delivery_id in list(self.published):
+            if delivery_id not in etas:
+                del self.published[delivery_id]
+
+        if changed and self.firebase.update_etas(changed):
+            self.published.update(changed)
+        return changed
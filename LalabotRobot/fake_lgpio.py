@@ -0,0 +1,347 @@
+# fake_lgpio.py - In-process stand-in for the lgpio module (LALABOT_FAKE_GPIO=1)
+#
+# Implements the parts of the lgpio API the robot and gpiozero use: chips,
+# single pins, groups, alerts/callbacks, PWM/servo pulses and ticks. All
+# handles share one set of pins, like one physical header.
+#
+# Simulation side (not part of lgpio):
+#   set_level(gpio, level)       drive an input (fires alert callbacks)
+#   set_reader(gpio, reader)     reader() → level, sampled on every read
+#   set_echo(trig, echo, cm)     answer ultrasonic triggers with an echo pulse
+#   on_write(callback)           callback(gpio, level) on every output write
+#   set_read_time(seconds)       each gpio_read advances robot_clock (virtual clocks)
+#   level(gpio), pwm(gpio)       inspect outputs
+#
+# Echo pulses are timed on robot_clock, so code that busy-waits on a pin
+# (ObstacleDetector) needs a read time to get anywhere on a virtual clock.
+import threading
+import time
+
+import robot_clock
+
+# lgpio constants
+SET_ACTIVE_LOW = 4
+SET_OPEN_DRAIN = 8
+SET_OPEN_SOURCE = 16
+SET_PULL_UP = 32
+SET_PULL_DOWN = 64
+SET_PULL_NONE = 128
+RISING_EDGE = 1
+FALLING_EDGE = 2
+BOTH_EDGES = 3
+TIMEOUT = 2
+
+SPEED_OF_SOUND = 34300  # cm/s
+
+
+class error(Exception):
+    """Raised like lgpio.error for invalid handles / unclaimed pins"""
+
+
+_lock = threading.RLock()
+_handles = set()
+_next_handle = [0]
+_levels = {}     # gpio: 0/1
+_modes = {}      # gpio: 'input' / 'output' / 'alert'
+_flags = {}      # gpio: lFlags
+_groups = {}     # leader gpio: [gpios]
+_pwm = {}        # gpio: {'frequency', 'dutyCycle'} or {'frequency', 'pulseWidth'}
+_callbacks = {}  # gpio: [_Callback]
+_readers = {}    # gpio: reader() → level
+_listeners = []  # callback(gpio, level) after every write
+_read_time = [0.0]  # Seconds each gpio_read takes (robot_clock.sleep)
+
+
+def get_current_tick():
+    """Nanoseconds, like lgpio's tick"""
+    return time.monotonic_ns()
+
+
+# ---------- simulation side ----------
+
+def reset():
+    """Forget all pins, handles and hooks"""
+    with _lock:
+        for table in (_handles, _levels, _modes, _flags, _groups, _pwm, _callbacks, _readers):
+            table.clear()
+        del _listeners[:]
+        _read_time[0] = 0.0
+
+
+def set_level(gpio, level):
+    with _lock:
+        _set(gpio, 1 if level else 0)
+
+
+def set_reader(gpio, reader):
+    """Compute the level on every read (None removes the reader)"""
+    with _lock:
+        if reader is None:
+            _readers.pop(gpio, None)
+        else:
+            _readers[gpio] = reader
+
+
+def set_echo(trigger, echo, distance):
+    """Answer each trigger pulse (high → low on `trigger`) with an echo on
+    `echo` as long as the round trip to an object `distance` cm away.
+    distance may be a number or a callable; None means no echo."""
+    window = {'start': 0.0, 'end': 0.0, 'high': False}
+
+    def on_trigger(gpio, level):
+        if gpio != trigger:
+            return
+        falling = window['high'] and level == 0
+        window['high'] = level == 1
+        if falling:
+            cm = distance() if callable(distance) else distance
+            now = robot_clock.time()
+            if cm is None:
+                window['start'] = window['end'] = 0.0
+            else:
+                window['start'] = now + 0.0002  # Sensor burst before the echo rises
+                window['end'] = window['start'] + 2 * cm / SPEED_OF_SOUND
+
+    on_write(on_trigger)
+    set_reader(echo, lambda: 1 if window['start'] <= robot_clock.time() < window['end'] else 0)
+
+
+def set_read_time(seconds):
+    """Let every gpio_read take `seconds` of robot_clock time (0 = instant).
+    On a virtual clock this is what moves time along in busy-wait loops."""
+    _read_time[0] = seconds
+
+
+def on_write(callback):
+    with _lock:
+        _listeners.append(callback)
+
+
+def level(gpio):
+    with _lock:
+        return _read(gpio)
+
+
+def pwm(gpio):
+    """Current PWM / servo settings of a pin (None if not pulsing)"""
+    with _lock:
+        return dict(_pwm[gpio]) if gpio in _pwm else None
+
+
+def _read(gpio):
+    if gpio in _readers:
+        return 1 if _readers[gpio]() else 0
+    return _levels.get(gpio, 0)
+
+
+def _set(gpio, level):
+    previous = _levels.get(gpio, 0)
+    _levels[gpio] = level
+    if previous != level:
+        tick = get_current_tick()
+        for cb in list(_callbacks.get(gpio, [])):
+            cb._fire(gpio, level, tick)
+
+
+def _check(handle, gpio=None, modes=None):
+    if handle not in _handles:
+        raise error("unknown handle")
+    if modes is not None and _modes.get(gpio) not in modes:
+        raise error(f"GPIO {gpio} not claimed for {'/'.join(modes)}")
+
+
+# ---------- lgpio API: chips and pins ----------
+
+def gpiochip_open(gpiochip):
+    with _lock:
+        _next_handle[0] += 1
+        _handles.add(_next_handle[0])
+        return _next_handle[0]
+
+
+def gpiochip_close(handle):
+    with _lock:
+        _check(handle)
+        _handles.discard(handle)
+        return 0
+
+
+def gpio_claim_input(handle, gpio, lFlags=0):
+    with _lock:
+        _check(handle)
+        _modes[gpio] = 'input'
+        _flags[gpio] = lFlags
+        if gpio not in _levels:
+            _levels[gpio] = 1 if lFlags & SET_PULL_UP else 0
+        return 0
+
+
+def gpio_claim_output(handle, gpio, level=0, lFlags=0):
+    with _lock:
+        _check(handle)
+        _modes[gpio] = 'output'
+        _flags[gpio] = lFlags
+        _pwm.pop(gpio, None)
+        _set(gpio, 1 if level else 0)
+        return 0
+
+
+def gpio_claim_alert(handle, gpio, eFlags, lFlags=0, notify_handle=None):
+    with _lock:
+        gpio_claim_input(handle, gpio, lFlags)
+        _modes[gpio] = 'alert'
+        return 0
+
+
+def gpio_free(handle, gpio):
+    with _lock:
+        _check(handle)
+        _modes.pop(gpio, None)
+        _pwm.pop(gpio, None)
+        return 0
+
+
+def gpio_get_mode(handle, gpio):
+    with _lock:
+        _check(handle)
+        return {'input': 1, 'alert': 1, 'output': 3}.get(_modes.get(gpio), 0)
+
+
+def gpio_read(handle, gpio):
+    if _read_time[0]:
+        robot_clock.sleep(_read_time[0])
+    with _lock:
+        _check(handle)
+        return _read(gpio)
+
+
+def gpio_write(handle, gpio, level):
+    with _lock:
+        _check(handle, gpio, ('output',))
+        _pwm.pop(gpio, None)
+        level = 1 if level else 0
+        _set(gpio, level)
+        listeners = list(_listeners)
+    for listener in listeners:
+        listener(gpio, level)
+    return 0
+
+
+def gpio_set_debounce_micros(handle, gpio, debounce_micros):
+    with _lock:
+        _check(handle)
+        return 0
+
+
+# ---------- lgpio API: groups ----------
+
+def group_claim_input(handle, gpios, lFlags=0):
+    with _lock:
+        for gpio in gpios:
+            gpio_claim_input(handle, gpio, lFlags)
+        _groups[gpios[0]] = list(gpios)
+        return 0
+
+
+def group_claim_output(handle, gpios, levels=None, lFlags=0):
+    with _lock:
+        levels = levels or [0] * len(gpios)
+        for gpio, level in zip(gpios, levels):
+            gpio_claim_output(handle, gpio, level, lFlags)
+        _groups[gpios[0]] = list(gpios)
+        return 0
+
+
+def group_free(handle, gpio):
+    with _lock:
+        for member in _groups.pop(gpio, []):
+            gpio_free(handle, member)
+        return 0
+
+
+def group_read(handle, gpio):
+    """Bit i of the result is the level of the group's i-th pin"""
+    with _lock:
+        _check(handle)
+        if gpio not in _groups:
+            raise error(f"GPIO {gpio} is not a group leader")
+        return sum(_read(member) << i for i, member in enumerate(_groups[gpio]))
+
+
+def group_write(handle, gpio, group_bits, group_mask=-1):
+    with _lock:
+        _check(handle)
+        if gpio not in _groups:
+            raise error(f"GPIO {gpio} is not a group leader")
+        members = _groups[gpio]
+    for i, member in enumerate(members):
+        if group_mask & (1 << i):
+            gpio_write(handle, member, (group_bits >> i) & 1)
+    return 0
+
+
+# ---------- lgpio API: PWM and servo pulses ----------
+
+def tx_pwm(handle, gpio, pwm_frequency, pwm_duty_cycle, pulse_offset=0, pulse_cycles=0):
+    with _lock:
+        _check(handle, gpio, ('output',))
+        if pwm_frequency == 0 or pwm_duty_cycle == 0:
+            _pwm.pop(gpio, None)
+            _set(gpio, 0)
+        else:
+            _pwm[gpio] = {'frequency': pwm_frequency, 'dutyCycle': pwm_duty_cycle,
+                          'pulseCycles': pulse_cycles}
+            _set(gpio, 1 if pwm_duty_cycle >= 100 else _levels.get(gpio, 0))
+        return 0
+
+
+def tx_servo(handle, gpio, pulse_width, servo_frequency=50, pulse_offset=0, pulse_cycles=0):
+    with _lock:
+        _check(handle, gpio, ('output',))
+        if pulse_width == 0:
+            _pwm.pop(gpio, None)
+        else:
+            _pwm[gpio] = {'frequency': servo_frequency, 'pulseWidth': pulse_width}
+        return 0
+
+
+def tx_busy(handle, gpio, kind=0):
+    return 0
+
+
+# ---------- lgpio API: callbacks ----------
+
+class _Callback:
+    """Returned by callback(); cancel() stops further calls"""
+
+    def __init__(self, handle, gpio, edge, func):
+        self.handle = handle
+        self.gpio = gpio
+        self.edge = edge
+        self.func = func
+        self.count = 0
+
+    def _fire(self, gpio, level, tick):
+        if (level == 1 and self.edge & RISING_EDGE) or (level == 0 and self.edge & FALLING_EDGE):
+            self.count += 1
+            if self.func is not None:
+                self.func(self.handle, gpio, level, tick)
+
+    def tally(self):
+        return self.count
+
+    def reset_tally(self):
+        self.count = 0
+
+    def cancel(self):
+        with _lock:
+            if self in _callbacks.get(self.gpio, []):
+                _callbacks[self.gpio].remove(self)
+
+
+def callback(handle, gpio, edge=RISING_EDGE, func=None):
+    with _lock:
+        _check(handle)
+        cb = _Callback(handle, gpio, edge, func)
+        _callbacks.setdefault(gpio, []).append(cb)
+        return cb
@@ -1,35 +1,70 @@
-import requests
 import json
+import threading
 import time
+import robot_clock
 from config import *
 
 class FirebaseHandler:
     def __init__(self):
         self.base_url = FIREBASE_URL
+        self._http = None
+        
+        # Which /delivery_requests nodes exist, for multi-path PATCHes that
+        # must not recreate a deleted one (open_requests)
+        self.request_ids = None   # Keys in the last /delivery_requests snapshot (None = no snapshot yet)
+        self.closed_ids = set()   # Moved to history by this robot since then
+        self.ids_lock = threading.Lock()  # mark_completed runs on worker threads
+        
+        # Connectivity heartbeat (start_heartbeat)
+        self.last_connected_time = None  # robot_clock.monotonic() of the last heartbeat that got through
+        self.rtt = None                  # Heartbeat round trip, seconds (smoothed)
+        self.heartbeat_failures = 0      # Failed heartbeats in a row
+        self.heartbeat_started = None
+        self.heartbeat_stopped = threading.Event()
+        self.heartbeat_thread = None
         print("✓ Firebase handler initialized")
     
-    def get_active_deliveries(self):
-        """Get all pending/in_progress deliveries"""
+    @property
+    def http(self):
+        """HTTP client - imported on first use to keep startup fast
+        (behind network_shim.py when LALABOT_NETWORK names a profile)"""
+        if self._http is None:
+            import requests
+            from network_shim import from_environment
+            self._http = from_environment(requests)
+        return self._http
+    
+    def get_active_deliveries(self, statuses=('pending', 'in_progress'), strict=False):
+        """Get all deliveries with the given statuses (default pending/in_progress)
+        
+        With strict=True a failed request returns None instead of [], so callers
+        can tell "no deliveries" apart from "Firebase unreachable".
+        """
+        failed = None if strict else []
         try:
-            response = requests.get(f"{self.base_url}/delivery_requests.json")
+            response = self.http.get(f"{self.base_url}/delivery_requests.json")
             if response.status_code == 200:
                 data = response.json()
+                with self.ids_lock:
+                    self.request_ids = set(data or {})
+                    self.closed_ids &= self.request_ids  # Gone for good - no need to remember
                 if data:
                     deliveries = []
                     for key, delivery in data.items():
-                        if delivery.get('status') in ['pending', 'in_progress']:
+                        if delivery.get('status') in statuses:
                             deliveries.append(delivery)
                     return deliveries
-            return []
+                return []
+            return failed
         except Exception as e:
             print(f"❌ Firebase error: {e}")
-            return []
+            return failed
     
     def update_status(self, delivery_id, status):
         """Update delivery status"""
         try:
             url = f"{self.base_url}/delivery_requests/{delivery_id}/status.json"
-            requests.patch(url, json=status)
+            self.http.patch(url, json=status)
             print(f"  → Status updated: {status}")
         except Exception as e:
             print(f"❌ Update failed: {e}")
@@ -39,7 +74,7 @@ class FirebaseHandler:
         try:
             # Get delivery data
             url = f"{self.base_url}/delivery_requests/{delivery_id}.json"
-            response = requests.get(url)
+            response = self.http.get(url)
             
             if response.status_code == 200:
                 delivery = response.json()
@@ -47,15 +82,16 @@ class FirebaseHandler:
                 if delivery:
                     # Update status
                     delivery['status'] = 'cancelled'
-                    delivery['cancelledAt'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+                    delivery['cancelledAt'] = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(robot_clock.time()))
                     delivery['cancellationReason'] = reason
                     
                     # Move to history
                     history_url = f"{self.base_url}/delivery_history/{delivery_id}.json"
-                    requests.put(history_url, json=delivery)
+                    self.http.put(history_url, json=delivery)
                     
                     # Delete from active requests
-                    requests.delete(url)
+                    self.close_request(delivery_id)
+                    self.http.delete(url)
                     
                     print(f"  ✗ Delivery {delivery_id} cancelled: {reason}")
                     return True
@@ -70,7 +106,7 @@ class FirebaseHandler:
         try:
             # Use the full path without .json extension for PATCH
             url = f"{self.base_url}/delivery_requests/{delivery_id}.json"
-            response = requests.patch(url, json={"currentLocation": location})
+            response = self.http.patch(url, json={"currentLocation": location})
             
             if response.status_code == 200:
                 print(f"  → Location updated: Room {location}")
@@ -79,34 +115,83 @@ class FirebaseHandler:
         except Exception as e:
             print(f"❌ Location update failed: {e}")
     
-    def wait_for_files_placed(self, delivery_id, timeout=100): #time for user to place the file
-        """Wait for user to confirm files are placed"""
+    def wait_for_files_placed(self, delivery_id, timeout=None): #time for user to place the file
+        """Wait for user to confirm files are placed (default PICKUP_TIMEOUT)"""
+        timeout = PICKUP_TIMEOUT if timeout is None else timeout
         print(f"  ⏳ Waiting for file confirmation (timeout: {timeout}s)...")
-        start_time = time.time()
+        start_time = robot_clock.time()
         
-        while time.time() - start_time < timeout:
+        while robot_clock.time() - start_time < timeout:
             try:
                 url = f"{self.base_url}/delivery_requests/{delivery_id}.json"
-                response = requests.get(url)
+                response = self.http.get(url)
                 if response.status_code == 200:
                     delivery = response.json()
                     # Changed from filesPlaced to filesConfirmed
                     if delivery and delivery.get('filesConfirmed') == True:
                         print("  ✓ Files confirmed!")
                         return True
-                time.sleep(1)
+                robot_clock.sleep(1)
             except Exception as e:
                 print(f"❌ Error checking filesConfirmed: {e}")
-                time.sleep(1)
+                robot_clock.sleep(1)
         
         print("  ⚠ Timeout waiting for file confirmation!")
         return False
     
+    def wait_for_confirmations(self, waits, on_result=None, poll_interval=1):
+        """Wait for several confirmations at once with one poll loop
+        
+        waits: {delivery_id: (field, timeout)}, e.g. ('filesConfirmed', 100)
+        on_result(delivery_id, confirmed) is called as soon as each one is
+        confirmed, times out, or disappears (cancelled in the app).
+        
+        Returns {delivery_id: confirmed}
+        """
+        print(f"  ⏳ Waiting for {len(waits)} confirmation(s)...")
+        start_time = robot_clock.time()
+        pending = dict(waits)
+        results = {}
+        
+        def resolve(delivery_id, confirmed):
+            results[delivery_id] = confirmed
+            del pending[delivery_id]
+            if on_result is not None:
+                on_result(delivery_id, confirmed)
+        
+        while pending:
+            try:
+                # One request covers every delivery at this stop
+                response = self.http.get(f"{self.base_url}/delivery_requests.json")
+                if response.status_code == 200:
+                    data = response.json() or {}
+                    for delivery_id, (field, timeout) in list(pending.items()):
+                        delivery = data.get(delivery_id)
+                        if delivery is None:
+                            print(f"  ⚠ {delivery_id} no longer active")
+                            resolve(delivery_id, False)
+                        elif delivery.get(field) == True:
+                            print(f"  ✓ {field} for {delivery_id}")
+                            resolve(delivery_id, True)
+            except Exception as e:
+                print(f"❌ Error checking confirmations: {e}")
+            
+            elapsed = robot_clock.time() - start_time
+            for delivery_id, (field, timeout) in list(pending.items()):
+                if elapsed >= timeout:
+                    print(f"  ⚠ Timeout waiting for {field} ({delivery_id})")
+                    resolve(delivery_id, False)
+            
+            if pending:
+                robot_clock.sleep(poll_interval)
+        
+        return results
+    
     def update_progress_stage(self, delivery_id, stage):
         """Update delivery progress stage (0-3)"""
         try:
             url = f"{self.base_url}/delivery_requests/{delivery_id}.json"
-            response = requests.patch(url, json={"progressStage": stage})
+            response = self.http.patch(url, json={"progressStage": stage})
             
             if response.status_code == 200:
                 stage_names = {
@@ -121,49 +206,53 @@ class FirebaseHandler:
         except Exception as e:
             print(f"❌ Progress update failed: {e}")
     
-    def wait_for_verification(self, delivery_id, timeout=300):  # timeout for verification
-        """Wait for receiver to verify and confirm receipt"""
+    def wait_for_verification(self, delivery_id, timeout=None):  # timeout for verification
+        """Wait for receiver to verify and confirm receipt (default DELIVERY_TIMEOUT)"""
+        timeout = DELIVERY_TIMEOUT if timeout is None else timeout
         print(f"  ⏳ Waiting for receiver verification (timeout: {timeout}s)...")
-        start_time = time.time()
+        start_time = robot_clock.time()
         
-        while time.time() - start_time < timeout:
+        while robot_clock.time() - start_time < timeout:
             try:
                 url = f"{self.base_url}/delivery_requests/{delivery_id}.json"
-                response = requests.get(url)
+                response = self.http.get(url)
                 if response.status_code == 200:
                     delivery = response.json()
                     # Changed from 'verified' to 'filesReceived'
                     if delivery and delivery.get('filesReceived') == True:
                         print("  ✓ Verification successful! Files received by receiver.")
                         return True
-                time.sleep(1)
+                robot_clock.sleep(1)
             except Exception as e:
                 print(f"❌ Error checking filesReceived: {e}")
-                time.sleep(1)
+                robot_clock.sleep(1)
         
         print("  ⚠ Timeout waiting for verification!")
         return False
     
-    def mark_completed(self, delivery_id):
-        """Mark delivery as completed and move to history"""
+    def mark_completed(self, delivery_id, extra=None):
+        """Mark delivery as completed and move to history
+        (extra: additional fields to store with the history record)"""
         try:
             # Get delivery data
             url = f"{self.base_url}/delivery_requests/{delivery_id}.json"
-            response = requests.get(url)
+            response = self.http.get(url)
             
             if response.status_code == 200:
                 delivery = response.json()
                 
                 # Update status and completedAt
                 delivery['status'] = 'completed'
-                delivery['completedAt'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+                delivery['completedAt'] = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(robot_clock.time()))
+                delivery.update(extra or {})
                 
                 # Move to history
                 history_url = f"{self.base_url}/delivery_history/{delivery_id}.json"
-                requests.put(history_url, json=delivery)
+                self.http.put(history_url, json=delivery)
                 
                 # Delete from active requests
-                requests.delete(url)
+                self.close_request(delivery_id)
+                self.http.delete(url)
                 
                 print(f"  ✓ Delivery {delivery_id} marked as completed")
         except Exception as e:
@@ -173,7 +262,132 @@ class FirebaseHandler:
         """Free up compartment in robot status"""
         try:
             url = f"{self.base_url}/robot_status/currentDeliveries/compartment{compartment}.json"
-            requests.put(url, json="")
+            self.http.put(url, json="")
             print(f"  ✓ Compartment {compartment} freed")
         except Exception as e:
             print(f"❌ Error freeing compartment: {e}")
+    
+    def close_request(self, delivery_id):
+        with self.ids_lock:
+            self.closed_ids.add(delivery_id)
+    
+    def open_requests(self, delivery_ids):
+        """The ids whose /delivery_requests node still exists as far as we know -
+        a multi-path PATCH to a deleted one would recreate it holding one field"""
+        with self.ids_lock:
+            return [delivery_id for delivery_id in delivery_ids
+                    if delivery_id not in self.closed_ids
+                    and (self.request_ids is None or delivery_id in self.request_ids)]
+    
+    def assign_compartments(self, assignments, occupancy):
+        """Write compartment assignments in one atomic multi-path update
+        
+        assignments: {delivery_id: compartment}
+        occupancy:   {compartment: delivery_id or ""} for /robot_status/currentDeliveries
+        """
+        update = {}
+        for delivery_id in self.open_requests(assignments):
+            update[f"delivery_requests/{delivery_id}/compartment"] = assignments[delivery_id]
+        for compartment, delivery_id in occupancy.items():
+            update[f"robot_status/currentDeliveries/compartment{compartment}"] = delivery_id
+        try:
+            response = self.http.patch(f"{self.base_url}/.json", json=update)
+            return response.status_code == 200
+        except Exception as e:
+            print(f"❌ Error assigning compartments: {e}")
+            return False
+    
+    def update_etas(self, etas):
+        """Write {delivery_id: {'pickup'/'dropoff': epoch}} to each
+        delivery's `eta` field in one multi-path update"""
+        update = {f"delivery_requests/{delivery_id}/eta": etas[delivery_id]
+                  for delivery_id in self.open_requests(etas)}
+        if not update:
+            return True
+        try:
+            response = self.http.patch(f"{self.base_url}/.json", json=update)
+            return response.status_code == 200
+        except Exception as e:
+            print(f"❌ Error updating ETAs: {e}")
+            return False
+    
+    def report_theft(self, reason):
+        """Raise the theft alert at /robot_status/theftAlert; True once written"""
+        try:
+            url = f"{self.base_url}/robot_status/theftAlert.json"
+            response = self.http.put(url, json={"reason": reason, "active": True,
+                                                "reportedAt": robot_clock.time()})
+            if response.status_code == 200:
+                print("  ✓ Theft reported")
+                return True
+            print(f"  ⚠ Theft report failed: {response.status_code}")
+            return False
+        except Exception as e:
+            print(f"❌ Theft report failed: {e}")
+            return False
+    
+    def start_heartbeat(self):
+        """Write /robot_status/heartbeat every HEARTBEAT_INTERVAL on a background thread"""
+        if self.heartbeat_thread is not None:
+            return
+        self.heartbeat_started = robot_clock.monotonic()
+        self.heartbeat_stopped.clear()
+        self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self.heartbeat_thread.start()
+    
+    def stop_heartbeat(self):
+        self.heartbeat_stopped.set()
+        if self.heartbeat_thread is not None:
+            self.heartbeat_thread.join(timeout=1)
+            self.heartbeat_thread = None
+    
+    def _heartbeat_loop(self):
+        while not self.heartbeat_stopped.is_set():
+            self.heartbeat()
+            self.heartbeat_stopped.wait(HEARTBEAT_INTERVAL)
+    
+    def heartbeat(self):
+        """One heartbeat: server timestamp to /robot_status/heartbeat - True if it got through"""
+        started = robot_clock.monotonic()
+        try:
+            # print=silent: Firebase answers 204 without echoing the value back
+            url = f"{self.base_url}/robot_status/heartbeat.json?print=silent"
+            response = self.http.put(url, json={".sv": "timestamp"}, timeout=HEARTBEAT_TIMEOUT)
+            error = None if response.status_code in (200, 204) else f"HTTP {response.status_code}"
+        except Exception as e:
+            error = e
+        
+        now = robot_clock.monotonic()
+        if error is not None:
+            self.heartbeat_failures += 1
+            if self.heartbeat_failures == 1:
+                print(f"⚠ Firebase heartbeat failed: {error}")
+            return False
+        
+        rtt = now - started
+        self.rtt = rtt if self.rtt is None else self.rtt + 0.2 * (rtt - self.rtt)
+        if self.heartbeat_failures:
+            print(f"✓ Firebase reachable again after {self.heartbeat_failures} failed heartbeat(s)")
+        self.heartbeat_failures = 0
+        self.last_connected_time = now
+        return True
+    
+    def is_connected(self):
+        """Firebase answered a heartbeat within CONNECTION_TIMEOUT - never blocks.
+        True while no heartbeat runs (nothing known) and during the first
+        CONNECTION_TIMEOUT after it starts."""
+        if self.heartbeat_started is None:
+            return True
+        last = self.last_connected_time or self.heartbeat_started
+        return robot_clock.monotonic() - last < CONNECTION_TIMEOUT
+    
+    def get_delivery_history(self):
+        """All archived deliveries, or None if Firebase is unreachable"""
+        try:
+            response = self.http.get(f"{self.base_url}/delivery_history.json")
+            if response.status_code == 200:
+                return list((response.json() or {}).values())
+            return None
+        except Exception as e:
+            print(f"❌ Error fetching delivery history: {e}")
+            return None
@@ -0,0 +1,193 @@
+# fleet.py - Multi-robot coordination: lease-based claiming + dispatch
+#
+# Every robot runs the same dispatcher on the same data, so no central
+# server is needed:
+#   /fleet/robots/{robotId}          - position + plan summary, heartbeat
+#   /delivery_requests/{id}/claim    - {robotId, expiresAt} lease
+# A robot only tries to claim the pending deliveries it estimates it can
+# finish first; the conditional (ETag) write makes the claim exclusive even
+# when two robots' views disagree.
+import robot_clock
+from track_graph import TrackGraph
+from route_planner import parse_timestamp
+from config import (ROOM_COUNT, ROBOT_ID, LEASE_SECONDS, FLEET_STALE_SECONDS,
+                    FLEET_PARKING_ROOMS, TASK_DWELL_TIME)
+
+
+class LeaseManager:
+    """Exclusive, expiring claims on deliveries via Firebase ETag writes"""
+
+    def __init__(self, firebase, robot_id=ROBOT_ID, lease_seconds=LEASE_SECONDS):
+        self.firebase = firebase
+        self.robot_id = robot_id
+        self.lease_seconds = lease_seconds
+
+    def _claim_url(self, delivery_id):
+        return f"{self.firebase.base_url}/delivery_requests/{delivery_id}/claim.json"
+
+    def holder(self, delivery):
+        """Robot currently holding a live lease on a delivery (or None)"""
+        claim = delivery.get('claim') or {}
+        if claim.get('expiresAt', 0) < robot_clock.time():
+            return None
+        return claim.get('robotId')
+
+    def claim(self, delivery_id):
+        """Claim or renew a lease. Returns True if this robot holds it."""
+        url = self._claim_url(delivery_id)
+        try:
+            response = self.firebase.http.get(url, headers={'X-Firebase-ETag': 'true'})
+            if response.status_code != 200:
+                return False
+            etag = response.headers.get('ETag')
+            current = response.json() or {}
+
+            if (current.get('robotId') not in (None, self.robot_id)
+                    and current.get('expiresAt', 0) >= robot_clock.time()):
+                return False  # Someone else holds a live lease
+
+            lease = {'robotId': self.robot_id, 'expiresAt': robot_clock.time() + self.lease_seconds}
+            response = self.firebase.http.put(url, json=lease, headers={'if-match': etag})
+            # 412 = another robot wrote the claim between our GET and PUT
+            return response.status_code == 200
+        except Exception as e:
+            print(f"❌ Claim failed for {delivery_id}: {e}")
+            return False
+
+    def release(self, delivery_id):
+        """Drop our lease (e.g. after a failed pickup)"""
+        try:
+            url = self._claim_url(delivery_id)
+            response = self.firebase.http.get(url, headers={'X-Firebase-ETag': 'true'})
+            current = response.json() or {}
+            if response.status_code == 200 and current.get('robotId') == self.robot_id:
+                self.firebase.http.delete(url, headers={'if-match': response.headers.get('ETag')})
+        except Exception as e:
+            print(f"❌ Release failed for {delivery_id}: {e}")
+
+
+class FleetCoordinator:
+    """Decides which deliveries this robot serves and keeps robots apart"""
+
+    def __init__(self, firebase, robot_id=ROBOT_ID, graph=None):
+        self.firebase = firebase
+        self.robot_id = robot_id
+        self.graph = graph or TrackGraph.ring(ROOM_COUNT + 1)
+        self.leases = LeaseManager(firebase, robot_id)
+        self.robots = {}  # robotId: last published status
+        self.location = 0
+        self.plan_end = 0
+        self.plan_seconds = 0.0
+
+    # ---------- robot status ----------
+
+    def publish(self, location, stops=()):
+        """Publish position and a summary of the remaining plan"""
+        self.location = location
+        self.plan_end = stops[-1][0] if stops else location
+        self.plan_seconds = self._plan_seconds(location, stops)
+        status = {
+            'location': location,
+            'planEnd': self.plan_end,
+            'planSeconds': self.plan_seconds,
+            'updatedAt': robot_clock.time()
+        }
+        try:
+            url = f"{self.firebase.base_url}/fleet/robots/{self.robot_id}.json"
+            self.firebase.http.put(url, json=status)
+        except Exception as e:
+            print(f"❌ Fleet status update failed: {e}")
+
+    def refresh(self):
+        """Fetch other robots' live status (stale entries are ignored)"""
+        try:
+            response = self.firebase.http.get(f"{self.firebase.base_url}/fleet/robots.json")
+            if response.status_code == 200:
+                now = robot_clock.time()
+                self.robots = {
+                    robot_id: status
+                    for robot_id, status in (response.json() or {}).items()
+                    if robot_id != self.robot_id
+                    and now - status.get('updatedAt', 0) < FLEET_STALE_SECONDS
+                }
+        except Exception as e:
+            print(f"❌ Fleet status fetch failed: {e}")
+
+    def _plan_seconds(self, location, stops):
+        seconds = 0.0
+        position = location
+        for room, tasks in stops:
+            seconds += self.graph.travel_time(position, room)
+            seconds += len(tasks) * TASK_DWELL_TIME
+            position = room
+        return seconds
+
+    # ---------- dispatch ----------
+
+    def estimate(self, status, delivery):
+        """Estimated seconds until a robot could finish a delivery, appended
+        to the end of its current plan"""
+        travel = (self.graph.travel_time(status['planEnd'], delivery['pickup'])
+                  + self.graph.travel_time(delivery['pickup'], delivery['destination']))
+        return status['planSeconds'] + travel + 2 * TASK_DWELL_TIME
+
+    def select(self, deliveries, loaded=()):
+        """Return the deliveries this robot owns, claiming new ones it is
+        the best robot for.
+
+        - Picked-up deliveries (files on board) always stay ours
+        - Deliveries under another robot's live lease are skipped
+        - A pending delivery is claimed only if this robot has the lowest
+          estimated completion time (ties → lowest robot id)
+        """
+        self.refresh()
+        me = {'planEnd': self.plan_end, 'planSeconds': self.plan_seconds}
+        owned = []
+
+        for delivery in sorted(deliveries, key=lambda d: parse_timestamp(d.get('createdAt')) or 0):
+            delivery_id = delivery['id']
+            holder = self.leases.holder(delivery)
+
+            if delivery_id in loaded or holder == self.robot_id:
+                self.leases.claim(delivery_id)  # Renew
+                owned.append(delivery)
+                continue
+            if holder is not None or delivery.get('status') != 'pending':
+                continue  # Another robot's (a lapsed lease on an in-progress one too)
+
+            my_eta = self.estimate(me, delivery)
+            best = min([(my_eta, self.robot_id)] +
+                       [(self.estimate(status, delivery), robot_id)
+                        for robot_id, status in self.robots.items()])
+            if best[1] != self.robot_id:
+                continue
+
+            if self.leases.claim(delivery_id):
+                print(f"  🤝 Claimed {delivery_id} (ETA {my_eta:.0f}s)")
+                owned.append(delivery)
+                # Later deliveries in this pass see the added work
+                me = {'planEnd': delivery['destination'], 'planSeconds': my_eta}
+        return owned
+
+    # ---------- spacing ----------
+
+    def wait_for_clearance(self, next_room, timeout=60, poll_interval=1):
+        """Hold at the current marker while another robot occupies the next
+        room, so two robots never share a segment end"""
+        if next_room in FLEET_PARKING_ROOMS:
+            return True
+        deadline = robot_clock.time() + timeout
+        announced = False
+        while True:
+            self.refresh()
+            blocking = [robot_id for robot_id, status in self.robots.items()
+                        if status.get('location') == next_room]
+            if not blocking:
+                return True
+            if robot_clock.time() > deadline:
+                print(f"  ⚠ Room {next_room} still occupied by {', '.join(blocking)} - proceeding")
+                return False
+            if not announced:
+                print(f"  ⏸ Waiting for {', '.join(blocking)} to clear Room {next_room}")
+                announced = True
+            robot_clock.sleep(poll_interval)
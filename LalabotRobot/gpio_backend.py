@@ -0,0 +1,36 @@
+# gpio_backend.py - lgpio / gpiozero on the Pi, in-process fakes on a dev box
+#
+#   LALABOT_FAKE_GPIO=1 python simulator.py ...
+#
+# Hardware modules import lgpio from here, so the real MotorController,
+# LineFollower, ObstacleDetector and CompartmentController run unchanged
+# against fake_lgpio.py and gpiozero's mock pins.
+import os
+from config import IR_LEFT, IR_CENTER, IR_RIGHT, TRIG, ECHO
+
+FAKE_GPIO = os.environ.get('LALABOT_FAKE_GPIO', '').lower() not in ('', '0', 'false', 'no')
+
+if FAKE_GPIO:
+    import fake_lgpio as lgpio
+    # Until a simulation says otherwise: centered on the line, nothing ahead
+    lgpio.set_level(IR_LEFT, 1)
+    lgpio.set_level(IR_CENTER, 0)
+    lgpio.set_level(IR_RIGHT, 1)
+    lgpio.set_echo(TRIG, ECHO, 200)
+else:
+    import lgpio
+
+_pin_factory = None
+
+
+def pin_factory():
+    """gpiozero pin factory for the servos (created once)"""
+    global _pin_factory
+    if _pin_factory is None:
+        if FAKE_GPIO:
+            from gpiozero.pins.mock import MockFactory, MockPWMPin
+            _pin_factory = MockFactory(pin_class=MockPWMPin)
+        else:
+            from gpiozero.pins.lgpio import LGPIOFactory
+            _pin_factory = LGPIOFactory()
+    return _pin_factory
@@ -1,13 +1,30 @@
-import lgpio as GPIO
-import time
+from gpio_backend import lgpio as GPIO
+import robot_clock
 from config import *
 
+from track_map import TrackMap
+from track_graph import TrackGraph
+
 class LineFollower:
-    def __init__(self, motor_controller, obstacle_detector):
+    def __init__(self, motor_controller, obstacle_detector, track_map=None, graph=None):
         self.h = GPIO.gpiochip_open(0)
         self.motors = motor_controller
         self.obstacle_detector = obstacle_detector  # Add obstacle detector
         self.current_location = 0
+        self.previous_location = None  # Marker before current_location (arrival direction)
+        
+        # Surveyed track (track_map.py) - falls back to config.py
+        self.track_map = track_map if track_map is not None else TrackMap.load()
+        if self.track_map is not None:
+            self.marker_confirm_ticks = self.track_map.marker_confirm_ticks()
+        else:
+            self.marker_confirm_ticks = 1
+        
+        # Track topology (track_graph.py) - the single loop unless junctions are mapped
+        self.graph = graph if graph is not None else TrackGraph.for_track(self.track_map)
+        self.on_marker = None  # Optional callback(location) after each room marker
+        self.on_tick = None  # Optional callback(left, center, right) every control tick
+        self.should_abort = None  # Optional callable - navigation stops when it returns True
         
         # Setup IR sensors
         GPIO.gpio_claim_input(self.h, IR_LEFT)
@@ -56,7 +73,7 @@ class LineFollower:
             distance = self.obstacle_detector.get_distance()
             print(f"⚠ OBSTACLE DETECTED! Distance: {distance}cm - STOPPING")
             self.motors.stop()
-            time.sleep(0.5)
+            robot_clock.sleep(0.5)
             return
         
         left, center, right = self.read_sensors()
@@ -92,15 +109,15 @@ class LineFollower:
         # All white - stop
         else:
             self.motors.stop()
-            time.sleep(0.05)
+            robot_clock.sleep(0.05)
             
     # Add to line_follower.py for testing
     def test_line_following(self):
         """Test line following for 10 seconds"""
         print("Testing line following...")
-        start = time.time()
+        start = robot_clock.time()
         
-        while time.time() - start < 10:
+        while robot_clock.time() - start < 10:
             left, center, right = self.read_sensors()
             print(f"L={left} C={center} R={right}", end=" → ")
             
@@ -123,7 +140,7 @@ class LineFollower:
                 print("FORWARD (all black)")
                 self.motors.forward()
             
-            time.sleep(0.1)
+            robot_clock.sleep(0.1)
         
         self.motors.stop()
     
@@ -131,19 +148,29 @@ class LineFollower:
         """Navigate to target room, updating Firebase along the way"""
         print(f"\n🎯 Navigating from Room {self.current_location} → Room {target_room}")
         
-        rooms_to_pass = self.calculate_rooms_to_pass(target_room)
+        path = self.graph.path(self.current_location, target_room)
+        rooms_to_pass = len(path) - 1
         print(f"  📏 Need to pass {rooms_to_pass} room(s)")
         
         rooms_passed = 0
         self.white_line_detected = False
+        white_ticks = 0
+        
+        # Leaving a spur end or a stop in front of a junction may need a turn
+        if rooms_to_pass:
+            self.take_branch(self.graph.turn(path[0], path[1], self.previous_location), path[0])
         
         while rooms_passed < rooms_to_pass:
+            if self.should_abort is not None and self.should_abort():
+                print("  ⚠ Navigation aborted")
+                break
+            
             # Check for obstacles during navigation
             if not self.obstacle_detector.is_path_clear():
                 distance = self.obstacle_detector.get_distance()
                 print(f"⚠ OBSTACLE! Distance: {distance}cm - Waiting...")
                 self.motors.stop()
-                time.sleep(1)
+                robot_clock.sleep(1)
                 continue
             
             # Follow line
@@ -153,16 +180,25 @@ class LineFollower:
             left, center, right = self.read_sensors()
             white_count = (left == 1) + (center == 1) + (right == 1)
             
-            if white_count >= 3 and not self.white_line_detected:
+            if self.on_tick is not None:
+                self.on_tick(left, center, right)
+            
+            white_ticks = white_ticks + 1 if white_count >= 3 else 0
+            
+            if white_ticks >= self.marker_confirm_ticks and not self.white_line_detected:
                 print(f"  🏁 White line detected! (L={left} C={center} R={right})")
                 self.white_line_detected = True
                 self.motors.stop()
                 
-                # Increment room counter
-                self.current_location = (self.current_location + 1) % (ROOM_COUNT + 1)
+                # Advance along the path
+                self.previous_location = self.current_location
+                self.current_location = path[rooms_passed + 1]
                 rooms_passed += 1
                 print(f"  ✓ Passed Room {self.current_location} ({rooms_passed}/{rooms_to_pass})")
                 
+                if self.on_marker is not None:
+                    self.on_marker(self.current_location)
+                
                 # Update Firebase if delivery_id provided
                 if delivery_id is not None:
                     firebase_handler.update_current_location(delivery_id, self.current_location)
@@ -170,30 +206,65 @@ class LineFollower:
                 # Move past white line to avoid re-detection
                 print(f"  → Moving past white line...")
                 self.motors.forward()
-                time.sleep(1.5)  # Longer time to fully pass white line
+                robot_clock.sleep(self.marker_pass_time(self.current_location))  # Fully pass white line
                 self.motors.stop()
                 
+                # At a junction, turn onto the branch towards the next marker
+                if rooms_passed < rooms_to_pass:
+                    self.take_branch(self.graph.turn(self.current_location, path[rooms_passed + 1],
+                                                     self.previous_location), self.current_location)
+                
                 # Reset detection flag
                 self.white_line_detected = False
-                time.sleep(0.5)
+                white_ticks = 0
+                robot_clock.sleep(MARKER_SETTLE_TIME)
             
             elif white_count < 3:
                 # Reset flag when back on black line
                 self.white_line_detected = False
             
             # Match test file timing
-            time.sleep(0.05)
+            robot_clock.sleep(0.05)
         
-        print(f"✓ Arrived at Room {target_room}\n")
+        if rooms_passed >= rooms_to_pass:
+            print(f"✓ Arrived at Room {target_room}\n")
         self.motors.stop()
     
     def calculate_rooms_to_pass(self, target_room):
-        """Calculate how many rooms to pass from current location"""
-        if target_room >= self.current_location:
-            return target_room - self.current_location
+        """Calculate how many markers to pass on the shortest path"""
+        return self.graph.hops(self.current_location, target_room)
+    
+    def take_branch(self, turn, node):
+        """Turn onto the next edge at `node`: spin for a fixed time to leave
+        the current line, then keep spinning until the center sensor finds
+        the branch line. 'straight' needs nothing - follow_line carries on."""
+        if turn == 'straight':
+            return
+        print(f"  ↪ Turning {turn}")
+        if turn == 'left':
+            self.motors.turn_left()
         else:
-            # Wrap around (e.g., from Room 4 to Room 0)
-            return (ROOM_COUNT + 1) - self.current_location + target_room
+            self.motors.turn_right()  # right and uturn
+        robot_clock.sleep(UTURN_TIME if turn == 'uturn' else JUNCTION_TURN_TIME)
+        
+        deadline = robot_clock.monotonic() + BRANCH_SEARCH_TIMEOUT
+        while self.read_sensors()[1] != 0:
+            if robot_clock.monotonic() > deadline:
+                print(f"  ⚠ Branch line not found after {turn} turn")
+                break
+            robot_clock.sleep(0.01)
+        
+        if turn == 'uturn':
+            # Facing back over the marker we just passed - cross it uncounted
+            self.motors.forward()
+            robot_clock.sleep(self.marker_pass_time(node))
+        self.motors.stop()
+    
+    def marker_pass_time(self, node):
+        """Seconds to drive past the marker of a room (surveyed or default)"""
+        if self.track_map is None:
+            return MARKER_PASS_TIME
+        return self.track_map.marker_pass_time(node)
     
     def cleanup(self):
         self.motors.stop()
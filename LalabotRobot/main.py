@@ -1,27 +1,110 @@
+import os
 import time
-import requests 
-from time import sleep
+import robot_clock
 import signal
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from startup import StartupOrchestrator
 from firebase_handler import FirebaseHandler
-from motor_controller import MotorController
-from line_follower import LineFollower
-from compartment_controller import CompartmentController
-from obstacle_detector import ObstacleDetector
-from config import ROOM_COUNT
+from compartment_allocator import CompartmentAllocator
+from eta_model import EtaModel, EtaPublisher
+from track_map import TrackMap
+from track_graph import TrackGraph
+from demand_model import DemandModel
+from robot_state import (RobotState, LOADED_PHASES, PHASE_PLANNED, PHASE_AT_PICKUP, PHASE_PICKED_UP,
+                         PHASE_AT_DESTINATION, PHASE_COMPLETED, PHASE_CANCELLED)
+from route_planner import (RoutePlanner, LivePlan, route_cost, parse_timestamp,
+                           priority_weight, effective_deadline)
+from config import (PICKUP_TIMEOUT, DELIVERY_TIMEOUT, CONTROL_PROCESS, FLEET_MODE, STATE_FILE,
+                    ETA_FILE, DEMAND_MODEL_FILE,
+                    ROBOT_ALLOCATES_COMPARTMENTS, ADMISSION_CONTROL, IDLE_POSITIONING,
+                    IDLE_MIN_DEMAND, IDLE_RETURN_TO_BASE_AFTER)
 
 class DeliveryRobot:
-    def __init__(self):
+    def __init__(self, components=None, data_dir=None, graph=None):
+        """components: prebuilt {'firebase', 'line_follower', 'motors',
+        'obstacle_detector', 'compartments'} used instead of the hardware
+        (simulator.py); data_dir: where local state/learned models are kept
+        (default LalabotRobot/); graph: TrackGraph used instead of the
+        surveyed track_map.json / track_graph.json (benchmarks)"""
         print("\n" + "="*60)
         print("🤖 LALABOT DELIVERY SYSTEM STARTING...")
         print("="*60 + "\n")
         
-        # Initialize all components (ORDER MATTERS!)
-        self.firebase = FirebaseHandler()
-        self.motors = MotorController()
-        self.obstacle_detector = ObstacleDetector()  # Initialize obstacle detector FIRST
-        self.line_follower = LineFollower(self.motors, self.obstacle_detector)  # Then pass it to line follower
-        self.compartments = CompartmentController()
+        # Initialize independent components concurrently. The line follower
+        # needs motors + obstacle detector, so it waits for both. Servo homing
+        # runs in the background and is awaited on first compartment use.
+        self.startup = StartupOrchestrator()
+        if components is not None:
+            for name, component in components.items():
+                self.startup.add(name, lambda component=component: component)
+        else:
+            # Hardware modules need lgpio/gpiozero - imported only when used
+            from motor_controller import MotorController
+            from obstacle_detector import ObstacleDetector
+            from line_follower import LineFollower
+            from compartment_controller import CompartmentController
+            self.startup.add('firebase', FirebaseHandler)
+            if CONTROL_PROCESS:
+                # Motors + sensors live in the control process (control_process.py)
+                from control_process import ControlProcessClient
+                self.startup.add('line_follower', ControlProcessClient)
+            else:
+                self.startup.add('motors', MotorController)
+                self.startup.add('obstacle_detector', ObstacleDetector)
+                self.startup.add('line_follower', LineFollower, deps=('motors', 'obstacle_detector'))
+            self.startup.add('compartments', CompartmentController, background=True)
+            self.startup.add('theft', self.create_theft_monitor, deps=('line_follower', 'firebase'))
+        components = self.startup.run()
+        
+        self.firebase = components['firebase']
+        self.line_follower = components['line_follower']
+        self.theft = components.get('theft')  # Watches the parked robot (None = no monitor)
+        if 'motors' not in components:
+            self.motors = self.line_follower.motors
+            self.obstacle_detector = self.line_follower.obstacle_detector
+        else:
+            self.motors = components['motors']
+            self.obstacle_detector = components['obstacle_detector']
+        
+        def local_file(name):
+            return name if data_dir is None else os.path.join(data_dir, name)
+        
+        # Local state snapshot for warm restarts
+        self.state = RobotState(local_file(STATE_FILE))
+        self.line_follower.on_marker = self.state.set_location
+        
+        # Surveyed track map (python track_map.py) overrides ROOM_COUNT
+        self.track_map = TrackMap.load() if graph is None else None
+        if self.track_map is not None:
+            print(f"🗺️ Track map rev {self.track_map.revision}: {self.track_map.room_count} rooms "
+                  f"(surveyed {self.track_map.surveyed_at})")
+        
+        # Track topology (track_graph.json, else the loop) - edge costs are
+        # the learned segment times, surveyed/default times until driven
+        self.graph = TrackGraph.for_track(self.track_map) if graph is None else graph
+        if not self.graph.is_ring:
+            junctions = [n for n, kind in self.graph.nodes.items() if kind == 'junction']
+            print(f"🗺️ Track graph: {self.graph.node_count} nodes, {len(self.graph.edges)} edges, "
+                  f"junctions {junctions}")
+        self.eta_model = EtaModel(local_file(ETA_FILE), graph=self.graph, track_map=self.track_map)
+        self.graph.update_costs(self.eta_model.learned_segment_time)
+        if hasattr(self.line_follower, 'graph'):
+            self.line_follower.graph = self.graph
+        self.planner = RoutePlanner(graph=self.graph)
+        self.node_count = self.graph.node_count
+        self.allocator = CompartmentAllocator()
+        self.compartment_occupancy = None  # Last written /robot_status/currentDeliveries
+        self.eta_publisher = EtaPublisher(self.firebase)
+        self.stop_arrived = None  # monotonic time the current stop started
+        self.demand_model = DemandModel(local_file(DEMAND_MODEL_FILE), node_count=self.node_count)
+        self.idle_since = None  # monotonic time the robot ran out of work
+        
+        # Fleet mode: only serve deliveries this robot has claimed
+        self.fleet = None
+        if FLEET_MODE:
+            from fleet import FleetCoordinator
+            self.fleet = FleetCoordinator(self.firebase, graph=self.graph)
         
         self.running = True
         
@@ -31,7 +114,36 @@ class DeliveryRobot:
         
         print("\n" + "="*60)
         print("✓ ALL SYSTEMS READY - Robot at Base (Room 0)")
-        print("="*60 + "\n")
+        print("="*60)
+        self.startup.report()
+        print()
+    
+    @property
+    def compartments(self):
+        """Compartment controller (waits for servo homing on first use)"""
+        return self.startup.result('compartments')
+    
+    def create_theft_monitor(self, line_follower, firebase, read_distance=None):
+        """Theft monitor with its own buzzer handle - started by start(),
+        paused while driving (is_moving); None if it can't be set up"""
+        try:
+            from theft_protection import TheftProtection
+            return TheftProtection(line_follower, firebase,
+                                   obstacle_detector=line_follower.obstacle_detector,
+                                   is_moving=lambda: self.is_moving, read_distance=read_distance)
+        except Exception as e:
+            print(f"⚠ Theft monitor disabled: {e}")
+            return None
+    
+    def can_accept_work(self):
+        """False (and stop running) once servo homing failed in the background -
+        accepted deliveries would fail mid-route at the first compartment"""
+        error = self.startup.failure('compartments')
+        if error is None:
+            return True
+        print(f"❌ Compartments unavailable ({error}) - not accepting deliveries")
+        self.running = False
+        return False
     
     def shutdown(self, signum, frame):
         """Clean shutdown handler"""
@@ -43,44 +155,53 @@ class DeliveryRobot:
     def cleanup(self):
         """Cleanup all components"""
         print("\n🧹 Cleaning up...")
-        self.motors.stop()
-        self.compartments.close_all()
-        self.motors.cleanup()
-        self.compartments.cleanup()
-        self.obstacle_detector.cleanup()
-        self.line_follower.cleanup()
+        
+        def release_leases():
+            # Hand unstarted deliveries back to the rest of the fleet
+            if self.fleet is not None:
+                for delivery_id in self.state.ids_in(PHASE_PLANNED):
+                    self.fleet.leases.release(delivery_id)
+        
+        # Each step guarded - one failing component mustn't leave the others' GPIO claimed
+        steps = [('theft monitor', self.theft.cleanup)] if self.theft is not None else []
+        steps += [
+            ('motors', self.motors.stop),
+            ('heartbeat', self.firebase.stop_heartbeat),
+            ('fleet leases', release_leases),
+            ('compartments', lambda: self.compartments.close_all()),
+            ('line follower', self.line_follower.cleanup),  # Stops the motors - before they're released
+            ('motors', self.motors.cleanup),
+            ('compartments', lambda: self.compartments.cleanup()),
+            ('obstacle detector', self.obstacle_detector.cleanup),
+            ('startup', self.startup.shutdown),
+        ]
+        for name, step in steps:
+            try:
+                step()
+            except Exception as e:
+                print(f"⚠ Cleanup of {name} failed: {e}")
         print("✓ Cleanup complete\n")
     
     def plan_route(self, deliveries):
-        """
-        Plan optimal route - visit rooms in order (0→1→2→3→4)
-        Handle ALL pickups/deliveries at each room before moving to next
+        """Plan route with the capacity-aware planner, logging its cost next
+        to the legacy two-sweep planner for comparison
         
-        Returns: List of (room, tasks) where tasks = [(delivery, action), ...]
+        Returns: List of (room, tasks) in visiting order from current location
         """
-        route = {}  # room: [(delivery, 'pickup'/'deliver'), ...]
-        
-        for delivery in deliveries:
-            pickup_room = delivery['pickup']
-            dest_room = delivery['destination']
-            
-            # Add pickup task
-            if pickup_room not in route:
-                route[pickup_room] = []
-            route[pickup_room].append((delivery, 'pickup'))
-            
-            # Add delivery task
-            if dest_room not in route:
-                route[dest_room] = []
-            route[dest_room].append((delivery, 'deliver'))
+        # Re-solve shortest paths with what was learned on the last route
+        self.graph.update_costs(self.eta_model.learned_segment_time)
+        deliveries = self.admit(deliveries, lambda admitted: self.planner.plan(
+            admitted, self.current_location, loaded=self.picked_up_deliveries).stops)
+        plan = self.planner.plan(deliveries, self.current_location,
+                                 loaded=self.picked_up_deliveries)
+        legacy_route = self.plan_route_from_current_location(deliveries)
+        legacy_segments = route_cost(legacy_route, self.current_location, graph=self.graph)
         
-        # Sort rooms in order (circular route)
-        sorted_route = []
-        for room in range(1, 5):  # Rooms 1, 2, 3, 4
-            if room in route:
-                sorted_route.append((room, route[room]))
-        
-        return sorted_route
+        print(f"🧭 Route: {len(plan.stops)} stop(s), {plan.segments} segment(s) "
+              f"[{plan.method}, {plan.elapsed * 1000:.1f}ms] - legacy sweep: {legacy_segments} segment(s)")
+        if plan.lateness > 0:
+            print(f"  ⚠ Estimated {plan.lateness:.0f}s past deadlines")
+        return plan.stops
     
     def plan_route_from_current_location(self, deliveries):
         """
@@ -105,8 +226,8 @@ class DeliveryRobot:
                 break  # All deliveries handled
             
             # Visit rooms in circular order: current → next → ... → current
-            for offset in range(1, ROOM_COUNT + 1):
-                room = (self.current_location + offset) % (ROOM_COUNT + 1)
+            for offset in range(1, self.node_count):
+                room = (self.current_location + offset) % self.node_count
                 
                 # Skip base (Room 0) unless we're delivering there
                 if room == 0:
@@ -136,8 +257,18 @@ class DeliveryRobot:
         
         return sorted_route
     
-    def handle_pickup(self, delivery):
-        """Handle pickup at current location"""
+    def handle_pickup(self, delivery, resume=False):
+        """Handle pickup at current location
+        
+        resume=True when continuing a pickup interrupted by a restart - the
+        sender may already have confirmed, so filesConfirmed is not reset.
+        """
+        self.begin_pickup(delivery, resume)
+        confirmed = self.firebase.wait_for_files_placed(delivery['id'])
+        return self.finish_pickup(delivery, confirmed)
+    
+    def begin_pickup(self, delivery, resume=False):
+        """Open the compartment and get the sender's app ready to confirm"""
         delivery_id = delivery['id']
         compartment = delivery['compartment']
         
@@ -152,19 +283,25 @@ class DeliveryRobot:
         self.compartments.open_compartment(compartment)
         
         # Reset filesConfirmed to false before waiting
-        try:
-            url = f"{self.firebase.base_url}/delivery_requests/{delivery_id}.json"
-            import requests
-            requests.patch(url, json={"filesConfirmed": False})
-            print(f"  → Ready for files (filesConfirmed reset)")
-        except Exception as e:
-            print(f"  ⚠ Could not reset filesConfirmed: {e}")
+        if resume:
+            print(f"  → Resuming pickup (keeping filesConfirmed)")
+        else:
+            try:
+                url = f"{self.firebase.base_url}/delivery_requests/{delivery_id}.json"
+                self.firebase.http.patch(url, json={"filesConfirmed": False})
+                print(f"  → Ready for files (filesConfirmed reset)")
+            except Exception as e:
+                print(f"  ⚠ Could not reset filesConfirmed: {e}")
+    
+    def finish_pickup(self, delivery, confirmed):
+        """Close the compartment once the sender confirmed (or timed out)"""
+        delivery_id = delivery['id']
+        compartment = delivery['compartment']
         
-        # Wait for user confirmation
-        if self.firebase.wait_for_files_placed(delivery_id):
+        if confirmed:
             # Close compartment
             self.compartments.close_compartment(compartment)
-            print(f"  ✓ Pickup complete!\n")
+            print(f"  ✓ Pickup complete! ({delivery_id})\n")
             
             # Update to Stage 1: In Transit
             self.firebase.update_progress_stage(delivery_id, 1)
@@ -173,7 +310,7 @@ class DeliveryRobot:
         else:
             # Timeout - close compartment and CANCEL delivery
             self.compartments.close_compartment(compartment)
-            print(f"  ⚠ Pickup timeout - cancelling delivery\n")
+            print(f"  ⚠ Pickup timeout - cancelling delivery {delivery_id}\n")
             
             # Cancel the delivery in Firebase
             self.firebase.cancel_delivery(delivery_id, "Pickup timeout - sender did not confirm files")
@@ -209,7 +346,7 @@ class DeliveryRobot:
         self.firebase.set_files_confirmed(delivery['id'], False)
         
         # Set deadline for file placement (30 seconds from now)
-        deadline = time.time() + self.CONFIRMATION_TIMEOUT
+        deadline = robot_clock.time() + self.CONFIRMATION_TIMEOUT
         delivery['confirmation_deadline'] = deadline
         self.firebase.set_confirmation_deadline(delivery['id'], deadline)
     
@@ -233,14 +370,14 @@ class DeliveryRobot:
             
         else:
             # Check if deadline exceeded
-            if time.time() > delivery.get('confirmation_deadline', float('inf')):
+            if robot_clock.time() > delivery.get('confirmation_deadline', float('inf')):
                 print(f"⏰ Timeout waiting for file confirmation - {delivery['id']}")
                 
                 # Notify app about timeout
                 self.firebase.notify_confirmation_timeout(delivery['id'])
                 
                 # Extend deadline (give sender another chance)
-                delivery['confirmation_deadline'] = time.time() + self.CONFIRMATION_TIMEOUT
+                delivery['confirmation_deadline'] = robot_clock.time() + self.CONFIRMATION_TIMEOUT
                 
                 # Track timeout count
                 delivery['timeout_count'] = delivery.get('timeout_count', 0) + 1
@@ -266,7 +403,7 @@ class DeliveryRobot:
         self.firebase.update_delivery_stage(delivery['id'], 2)
         
         # Brief pause before arrival
-        time.sleep(1)
+        robot_clock.sleep(1)
         
         # Update Firebase: Stage 3 (Arrived - ready for pickup)
         self.firebase.update_delivery_stage(delivery['id'], 3)
@@ -278,7 +415,7 @@ class DeliveryRobot:
         
         # Update state
         delivery['state'] = 'at_destination'
-        delivery['arrival_time'] = time.time()
+        delivery['arrival_time'] = robot_clock.time()
     
     def wait_for_receiver(self, delivery):
         """Wait for receiver to verify code and collect files"""
@@ -332,12 +469,12 @@ class DeliveryRobot:
             # Check for intersection (room marker detected)
             if self.line_follower.detect_intersection():
                 rooms_passed += 1
-                self.current_location = self.get_next_room(self.current_location)
+                self.current_location = self.graph.next_node(self.current_location, target_room)
                 
                 print(f"   🏠 Passed Room {self.current_location} ({rooms_passed}/{rooms_to_pass})")
                 
                 # Brief pause to avoid double-counting same intersection
-                time.sleep(0.5)
+                robot_clock.sleep(0.5)
         
         # Stop at target
         self.line_follower.stop()
@@ -346,20 +483,8 @@ class DeliveryRobot:
         print(f"✅ Reached Room {target_room}\n")
     
     def calculate_rooms_to_pass(self, current, target):
-        """Calculate how many room markers to pass (circular track)"""
-        # Track layout: 0(Base) -> 1 -> 2 -> 3 -> 4 -> back to 0
-        if target >= current:
-            return target - current
-        else:
-            # Wrap around (e.g., from Room 4 back to Base)
-            return (4 - current) + target
-    
-    def get_next_room(self, current):
-        """Get the next room number in circular path"""
-        next_room = current + 1
-        if next_room > 4:
-            return 0  # Back to base
-        return next_room
+        """Calculate how many markers to pass on the shortest path"""
+        return self.graph.hops(current, target)
 
     def cancel_delivery(self, delivery):
         """Cancel a delivery and clean up"""
@@ -399,98 +524,466 @@ class DeliveryRobot:
         
         # Wait before attempting to continue
         print("⏳ Waiting 10 seconds before retry...")
-        time.sleep(10)
+        robot_clock.sleep(10)
         
-    def start(self):
-        """Main robot loop - check for deliveries and process them"""
-        print("🚀 Starting delivery robot...")
-        print("📡 Listening for new delivery requests...\n")
+    def restore_state(self):
+        """Warm restart - reload the local snapshot and reconcile with Firebase
+        
+        Returns tasks that were interrupted at the current location (open
+        compartment waiting for a confirmation) so they can be resumed first.
+        """
+        if not self.state.load():
+            print("📍 No saved state - starting at Base (Room 0)")
+            self.state.save()
+            return []
+        
+        # at_pickup deliveries are hidden from the normal active filter
+        deliveries = self.firebase.get_active_deliveries(
+            statuses=('pending', 'at_pickup', 'in_progress'), strict=True)
+        
+        if deliveries is None:
+            print("⚠ Firebase unreachable - trusting saved state without reconciling")
+            deliveries = []
+        else:
+            for delivery_id in self.state.reconcile(deliveries):
+                self.firebase.update_status(delivery_id, 'in_progress')
+        
+        self.current_location = self.state.location
+        self.line_follower.current_location = self.state.location
+        self.picked_up_deliveries = self.state.ids_in(*LOADED_PHASES)
+        self.completed_deliveries = self.state.ids_in(PHASE_COMPLETED)
+        self.cancelled_deliveries = self.state.ids_in(PHASE_CANCELLED)
+        
+        print(f"♻️  Warm restart at Room {self.current_location}")
+        loaded = self.state.loaded_compartments()
+        if loaded:
+            for compartment, delivery_id in sorted(loaded.items()):
+                print(f"   📦 Compartment {compartment}: {delivery_id}")
+        if self.state.route:
+            stops = ' → '.join(str(room) for room, tasks in self.state.route)
+            print(f"   🗺️ Interrupted route: {stops} (will be replanned)")
+        
+        by_id = {d['id']: d for d in deliveries}
+        return self.state.interrupted_stop_tasks(by_id)
+    
+    def handle_tasks(self, tasks, resume=False):
+        """Handle all pickup/deliver tasks at the current room concurrently
+        
+        Every compartment is opened at once and all confirmations are awaited
+        by a single Firebase poll loop; each compartment closes as soon as its
+        own confirmation arrives. Returns when all tasks resolved or timed out.
+        """
+        ready = []
+        for delivery, action in tasks:
+            # SAFETY CHECK: Only deliver if pickup happened
+            if action == 'deliver' and delivery['id'] not in self.picked_up_deliveries:
+                print(f"  ⚠ Skipping delivery {delivery['id']} - not picked up yet!")
+                continue
+            ready.append((delivery, action))
+        
+        # Resumed stops started before the restart - don't learn from them
+        self.stop_arrived = None if resume else robot_clock.monotonic()
+        for wave in self.compartment_waves(ready):
+            self.handle_wave(wave, resume)
+    
+    def compartment_waves(self, tasks):
+        """Split tasks so no compartment is used twice in the same wave
+        (a drop-off must empty a compartment before a pickup reuses it)"""
+        waves = []
+        for delivery, action in tasks:
+            for wave in waves:
+                if all(d['compartment'] != delivery['compartment'] for d, a in wave):
+                    wave.append((delivery, action))
+                    break
+            else:
+                waves.append([(delivery, action)])
+        return waves
+    
+    def handle_wave(self, tasks, resume=False):
+        """Open, await and close a set of tasks with distinct compartments"""
+        if not tasks:
+            return
+        by_id = {delivery['id']: (delivery, action) for delivery, action in tasks}
+        waits = {}
+        for delivery, action in tasks:
+            if action == 'pickup':
+                waits[delivery['id']] = ('filesConfirmed', PICKUP_TIMEOUT)
+            else:
+                waits[delivery['id']] = ('filesReceived', DELIVERY_TIMEOUT)
+        
+        with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+            # Open every compartment at once
+            list(pool.map(lambda task: self.begin_task(*task, resume=resume), tasks))
+            
+            finishing = []
+            def on_result(delivery_id, confirmed):
+                delivery, action = by_id[delivery_id]
+                finishing.append(pool.submit(self.finish_task, delivery, action, confirmed))
+            
+            self.firebase.wait_for_confirmations(waits, on_result)
+            for future in finishing:
+                future.result()
+    
+    def begin_task(self, delivery, action, resume=False):
+        if action == 'pickup':
+            self.state.set_phase(delivery, PHASE_AT_PICKUP)
+            self.begin_pickup(delivery, resume=resume)
+        else:
+            # Update to Stage 2 (approaching destination)
+            self.firebase.update_progress_stage(delivery['id'], 2)
+            self.state.set_phase(delivery, PHASE_AT_DESTINATION)
+            self.begin_delivery(delivery)
+    
+    def finish_task(self, delivery, action, confirmed):
+        if confirmed and self.stop_arrived is not None:
+            self.eta_model.record_dwell(action, robot_clock.monotonic() - self.stop_arrived)
+        
+        if action == 'pickup':
+            success = self.finish_pickup(delivery, confirmed)
+            if success:
+                self.firebase.update_status(delivery['id'], 'in_progress')
+                self.picked_up_deliveries.add(delivery['id'])
+                self.state.set_phase(delivery, PHASE_PICKED_UP)
+                self.record_pickup_latency(delivery)
+            else:
+                # Pickup failed - mark as cancelled
+                self.admitted_deliveries.discard(delivery['id'])
+                self.cancelled_deliveries.add(delivery['id'])
+                self.state.set_phase(delivery, PHASE_CANCELLED)
+        
+        else:
+            success = self.finish_delivery(delivery, confirmed)
+            self.admitted_deliveries.discard(delivery['id'])
+            if success:
+                # Mark as completed
+                slack = self.record_deadline_slack(delivery)
+                extra = None if slack is None else {'deadlineSlack': round(slack)}
+                self.firebase.mark_completed(delivery['id'], extra)
+                self.firebase.free_compartment(delivery['id'], delivery['compartment'])
+                self.completed_deliveries.add(delivery['id'])
+                self.picked_up_deliveries.discard(delivery['id'])
+                self.state.set_phase(delivery, PHASE_COMPLETED)
+            else:
+                # Delivery failed - mark as cancelled
+                self.cancelled_deliveries.add(delivery['id'])
+                self.picked_up_deliveries.discard(delivery['id'])
+                self.state.set_phase(delivery, PHASE_CANCELLED)
+    
+    def execute_route(self, route):
+        """Drive a live route one marker at a time, merging new requests and
+        dropping cancelled ones at every marker and after every stop"""
+        plan = LivePlan(route, graph=self.graph)
+        self.allocate_compartments(plan)
+        self.state.set_route(plan.stops)
+        self.publish_etas(plan)
+        
+        while plan.stops and self.running:
+            room, tasks = plan.stops[0]
+            
+            if room != self.current_location:
+                # Drive a single segment, then re-check the plan at the marker
+                next_room = self.graph.next_node(self.current_location, room)
+                if next_room == room:
+                    print(f"\n🗺️ Next stop: Room {room}")
+                current_delivery_id = tasks[0][0]['id'] if tasks else None
+                if self.fleet is not None:
+                    self.fleet.wait_for_clearance(next_room)
+                started = robot_clock.monotonic()
+                self.drive(next_room, current_delivery_id)
+                self.eta_model.record_segment(self.current_location, next_room,
+                                              robot_clock.monotonic() - started)
+                self.current_location = next_room
+                self.state.set_location(next_room)
+                self.sync_plan(plan)
+                continue
+            
+            # Handle all tasks at this room
+            plan.pop_stop()
+            self.state.set_route(plan.stops)
+            self.handle_tasks(tasks)
+            
+            # Failed pickups cannot be delivered later in the plan
+            for delivery, action in tasks:
+                if delivery['id'] in self.cancelled_deliveries:
+                    plan.remove(delivery['id'])
+            self.sync_plan(plan)
+    
+    def drive(self, room, delivery_id=None):
+        """navigate_to_room with is_moving set - the theft monitor pauses meanwhile"""
+        self.is_moving = True
+        try:
+            self.line_follower.navigate_to_room(room, self.firebase, delivery_id)
+        finally:
+            self.is_moving = False
+    
+    def sync_plan(self, plan):
+        """Merge Firebase changes into the live plan (at a marker boundary)"""
+        deliveries = self.firebase.get_active_deliveries(
+            statuses=('pending', 'at_pickup', 'in_progress'), strict=True)
+        if deliveries is None:
+            return  # Firebase unreachable - keep the current plan
+        self.merge_into_plan(plan, deliveries)
+    
+    def merge_into_plan(self, plan, deliveries):
+        """Add new / drop cancelled deliveries given a fresh active list"""
+        deliveries = self.filter_new(deliveries)
+        
+        def trial_route(admitted):
+            trial = LivePlan(plan.stops, graph=self.graph)
+            trial.sync(admitted, self.current_location, self.picked_up_deliveries)
+            return trial.stops
+        deliveries = self.admit(deliveries, trial_route)
+        added, dropped = plan.sync(deliveries, self.current_location, self.picked_up_deliveries)
+        
+        for delivery in added:
+            print(f"  ➕ Merged delivery {delivery['id']} (Room {delivery['pickup']} → Room {delivery['destination']})")
+        for delivery_id in dropped:
+            print(f"  ➖ Dropped cancelled delivery {delivery_id}")
+            if delivery_id in self.picked_up_deliveries:
+                print(f"  ⚠ Files for {delivery_id} are still on board - please collect at base")
+                self.picked_up_deliveries.discard(delivery_id)
+            self.cancelled_deliveries.add(delivery_id)
+            self.state.set_phase({'id': delivery_id}, PHASE_CANCELLED)  # Locked + saved
+        # Re-run after every stop too - drop-offs hand compartments on
+        changed = self.allocate_compartments(plan)
+        if added or dropped or changed:
+            self.state.set_route(plan.stops)
+        if self.fleet is not None:
+            self.fleet.publish(self.current_location, plan.stops)
+        self.publish_etas(plan)
+    
+    def admit(self, deliveries, trial_route):
+        """Admission check for requests not yet on the route
+        
+        A request is admitted only if routing it in (trial_route(deliveries)
+        → stops) does not push an already admitted delivery past its
+        deadline. Deferred requests are retried at the next check, most
+        urgent and then oldest first. Returns the admitted deliveries.
+        """
+        if not ADMISSION_CONTROL:
+            return deliveries
+        admitted = [d for d in deliveries
+                    if d['id'] in self.admitted_deliveries or d['id'] in self.picked_up_deliveries]
+        waiting = [d for d in deliveries if d not in admitted]
+        if not waiting:
+            return admitted
+        waiting.sort(key=lambda d: (-priority_weight(d), parse_timestamp(d.get('createdAt')) or 0))
+        
+        late = self.planner.late_deliveries(trial_route(admitted), self.current_location)
+        for delivery in waiting:
+            delivery_id = delivery['id']
+            now_late = self.planner.late_deliveries(trial_route(admitted + [delivery]),
+                                                    self.current_location)
+            harmed = now_late - late - {delivery_id}
+            if harmed:
+                if delivery_id not in self.deferred_deliveries:
+                    print(f"  ⏸ Deferring {delivery_id} - would make {', '.join(sorted(harmed))} late")
+                    self.deferred_deliveries.add(delivery_id)
+                continue
+            
+            if delivery_id in now_late:
+                print(f"  ⚠ {delivery_id} is estimated to miss its deadline")
+            admitted.append(delivery)
+            late = now_late
+            self.admitted_deliveries.add(delivery_id)
+            self.deferred_deliveries.discard(delivery_id)
+        return admitted
+    
+    def publish_etas(self, plan):
+        """Push pickup/drop-off ETAs for the live plan (only those that moved)"""
+        etas = self.eta_model.etas(plan.stops, self.current_location)
+        for delivery_id, eta in self.eta_publisher.publish(etas).items():
+            times = ', '.join(f"{key} {time.strftime('%H:%M:%S', time.localtime(t))}"
+                              for key, t in eta.items())
+            print(f"  🕒 ETA {delivery_id}: {times}")
+    
+    def allocate_compartments(self, plan):
+        """Assign compartments of unpicked deliveries along the live plan
+        and write them back to Firebase in one atomic update
+        
+        Returns True if any compartment changed.
+        """
+        if not ROBOT_ALLOCATES_COMPARTMENTS:
+            return False
+        loaded = {d_id: c for c, d_id in self.state.loaded_compartments().items()}
+        assignments, occupancy, unassigned = self.allocator.allocate(plan.stops, loaded)
+        
+        for delivery_id in unassigned:
+            # Never open a compartment that may hold someone else's files
+            print(f"  ⚠ No free compartment for {delivery_id} - skipped for now")
+            plan.remove(delivery_id)
+        
+        changed = self.allocator.apply(plan.stops, assignments)
+        for delivery_id, (old, new) in changed.items():
+            print(f"  🗄️ {delivery_id}: compartment {old} → {new}")
         
+        if changed or occupancy != self.compartment_occupancy:
+            if self.firebase.assign_compartments(assignments, occupancy):
+                self.compartment_occupancy = occupancy
+        return bool(changed)
+    
+    def return_to_base(self):
+        """Drive back to Room 0 and reset delivery tracking"""
+        print("\n🏠 No active deliveries - returning to base...")
+        self.park(0)
+    
+    def idle(self):
+        """No active deliveries - wait where the next pickup is most likely
+        (or at base), resetting delivery tracking once per idle period"""
+        just_idle = self.idle_since is None
+        if just_idle:
+            self.idle_since = robot_clock.monotonic()
+        
+        room, reason = self.idle_position()
+        if room == self.current_location and not just_idle:
+            return
+        if room == 0:
+            print(f"\n🏠 No active deliveries - returning to base ({reason})...")
+        else:
+            print(f"\n🅿️ No active deliveries - parking at Room {room} ({reason})...")
+        self.park(room)
+    
+    def idle_position(self):
+        """Where to wait while idle: (room, reason)"""
+        if not IDLE_POSITIONING:
+            return 0, "idle positioning off"
+        if self.fleet is not None:
+            return 0, "fleet mode parks at base"
+        if robot_clock.monotonic() - self.idle_since > IDLE_RETURN_TO_BASE_AFTER:
+            return 0, "idle too long - charging"
+        
+        if self.demand_model.needs_refresh():
+            self.demand_model.refresh(self.firebase)
+        best = self.demand_model.best_position(self.eta_model.travel_time,
+                                               positions=self.graph.stop_nodes())
+        if best is None:
+            return 0, "no delivery history"
+        room, expected, demand = best
+        if demand < IDLE_MIN_DEMAND:
+            return 0, "little demand expected"
+        return room, f"expected {expected:.0f}s to next pickup"
+    
+    def park(self, room):
+        """Drive to `room` and reset delivery tracking"""
+        if self.fleet is not None:
+            # One segment at a time so spacing is kept on the way back
+            while self.current_location != room and self.running:
+                next_room = self.graph.next_node(self.current_location, room)
+                self.fleet.wait_for_clearance(next_room)
+                self.drive(next_room)
+                self.current_location = next_room
+                self.state.set_location(next_room)
+                self.fleet.publish(next_room)
+        elif room != self.current_location:
+            self.drive(room)
+            self.current_location = room
+            self.state.set_location(room)
+        self.completed_deliveries.clear()
+        self.picked_up_deliveries.clear()
+        self.cancelled_deliveries.clear()  # Reset cancelled tracking
+        self.admitted_deliveries.clear()
+        self.deferred_deliveries.clear()
+        self.state.clear()
+    
+    def record_pickup_latency(self, delivery):
+        """Log request-to-pickup latency (createdAt → files confirmed)"""
+        created = parse_timestamp(delivery.get('createdAt'))
+        if created is None:
+            return
+        latency = robot_clock.time() - created
+        self.pickup_latencies.append(latency)
+        average = sum(self.pickup_latencies) / len(self.pickup_latencies)
+        print(f"  ⏱ Request-to-pickup: {latency:.0f}s (average {average:.0f}s over {len(self.pickup_latencies)})")
+    
+    def record_deadline_slack(self, delivery):
+        """Log slack (deadline - drop-off time) and the running deadline hit rate
+        
+        Returns slack in seconds, or None if the delivery has no deadline.
+        """
+        deadline = effective_deadline(delivery)
+        if deadline is None:
+            return None
+        slack = deadline - robot_clock.time()
+        self.deadline_slacks.append(slack)
+        hits = sum(1 for s in self.deadline_slacks if s >= 0)
+        total = len(self.deadline_slacks)
+        print(f"  ⏱ Deadline slack: {slack:+.0f}s (hit rate {hits}/{total} = {hits / total:.0%})")
+        return slack
+    
+    def prepare_run(self):
+        """Reset run-time tracking and restore saved state
+        
+        Returns tasks interrupted at the current room (see restore_state)
+        """
         self.current_location = 0
         self.active_deliveries = []
         self.is_moving = False
         self.completed_deliveries = set()
         self.picked_up_deliveries = set()
         self.cancelled_deliveries = set()  # NEW: Track cancelled deliveries
+        self.admitted_deliveries = set()  # Passed the admission check
+        self.deferred_deliveries = set()  # Waiting for room in the schedule
+        self.pickup_latencies = []
+        self.deadline_slacks = []
+        
+        return self.restore_state()
+    
+    def filter_new(self, deliveries):
+        """Filter out completed AND cancelled deliveries
+        (and, in fleet mode, deliveries served by other robots)"""
+        deliveries = [
+            d for d in deliveries 
+            if d['id'] not in self.completed_deliveries 
+            and d['id'] not in self.cancelled_deliveries  # Skip cancelled ones
+        ]
+        if self.fleet is not None:
+            deliveries = self.fleet.select(deliveries, loaded=self.picked_up_deliveries)
+        return deliveries
+    
+    def start(self):
+        """Main robot loop - check for deliveries and process them"""
+        print("🚀 Starting delivery robot...")
+        
+        interrupted_tasks = self.prepare_run()
+        self.firebase.start_heartbeat()
+        if self.theft is not None:
+            self.theft.start()
+        
+        print("📡 Listening for new delivery requests...\n")
         
         try:
-            while self.running:
+            if interrupted_tasks and self.can_accept_work():
+                print(f"\n♻️  Resuming {len(interrupted_tasks)} interrupted task(s) at Room {self.current_location}")
+                self.handle_tasks(interrupted_tasks, resume=True)
+            
+            while self.running and self.can_accept_work():
                 # Check for new deliveries
                 all_deliveries = self.firebase.get_active_deliveries()
+                if self.fleet is not None:
+                    self.fleet.publish(self.current_location)  # Idle - no plan
                 
                 # Filter out completed AND cancelled deliveries
-                new_deliveries = [
-                    d for d in all_deliveries 
-                    if d['id'] not in self.completed_deliveries 
-                    and d['id'] not in self.cancelled_deliveries  # Skip cancelled ones
-                ]
+                new_deliveries = self.filter_new(all_deliveries)
                 
                 if new_deliveries:
                     print(f"\n📋 Found {len(new_deliveries)} active delivery request(s)")
+                    self.idle_since = None
                     
                     # Plan route from CURRENT location
-                    route = self.plan_route_from_current_location(new_deliveries)
+                    route = self.plan_route(new_deliveries)
                     
                     if route:
-                        # Execute route
-                        for room, tasks in route:
-                            print(f"\n🗺️ Next stop: Room {room}")
-                            
-                            # Navigate to room
-                            current_delivery_id = tasks[0][0]['id'] if tasks else None
-                            self.line_follower.navigate_to_room(room, self.firebase, current_delivery_id)
-                            self.current_location = room
-                            
-                            # Handle all tasks at this room
-                            for delivery, action in tasks:
-                                if action == 'pickup':
-                                    success = self.handle_pickup(delivery)
-                                    if success:
-                                        self.firebase.update_status(delivery['id'], 'in_progress')
-                                        self.picked_up_deliveries.add(delivery['id'])
-                                    else:
-                                        # Pickup failed - mark as cancelled
-                                        self.cancelled_deliveries.add(delivery['id'])
-                                
-                                elif action == 'deliver':
-                                    # SAFETY CHECK: Only deliver if pickup happened
-                                    if delivery['id'] not in self.picked_up_deliveries:
-                                        print(f"  ⚠ Skipping delivery {delivery['id']} - not picked up yet!")
-                                        continue
-                                    
-                                    # Update to Stage 2 (approaching destination)
-                                    self.firebase.update_progress_stage(delivery['id'], 2)
-                                    
-                                    # Handle the delivery
-                                    success = self.handle_delivery(delivery)
-                                    
-                                    if success:
-                                        # Mark as completed
-                                        self.firebase.mark_completed(delivery['id'])
-                                        self.firebase.free_compartment(delivery['id'], delivery['compartment'])
-                                        self.completed_deliveries.add(delivery['id'])
-                                        self.picked_up_deliveries.discard(delivery['id'])
-                                    else:
-                                        # Delivery failed - mark as cancelled
-                                        self.cancelled_deliveries.add(delivery['id'])
-                                        self.picked_up_deliveries.discard(delivery['id'])
-                        
+                        self.execute_route(route)
                         print("\n✅ Current route completed!\n")
                     else:
                         print("📍 No deliveries to handle from current location")
                 
                 else:
-                    # No active deliveries - return to base if not already there
-                    if self.current_location != 0:
-                        print("\n🏠 No active deliveries - returning to base...")
-                        self.line_follower.navigate_to_room(0, self.firebase, None)
-                        self.current_location = 0
-                        self.completed_deliveries.clear()
-                        self.picked_up_deliveries.clear()
-                        self.cancelled_deliveries.clear()  # Reset cancelled tracking
+                    # No active deliveries - park at the idle position
+                    self.idle()
                 
                 # Check again in 3 seconds
-                sleep(3)
+                robot_clock.sleep(3)
                 
         except KeyboardInterrupt:
             print("\n⚠️ Interrupted by user")
@@ -502,6 +995,12 @@ class DeliveryRobot:
     
     def handle_delivery(self, delivery):
         """Handle delivery at destination"""
+        self.begin_delivery(delivery)
+        verified = self.firebase.wait_for_verification(delivery['id'])
+        return self.finish_delivery(delivery, verified)
+    
+    def begin_delivery(self, delivery):
+        """Open the compartment and enable the receiver's verification"""
         delivery_id = delivery['id']
         compartment = delivery['compartment']
         
@@ -515,24 +1014,27 @@ class DeliveryRobot:
         # Set ready for pickup (triggers receiver app to show verification)
         try:
             url = f"{self.firebase.base_url}/delivery_requests/{delivery_id}.json"
-            import requests
-            requests.patch(url, json={"readyForPickup": True})
+            self.firebase.http.patch(url, json={"readyForPickup": True})
             print(f"  → Ready for pickup (verification enabled)")
         except Exception as e:
             print(f"  ⚠ Could not set readyForPickup: {e}")
         
         # Open compartment
         self.compartments.open_compartment(compartment)
+    
+    def finish_delivery(self, delivery, verified):
+        """Close the compartment once the receiver verified (or timed out)"""
+        delivery_id = delivery['id']
+        compartment = delivery['compartment']
         
-        # Wait for receiver to verify and collect
-        if self.firebase.wait_for_verification(delivery_id):
+        if verified:
             self.compartments.close_compartment(compartment)
-            print(f"  ✓ Delivery complete!\n")
+            print(f"  ✓ Delivery complete! ({delivery_id})\n")
             return True
         else:
             # Timeout - close compartment and CANCEL delivery
             self.compartments.close_compartment(compartment)
-            print(f"  ⚠ Verification timeout - cancelling delivery\n")
+            print(f"  ⚠ Verification timeout - cancelling delivery {delivery_id}\n")
             
             # Cancel the delivery in Firebase
             self.firebase.cancel_delivery(delivery_id, "Delivery timeout - receiver did not verify")
@@ -552,7 +1054,11 @@ if __name__ == "__main__":
     """)
     
     try:
-        robot = DeliveryRobot()
+        if "--async" in sys.argv:
+            from async_robot import AsyncDeliveryRobot
+            robot = AsyncDeliveryRobot()
+        else:
+            robot = DeliveryRobot()
         robot.start()
     except Exception as e:
         print(f"\n❌ Fatal error during startup: {e}")
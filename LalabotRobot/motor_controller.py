@@ -1,4 +1,4 @@
-import lgpio as GPIO
+from gpio_backend import lgpio as GPIO
 import time
 from config import *
 
@@ -18,10 +18,13 @@ class MotorController:
         # Enable motor driver
         GPIO.gpio_write(self.h, STBY, 1)
         
+        self.last_command = 'stop'  # Last drive command (for status snapshots)
+        
         print("✓ Motor controller initialized")
     
     def forward(self, speed=1):
         """Move forward at full speed"""
+        self.last_command = 'forward'
         # Motor A (left) is reversed - forward is 0,1
         GPIO.gpio_write(self.h, AIN1, 0)
         GPIO.gpio_write(self.h, AIN2, 1)
@@ -36,11 +39,13 @@ class MotorController:
     
     def stop(self):
         """Stop both motors"""
+        self.last_command = 'stop'
         GPIO.gpio_write(self.h, PWMA, 0)
         GPIO.gpio_write(self.h, PWMB, 0)
     
     def turn_left(self, speed=1):
         """Turn left - left motor backward, right motor forward (sharp turn)"""
+        self.last_command = 'turn_left'
         # Motor A (left) reversed - backward is 1,0
         GPIO.gpio_write(self.h, AIN1, 1)
         GPIO.gpio_write(self.h, AIN2, 0)
@@ -53,6 +58,7 @@ class MotorController:
     
     def turn_right(self, speed=1):
         """Turn right - left motor forward, right motor backward (sharp turn)"""
+        self.last_command = 'turn_right'
         # Motor A (left) reversed - forward is 0,1
         GPIO.gpio_write(self.h, AIN1, 0)
         GPIO.gpio_write(self.h, AIN2, 1)
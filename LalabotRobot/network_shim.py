@@ -0,0 +1,223 @@
+"""
+Network Shim - Latency and faults between FirebaseHandler and the server
+
+Wraps the HTTP transport (the requests module on the robot, the
+SimulatedDatabase in simulator.py) and makes every call slow or fail like a
+bad Wi-Fi link would: a latency distribution, dropped connections, requests
+that hang until they time out, 5xx answers and disconnect windows (fixed or
+at random). Counts how long each Firebase call blocked its caller, split by
+the robot's main thread (the one driving) and worker threads.
+
+    LALABOT_NETWORK=slow_wifi python main.py         # on the robot, real Firebase
+    python simulator.py --network corridor --hours 4 # in the simulator
+
+Profile (name from PROFILES or a JSON file):
+{
+  "latency": {"dist": "lognormal", "median": 0.3, "sigma": 0.8},
+  "dropRate": 0.02,          # connection reset - fails at once
+  "timeoutRate": 0.01,       # request hangs until "timeout" seconds, then fails
+  "timeout": 10,
+  "serverErrorRate": 0.01,   # 503 from the server
+  "outages": [{"start": 600, "duration": 45}],      # seconds after the shim starts
+  "outageEvery": 900, "outageDuration": {"dist": "uniform", "low": 10, "high": 60},
+  "connectTimeout": 3        # time to give up on a dead link
+}
+Latency and outage durations use workload.response_time specs (seconds).
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+
+import robot_clock
+from robot_clock import VirtualClock
+from workload import response_time
+
+PROFILES = {
+    'good': {'latency': {'dist': 'lognormal', 'median': 0.05, 'sigma': 0.3}},
+    'slow_wifi': {'latency': {'dist': 'lognormal', 'median': 0.4, 'sigma': 0.8},
+                  'dropRate': 0.02, 'timeoutRate': 0.01, 'serverErrorRate': 0.01},
+    'corridor': {'latency': {'dist': 'lognormal', 'median': 0.3, 'sigma': 0.8},
+                 'dropRate': 0.02, 'timeoutRate': 0.02,
+                 'outageEvery': 900, 'outageDuration': {'dist': 'uniform', 'low': 10, 'high': 60}},
+    'offline': {'outages': [{'start': 0, 'duration': 1e9}]},
+}
+
+
+def load_profile(name_or_path):
+    """Profile dict from PROFILES or a JSON file"""
+    if name_or_path in PROFILES:
+        return dict(PROFILES[name_or_path])
+    with open(name_or_path) as f:
+        return json.load(f)
+
+
+def _errors():
+    """(ConnectionError, Timeout) of requests if installed, else the builtins"""
+    try:
+        import requests
+        return requests.exceptions.ConnectionError, requests.exceptions.Timeout
+    except ImportError:
+        return ConnectionError, TimeoutError
+
+
+class ShimResponse:
+    """Error answer made up by the shim (never reached the server)"""
+
+    def __init__(self, status_code, error):
+        self.status_code = status_code
+        self.headers = {}
+        self.error = error
+
+    def json(self):
+        return {'error': self.error}
+
+
+class NetworkShim:
+    """Drop-in for FirebaseHandler.http that delays / fails calls to `transport`.
+
+    On a VirtualClock only the main thread's delays advance time (the clock
+    has one driving thread); calls from worker threads are still counted and
+    can still fail.
+    """
+
+    def __init__(self, transport, profile=None, seed=0):
+        profile = profile or {}
+        self.transport = transport
+        self.latency = profile.get('latency')
+        self.drop_rate = profile.get('dropRate', 0.0)
+        self.timeout_rate = profile.get('timeoutRate', 0.0)
+        self.timeout = profile.get('timeout', 10.0)
+        self.server_error_rate = profile.get('serverErrorRate', 0.0)
+        self.connect_timeout = profile.get('connectTimeout', 3.0)
+        self.outage_every = profile.get('outageEvery')
+        self.outage_duration = profile.get('outageDuration', {'dist': 'fixed', 'seconds': 30})
+        self.seed = seed
+        self.rng = random.Random(seed)  # Outage windows
+        self.call_counts = {}  # (method, url): calls so far
+        self.lock = threading.Lock()
+        self.started = robot_clock.time()
+        self.outages = [(self.started + o['start'], self.started + o['start'] + o['duration'])
+                        for o in profile.get('outages', [])]
+        self.next_random_outage = self._draw_outage(self.started) if self.outage_every else None
+        self.stats = {}  # caller: {'calls', 'failures', 'seconds', 'mainSeconds', 'maxSeconds'}
+
+    # ---------- faults ----------
+
+    def _draw_outage(self, after):
+        start = after + self.rng.expovariate(1 / self.outage_every)
+        return start, start + response_time(self.outage_duration, self.rng)
+
+    def offline(self, now=None):
+        """True while a disconnect window is open"""
+        now = robot_clock.time() if now is None else now
+        with self.lock:
+            while self.next_random_outage and self.next_random_outage[1] < now:
+                self.outages.append(self.next_random_outage)
+                self.next_random_outage = self._draw_outage(self.next_random_outage[1])
+            windows = self.outages + ([self.next_random_outage] if self.next_random_outage else [])
+        return any(start <= now < end for start, end in windows)
+
+    def _wait(self, seconds):
+        on_main = threading.current_thread() is threading.main_thread()
+        if seconds > 0 and (on_main or not isinstance(robot_clock.current(), VirtualClock)):
+            robot_clock.sleep(seconds)
+
+    def _record(self, caller, seconds, failed):
+        on_main = threading.current_thread() is threading.main_thread()
+        with self.lock:
+            stats = self.stats.setdefault(caller, {'calls': 0, 'failures': 0, 'seconds': 0.0,
+                                                   'mainSeconds': 0.0, 'maxSeconds': 0.0})
+            stats['calls'] += 1
+            stats['failures'] += failed
+            stats['seconds'] += seconds
+            stats['mainSeconds'] += seconds if on_main else 0.0
+            stats['maxSeconds'] = max(stats['maxSeconds'], seconds)
+
+    def _call(self, method, url, kwargs):
+        caller = sys._getframe(2).f_code.co_name  # The FirebaseHandler method
+        connection_error, timeout_error = _errors()
+        with self.lock:
+            count = self.call_counts.get((method, url), 0)
+            self.call_counts[(method, url)] = count + 1
+        # A generator of its own per call: worker threads calling in a different
+        # order can't change which calls fail, so a seed repeats exactly
+        rng = random.Random(f"{self.seed}:{method}:{url}:{count}")
+        delay = response_time(self.latency, rng) if self.latency else 0.0
+        roll = rng.random()
+        if self.offline():
+            self._wait(self.connect_timeout)
+            self._record(caller, self.connect_timeout, True)
+            raise connection_error(f"network unreachable: {method.upper()} {url}")
+        if roll < self.drop_rate:
+            self._wait(delay / 2)
+            self._record(caller, delay / 2, True)
+            raise connection_error(f"connection reset: {method.upper()} {url}")
+        roll -= self.drop_rate
+        if roll < self.timeout_rate:
+            seconds = kwargs.get('timeout') or self.timeout
+            self._wait(seconds)
+            self._record(caller, seconds, True)
+            raise timeout_error(f"timed out after {seconds}s: {method.upper()} {url}")
+        roll -= self.timeout_rate
+        self._wait(delay)
+        if roll < self.server_error_rate:
+            self._record(caller, delay, True)
+            return ShimResponse(503, "Service Unavailable")
+        response = getattr(self.transport, method)(url, **kwargs)
+        self._record(caller, delay, False)
+        return response
+
+    # ---------- HTTP verbs ----------
+
+    def get(self, url, **kwargs):
+        return self._call('get', url, kwargs)
+
+    def put(self, url, **kwargs):
+        return self._call('put', url, kwargs)
+
+    def patch(self, url, **kwargs):
+        return self._call('patch', url, kwargs)
+
+    def post(self, url, **kwargs):
+        return self._call('post', url, kwargs)
+
+    def delete(self, url, **kwargs):
+        return self._call('delete', url, kwargs)
+
+    # ---------- report ----------
+
+    def summary(self):
+        """Per-caller blocking time, worst first"""
+        with self.lock:
+            rows = sorted(self.stats.items(), key=lambda item: -item[1]['seconds'])
+            return {caller: {'calls': s['calls'], 'failures': s['failures'],
+                             'blockedSeconds': round(s['seconds'], 1),
+                             'mainThreadSeconds': round(s['mainSeconds'], 1),
+                             'maxSeconds': round(s['maxSeconds'], 2)} for caller, s in rows}
+
+    def print(self):
+        summary = self.summary()
+        print(f"\n📡 Network: {sum(s['calls'] for s in summary.values())} calls, "
+              f"{sum(s['failures'] for s in summary.values())} failed, "
+              f"{sum(s['mainThreadSeconds'] for s in summary.values()):.0f}s blocking the main thread")
+        print(f"   {'caller':<32} {'calls':>6} {'failed':>7} {'blocked':>9} {'main':>8} {'worst':>7}")
+        for caller, s in summary.items():
+            print(f"   {caller:<32} {s['calls']:>6} {s['failures']:>7} {s['blockedSeconds']:>8}s "
+                  f"{s['mainThreadSeconds']:>7}s {s['maxSeconds']:>6}s")
+
+
+def from_environment(transport):
+    """NetworkShim around transport if LALABOT_NETWORK names a profile, else transport"""
+    profile = os.environ.get('LALABOT_NETWORK')
+    if not profile:
+        return transport
+    try:
+        shim = NetworkShim(transport, load_profile(profile))
+        print(f"⚠ Network shim active: {profile}")
+        return shim
+    except Exception as e:
+        print(f"❌ Network profile {profile!r} not loaded: {e}")
+        return transport
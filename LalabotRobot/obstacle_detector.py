@@ -1,5 +1,5 @@
-import lgpio as GPIO
-import time
+from gpio_backend import lgpio as GPIO
+import robot_clock
 from config import *
 
 class ObstacleDetector:
@@ -7,34 +7,38 @@ class ObstacleDetector:
         self.h = GPIO.gpiochip_open(0)
         GPIO.gpio_claim_output(self.h, TRIG)
         GPIO.gpio_claim_input(self.h, ECHO)
+        self.last_distance = None  # Most recent reading (None = no echo)
         print("✓ Obstacle detector initialized")
     
     def get_distance(self):
         """Measure distance in centimeters"""
         GPIO.gpio_write(self.h, TRIG, 0)
-        time.sleep(0.00001)
+        robot_clock.sleep(0.00001)
         GPIO.gpio_write(self.h, TRIG, 1)
-        time.sleep(0.00001)
+        robot_clock.sleep(0.00001)
         GPIO.gpio_write(self.h, TRIG, 0)
         
-        timeout = time.time() + 0.1
-        pulse_start = time.time()
+        timeout = robot_clock.time() + 0.1
+        pulse_start = robot_clock.time()
         while GPIO.gpio_read(self.h, ECHO) == 0:
-            pulse_start = time.time()
+            pulse_start = robot_clock.time()
             if pulse_start > timeout:
+                self.last_distance = None
                 return None
         
-        timeout = time.time() + 0.1
-        pulse_end = time.time()
+        timeout = robot_clock.time() + 0.1
+        pulse_end = robot_clock.time()
         while GPIO.gpio_read(self.h, ECHO) == 1:
-            pulse_end = time.time()
+            pulse_end = robot_clock.time()
             if pulse_end > timeout:
+                self.last_distance = None
                 return None
         
         pulse_duration = pulse_end - pulse_start
         distance = round(pulse_duration * 17150, 2)
         
-        return distance if 2 <= distance <= 400 else None
+        self.last_distance = distance if 2 <= distance <= 400 else None
+        return self.last_distance
     
     def is_path_clear(self):
         """Check if path is clear (no obstacle within threshold)"""
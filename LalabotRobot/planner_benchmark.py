@@ -0,0 +1,266 @@
+"""
+Planner Benchmark - RoutePlanner at building scale
+
+Generates planner inputs far beyond today's 5-node loop (hundreds of rooms,
+thousands of pending deliveries, many compartments) and measures planning
+time, peak memory and route cost, so planner changes can be judged on both
+quality and runtime before they reach the robot. Every plan is also checked
+for precedence and capacity violations.
+
+    python planner_benchmark.py                          # all scales, building topology
+    python planner_benchmark.py --scale wing --scale building --repeats 5
+    python planner_benchmark.py --rooms 250 --deliveries 2000 --capacity 12 --topology ring --json
+
+Route cost is compared with serving the deliveries one at a time in arrival
+order (FIFO) - the ratio shows what batching buys at each scale.
+"""
+
+import json
+import math
+import random
+import statistics
+import time
+import tracemalloc
+
+from route_planner import RoutePlanner, LivePlan, route_cost
+from track_graph import TrackGraph
+from config import EXACT_PLANNER_MAX_DELIVERIES
+
+NOW = 1_750_000_000.0  # Fixed epoch so deadlines are reproducible
+
+# name: (rooms, deliveries, capacity)
+SCALES = {
+    'today': (4, 6, 3),
+    'floor': (20, 40, 3),
+    'wing': (100, 200, 6),
+    'building': (300, 1000, 10),
+    'campus': (600, 3000, 30),
+}
+
+
+# ---------- inputs ----------
+
+def building_graph(rooms, spur_length=5, seed=0):
+    """Main corridor loop with a dead-end spur of spur_length rooms at every
+    junction - the robot drives in, turns around at the end and comes back"""
+    rng = random.Random(seed)
+    nodes = {0: 'base'}
+    edges = {}
+    spurs = math.ceil(rooms / spur_length)
+    loop = [0]
+    next_id = 1
+    placed = 0
+    spur_rooms = []
+    for _ in range(spurs):
+        junction = next_id
+        nodes[junction] = 'junction'
+        loop.append(junction)
+        next_id += 1
+        chain = []
+        for _ in range(min(spur_length, rooms - placed)):
+            nodes[next_id] = 'room'
+            chain.append(next_id)
+            next_id += 1
+            placed += 1
+        spur_rooms.append((junction, chain))
+
+    for a, b in zip(loop, loop[1:] + loop[:1]):
+        edges[(a, b)] = {'cost': rng.uniform(6, 14)}
+    for junction, chain in spur_rooms:
+        following = loop[(loop.index(junction) + 1) % len(loop)]
+        edges[(junction, following)]['turns'] = {chain[0]: 'right'}
+        path = [junction] + chain
+        for i, (a, b) in enumerate(zip(path, path[1:])):
+            cost = rng.uniform(3, 8)
+            # Into the spur: straight on (left off the corridor), U-turn if we just came out of b
+            edges[(a, b)] = {'cost': cost, 'turn': 'left' if a == junction else 'straight',
+                             'turns': {b: 'uturn'}}
+            # Back out: straight on after turning round further in, U-turn otherwise
+            edges[(b, a)] = {'cost': cost, 'turn': 'uturn',
+                             'turns': {path[i + 2]: 'straight'} if i + 2 < len(path) else {}}
+    return TrackGraph(nodes, edges)
+
+
+def make_graph(topology, rooms, seed=0):
+    if topology == 'ring':
+        rng = random.Random(seed)
+        costs = [rng.uniform(6, 14) for _ in range(rooms + 1)]
+        return TrackGraph.ring(rooms + 1, lambda a, b: costs[a])
+    if topology == 'building':
+        return building_graph(rooms, seed=seed)
+    raise ValueError(f"Unknown topology {topology!r}")
+
+
+def make_deliveries(graph, count, capacity, seed=0):
+    """Pending deliveries between random rooms (some urgent, some with a
+    deadline) and the ids of those already in a compartment"""
+    rng = random.Random(seed)
+    rooms = [node for node in graph.stop_nodes() if node != 0]
+    deliveries = []
+    for number in range(count):
+        pickup, destination = rng.sample(rooms, 2)
+        delivery = {
+            'id': f"bench-{number:05d}",
+            'pickup': pickup,
+            'destination': destination,
+            'compartment': 1 + number % capacity,
+            'createdAt': int((NOW - rng.uniform(0, 1800)) * 1000),
+        }
+        roll = rng.random()
+        if roll < 0.1:
+            delivery['priority'] = 'urgent'
+        elif roll < 0.2:
+            delivery['deadline'] = int((NOW + rng.uniform(600, 7200)) * 1000)
+        deliveries.append(delivery)
+    loaded = [d['id'] for d in deliveries[:min(capacity // 2, count)]]
+    return deliveries, loaded
+
+
+# ---------- checks and baselines ----------
+
+def check_plan(stops, deliveries, loaded, capacity):
+    """Problems with a plan: missing/duplicate tasks, delivery before
+    pickup, more than `capacity` deliveries on board"""
+    problems = []
+    on_board = set(loaded)
+    picked, delivered = set(), set()
+    for room, tasks in stops:
+        for delivery, action in sorted(tasks, key=lambda task: task[1] != 'deliver'):
+            d_id = delivery['id']
+            if action == 'pickup':
+                if d_id in picked or d_id in on_board:
+                    problems.append(f"{d_id} picked up twice")
+                picked.add(d_id)
+                on_board.add(d_id)
+                if len(on_board) > capacity:
+                    problems.append(f"{len(on_board)} on board at room {room}")
+            else:
+                if d_id not in on_board:
+                    problems.append(f"{d_id} delivered before pickup")
+                on_board.discard(d_id)
+                delivered.add(d_id)
+            if room != (delivery['pickup'] if action == 'pickup' else delivery['destination']):
+                problems.append(f"{d_id} {action} at the wrong room {room}")
+    missing = {d['id'] for d in deliveries} - delivered
+    if missing:
+        problems.append(f"{len(missing)} deliveries never delivered")
+    return problems
+
+
+def fifo_route(deliveries, loaded):
+    """One delivery at a time in arrival order (loaded ones dropped off first)"""
+    route = []
+    for delivery in deliveries:
+        if delivery['id'] in loaded:
+            route.append((delivery['destination'], [(delivery, 'deliver')]))
+    for delivery in deliveries:
+        if delivery['id'] not in loaded:
+            route.append((delivery['pickup'], [(delivery, 'pickup')]))
+            route.append((delivery['destination'], [(delivery, 'deliver')]))
+    return route
+
+
+# ---------- benchmark ----------
+
+def run_scale(rooms, count, capacity, topology='building', repeats=3, seed=0,
+              exact_limit=EXACT_PLANNER_MAX_DELIVERIES):
+    """Plan one generated input `repeats` times; returns a metrics dict"""
+    started = time.perf_counter()
+    graph = make_graph(topology, rooms, seed)
+    graph_seconds = time.perf_counter() - started
+    deliveries, loaded = make_deliveries(graph, count, capacity, seed)
+    planner = RoutePlanner(capacity=capacity, exact_limit=exact_limit, graph=graph)
+
+    timings = []
+    for _ in range(repeats):
+        plan = planner.plan(deliveries, 0, loaded=loaded, now=NOW)
+        timings.append(plan.elapsed)
+
+    tracemalloc.start()
+    planner.plan(deliveries, 0, loaded=loaded, now=NOW)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    finished = planner.finish_times(plan.stops, 0, now=NOW)
+    fifo = route_cost(fifo_route(deliveries, loaded), 0, graph=graph)
+    problems = check_plan(plan.stops, deliveries, loaded, capacity)
+
+    # One new request merged into the running plan (what happens at a marker)
+    live = LivePlan(plan.stops, capacity=capacity, graph=graph)
+    extra, _ = make_deliveries(graph, 1, capacity, seed + 1)
+    extra[0]['id'] = 'bench-new'
+    insert_started = time.perf_counter()
+    live.insert(extra[0], 0, set(loaded))
+    insert_ms = (time.perf_counter() - insert_started) * 1000
+
+    return {
+        'topology': topology,
+        'rooms': rooms,
+        'nodes': graph.node_count,
+        'deliveries': count,
+        'capacity': capacity,
+        'method': plan.method,
+        'graphSeconds': round(graph_seconds, 3),
+        'planMs': {'p50': round(statistics.median(timings) * 1000, 2),
+                   'max': round(max(timings) * 1000, 2)},
+        'peakMemoryKiB': round(peak / 1024),
+        'stops': len(plan.stops),
+        'segments': plan.segments,
+        'fifoSegments': fifo,
+        'vsFifo': round(plan.segments / fifo, 3) if fifo else None,
+        'routeHours': round((max(finished.values(), default=NOW) - NOW) / 3600, 2),
+        'lateness': round(plan.lateness),
+        'insertMs': round(insert_ms, 2),
+        'problems': problems[:5],
+        'wallSeconds': round(time.perf_counter() - started, 2)
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the route planner at building scale")
+    parser.add_argument('--scale', action='append', choices=list(SCALES),
+                        help="Predefined size (repeatable, default: all)")
+    parser.add_argument('--rooms', type=int, help="Custom size instead of --scale")
+    parser.add_argument('--deliveries', type=int, default=100)
+    parser.add_argument('--capacity', type=int, default=3)
+    parser.add_argument('--topology', choices=('building', 'ring'), default='building')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--exact-limit', type=int, default=EXACT_PLANNER_MAX_DELIVERIES,
+                        help="Solve exactly up to this many unpicked deliveries")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    parser.add_argument('--out', help="Also write the results here")
+    args = parser.parse_args()
+
+    if args.rooms:
+        sizes = {'custom': (args.rooms, args.deliveries, args.capacity)}
+    else:
+        sizes = {name: SCALES[name] for name in (args.scale or SCALES)}
+
+    results = {}
+    for name, (rooms, count, capacity) in sizes.items():
+        if not args.json:
+            print(f"🧭 [PLANNER] {name}: {rooms} rooms ({args.topology}), {count} deliveries, "
+                  f"{capacity} compartments...")
+        results[name] = run_scale(rooms, count, capacity, args.topology, args.repeats, args.seed,
+                                  args.exact_limit)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"\n{'scale':>9} {'method':>9} {'graph':>7} {'plan p50':>10} {'memory':>9} {'stops':>6} "
+              f"{'segments':>9} {'vs FIFO':>8} {'hours':>6} {'insert':>9}  check")
+        for name, r in results.items():
+            print(f"{name:>9} {r['method']:>9} {r['graphSeconds']:>6.2f}s {r['planMs']['p50']:>8.1f}ms "
+                  f"{r['peakMemoryKiB']:>6}KiB {r['stops']:>6} {r['segments']:>9} {r['vsFifo']:>8} "
+                  f"{r['routeHours']:>6} {r['insertMs']:>7.1f}ms  {'; '.join(r['problems']) or 'ok'}")
+
+    if args.out:
+        try:
+            with open(args.out, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"✓ Results written to {args.out}")
+        except Exception as e:
+            print(f"❌ Error writing results: {e}")
@@ -0,0 +1,93 @@
+# robot_clock.py - Injectable time source for the robot, planner and Firebase layer
+#
+# Production code calls robot_clock.time() / monotonic() / sleep() instead of
+# the time module. By default they are the real clock; simulator.py installs a
+# VirtualClock so a full day of deliveries runs in seconds.
+import heapq
+import itertools
+import threading
+import time as _time
+
+
+class SystemClock:
+    """Wall-clock time (the default)"""
+
+    def time(self):
+        return _time.time()
+
+    def monotonic(self):
+        return _time.monotonic()
+
+    def sleep(self, seconds):
+        _time.sleep(seconds)
+
+
+class VirtualClock:
+    """Discrete-event clock: sleep() jumps straight to the wake-up time,
+    running every event scheduled up to then in time order.
+
+    Meant for one driving thread (the robot loop). Worker threads may read
+    the clock, but only simulated components that never sleep should run
+    on them.
+    """
+
+    def __init__(self, start=0.0):
+        self.now = float(start)
+        self.sleeps = 0  # sleep() calls - one per wake-up of the sleeping loop
+        self.queue = []  # (time, sequence, callback, args)
+        self.sequence = itertools.count()
+        self.lock = threading.RLock()
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps += 1
+        self.advance(self.now + max(0.0, seconds))
+
+    def schedule(self, at, callback, *args):
+        """Run callback(*args) when the clock reaches `at` (epoch seconds)"""
+        with self.lock:
+            heapq.heappush(self.queue, (max(at, self.now), next(self.sequence), callback, args))
+
+    def advance(self, until):
+        """Move to `until`, firing due events on the way"""
+        with self.lock:
+            while self.queue and self.queue[0][0] <= until:
+                at, sequence, callback, args = heapq.heappop(self.queue)
+                self.now = max(self.now, at)
+                callback(*args)
+            self.now = max(self.now, until)
+
+    def next_event(self):
+        with self.lock:
+            return self.queue[0][0] if self.queue else None
+
+
+_clock = SystemClock()
+
+
+def install(clock):
+    """Use `clock` everywhere robot_clock is consulted; returns the previous one"""
+    global _clock
+    previous, _clock = _clock, clock
+    return previous
+
+
+def current():
+    return _clock
+
+
+def time():
+    return _clock.time()
+
+
+def monotonic():
+    return _clock.monotonic()
+
+
+def sleep(seconds):
+    _clock.sleep(seconds)
@@ -0,0 +1,197 @@
+# robot_state.py - Local snapshot of robot state for warm restarts
+import json
+import os
+import threading
+import time
+from config import STATE_FILE
+
+# Per-delivery phases, in the order a delivery moves through them
+PHASE_PLANNED = 'planned'
+PHASE_AT_PICKUP = 'at_pickup'
+PHASE_PICKED_UP = 'picked_up'
+PHASE_AT_DESTINATION = 'at_destination'
+PHASE_COMPLETED = 'completed'
+PHASE_CANCELLED = 'cancelled'
+
+# Phases where files are physically inside a compartment
+LOADED_PHASES = (PHASE_PICKED_UP, PHASE_AT_DESTINATION)
+
+STATE_VERSION = 1
+
+
+class RobotState:
+    """Atomically persisted snapshot of location, route and delivery phases.
+
+    Every transition rewrites the whole (small) file via write-to-temp +
+    os.replace, so a crash at any point leaves either the old or the new
+    snapshot on disk - never a half-written one.
+    """
+
+    def __init__(self, path=STATE_FILE):
+        if not os.path.isabs(path):
+            path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+        self.path = path
+        self.location = 0
+        self.phases = {}        # delivery_id: phase
+        self.compartments = {}  # delivery_id: compartment number
+        self.route = []         # [[room, [[delivery_id, action], ...]], ...]
+        self.updated_at = None
+        # Tasks at a stop finish on worker threads
+        self.lock = threading.RLock()
+
+    # ---------- persistence ----------
+
+    def load(self):
+        """Load snapshot from disk. Returns True if a snapshot was found."""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            print(f"⚠ Could not read saved state ({e}) - starting fresh")
+            return False
+
+        if data.get('version') != STATE_VERSION:
+            print(f"⚠ Saved state version {data.get('version')} not supported - starting fresh")
+            return False
+
+        self.location = data.get('location', 0)
+        self.phases = data.get('phases', {})
+        self.compartments = data.get('compartments', {})
+        self.route = data.get('route', [])
+        self.updated_at = data.get('updatedAt')
+        return True
+
+    def save(self):
+        """Atomically write the snapshot to disk"""
+        with self.lock:
+            self.updated_at = time.time()
+            data = {
+                'version': STATE_VERSION,
+                'location': self.location,
+                'phases': self.phases,
+                'compartments': self.compartments,
+                'route': self.route,
+                'updatedAt': self.updated_at
+            }
+            tmp_path = self.path + '.tmp'
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(data, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"⚠ Could not save robot state: {e}")
+
+    # ---------- transitions ----------
+
+    def set_location(self, location):
+        with self.lock:
+            self.location = location
+            self.save()
+
+    def set_phase(self, delivery, phase):
+        with self.lock:
+            delivery_id = delivery['id']
+            self.phases[delivery_id] = phase
+            if 'compartment' in delivery:
+                self.compartments[delivery_id] = delivery['compartment']
+            self.save()
+
+    def set_route(self, route):
+        """Store planned route as [(room, [(delivery, action), ...]), ...]"""
+        with self.lock:
+            self.route = [
+                [room, [[delivery['id'], action] for delivery, action in tasks]]
+                for room, tasks in route
+            ]
+            for room, tasks in route:
+                for delivery, action in tasks:
+                    if delivery['id'] not in self.phases:
+                        self.phases[delivery['id']] = PHASE_PLANNED
+                    if 'compartment' in delivery:
+                        self.compartments[delivery['id']] = delivery['compartment']
+            self.save()
+
+    def clear(self):
+        """Forget all deliveries (robot is idle with nothing loaded)"""
+        with self.lock:
+            self.phases.clear()
+            self.compartments.clear()
+            self.route = []
+            self.save()
+
+    # ---------- queries ----------
+
+    def ids_in(self, *phases):
+        return {d_id for d_id, phase in self.phases.items() if phase in phases}
+
+    def loaded_compartments(self):
+        """Compartments currently holding files: {compartment: delivery_id}"""
+        return {
+            self.compartments[d_id]: d_id
+            for d_id in self.ids_in(*LOADED_PHASES)
+            if d_id in self.compartments
+        }
+
+    # ---------- restart ----------
+
+    def reconcile(self, active_deliveries):
+        """Merge the local snapshot with Firebase's view after a restart.
+
+        - Deliveries gone from /delivery_requests were completed/cancelled
+          elsewhere (or archived before the crash) - forget them.
+        - Firebase "in_progress" means files were confirmed, so the delivery
+          is loaded even if the local phase lagged behind.
+        - A local picked_up/at_destination phase wins over a Firebase
+          "pending" status (the status write may not have gone out).
+
+        Returns a list of delivery_ids whose Firebase status needs to be
+        pushed back to "in_progress".
+        """
+        active = {d['id']: d for d in active_deliveries}
+
+        for d_id in list(self.phases):
+            if d_id not in active:
+                del self.phases[d_id]
+                self.compartments.pop(d_id, None)
+
+        needs_status_push = []
+        for d_id, delivery in active.items():
+            phase = self.phases.get(d_id)
+            if delivery.get('status') == 'in_progress':
+                if phase not in LOADED_PHASES:
+                    self.phases[d_id] = PHASE_PICKED_UP
+            elif phase in LOADED_PHASES:
+                needs_status_push.append(d_id)
+            if 'compartment' in delivery:
+                self.compartments[d_id] = delivery['compartment']
+
+        # Drop route tasks for deliveries that no longer exist
+        route = []
+        for room, tasks in self.route:
+            tasks = [[d_id, action] for d_id, action in tasks if d_id in self.phases]
+            if tasks:
+                route.append([room, tasks])
+        self.route = route
+
+        self.save()
+        return needs_status_push
+
+    def interrupted_stop_tasks(self, deliveries_by_id):
+        """Tasks that were in progress at the current location when the
+        robot went down (compartment open, waiting for a confirmation)."""
+        tasks = []
+        for d_id, phase in self.phases.items():
+            delivery = deliveries_by_id.get(d_id)
+            if delivery is None:
+                continue
+            if phase == PHASE_AT_PICKUP and delivery['pickup'] == self.location:
+                tasks.append((delivery, 'pickup'))
+            elif phase == PHASE_AT_DESTINATION and delivery['destination'] == self.location:
+                tasks.append((delivery, 'deliver'))
+        # Deliveries first, same as the planner (frees compartments)
+        tasks.sort(key=lambda task: task[1] != 'deliver')
+        return tasks
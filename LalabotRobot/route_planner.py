@@ -0,0 +1,574 @@
+# route_planner.py - Capacity-aware pickup-and-delivery planner for the track graph
+import bisect
+from collections import Counter
+import time
+import robot_clock
+from datetime import datetime
+from track_graph import TrackGraph
+from config import (ROOM_COUNT, COMPARTMENT_COUNT, SEGMENT_TRAVEL_TIME,
+                    TASK_DWELL_TIME, EXACT_PLANNER_MAX_DELIVERIES,
+                    ROBOT_ALLOCATES_COMPARTMENTS, PRIORITY_WEIGHTS, PRIORITY_RESPONSE_TIMES)
+
+
+def parse_timestamp(value):
+    """Timestamp field (deadline, createdAt) → epoch seconds.
+    Accepts epoch numbers or ISO strings; returns None if missing/invalid."""
+    if value in (None, ''):
+        return None
+    if isinstance(value, (int, float)):
+        # The app writes JS-style millisecond timestamps
+        return value / 1000 if value > 1e11 else float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def priority_weight(delivery):
+    """Weight of a delivery's lateness - `priority` may be a name from
+    PRIORITY_WEIGHTS or a number (missing → normal)"""
+    priority = delivery.get('priority', 'normal')
+    if isinstance(priority, (int, float)):
+        return float(priority)
+    return PRIORITY_WEIGHTS.get(str(priority).lower(), PRIORITY_WEIGHTS['normal'])
+
+
+def effective_deadline(delivery):
+    """Explicit `deadline`, else createdAt + the response time of the
+    delivery's priority (urgent/high only); None if neither applies"""
+    deadline = parse_timestamp(delivery.get('deadline'))
+    if deadline is not None:
+        return deadline
+    response_time = PRIORITY_RESPONSE_TIMES.get(str(delivery.get('priority', '')).lower())
+    created = parse_timestamp(delivery.get('createdAt'))
+    if response_time is None or created is None:
+        return None
+    return created + response_time
+
+
+def ring_distance(current, target, node_count=ROOM_COUNT + 1):
+    """Segments to drive clockwise from current to target (0 if already there)"""
+    return (target - current) % node_count
+
+
+def route_cost(route, start, node_count=ROOM_COUNT + 1, graph=None):
+    """Total segments travelled by a [(room, tasks), ...] route from start.
+
+    Works for any planner's output, so plans can be compared directly.
+    Segments are counted on `graph` if given, else on a ring of node_count.
+    """
+    segments = 0
+    position = start
+    for room, tasks in route:
+        if graph is not None:
+            segments += graph.hops(position, room)
+        else:
+            segments += ring_distance(position, room, node_count)
+        position = room
+    return segments
+
+
+class RoutePlan:
+    """Result of a planning run"""
+
+    def __init__(self, stops, segments, lateness, method, elapsed):
+        self.stops = stops        # [(room, [(delivery, 'pickup'/'deliver'), ...]), ...]
+        self.segments = segments  # Total segments travelled
+        self.lateness = lateness  # Priority-weighted seconds past deadlines (estimated)
+        self.method = method      # 'exact' or 'heuristic'
+        self.elapsed = elapsed    # Planning time in seconds
+
+    def __repr__(self):
+        return (f"RoutePlan({len(self.stops)} stops, {self.segments} segments, "
+                f"lateness={self.lateness:.0f}s, {self.method}, {self.elapsed * 1000:.1f}ms)")
+
+
+class RoutePlanner:
+    """Pickup-and-delivery planner over the track graph (a one-way ring of
+    rooms unless track_graph.json describes junctions and spurs).
+
+    Constraints: every pickup precedes its delivery, at most `capacity`
+    deliveries are loaded at once, and two loaded deliveries never share a
+    compartment. With allocate_compartments=True only loaded deliveries have
+    a fixed compartment - the rest are assigned after planning
+    (compartment_allocator.py), so capacity is the only limit for them.
+
+    Deadlines (optional `deadline`, or implied by an urgent/high `priority`)
+    are soft - the plan minimizes total priority-weighted tardiness first,
+    then segments travelled.
+
+    Travel times come from the graph's edge costs and distances are
+    shortest paths, so nothing here assumes a ring. Small batches are solved
+    exactly by branch-and-bound; larger ones use a sweep heuristic
+    (room-indexed clockwise on a ring, nearest next room otherwise). Both deliver everything due at a
+    room as soon as they arrive there (delivering never needs a capacity
+    slot and waiting another lap can only be later).
+    """
+
+    def __init__(self, room_count=ROOM_COUNT, capacity=COMPARTMENT_COUNT,
+                 segment_time=SEGMENT_TRAVEL_TIME, task_time=TASK_DWELL_TIME,
+                 exact_limit=EXACT_PLANNER_MAX_DELIVERIES,
+                 allocate_compartments=ROBOT_ALLOCATES_COMPARTMENTS, graph=None):
+        # Without a graph: the ring of rooms + base (0), segment_time per segment
+        self.graph = graph or TrackGraph.ring(room_count + 1, segment_time)
+        self.node_count = self.graph.node_count
+        self.capacity = capacity
+        self.allocate_compartments = allocate_compartments
+        self.segment_time = segment_time
+        self.task_time = task_time
+        self.exact_limit = exact_limit
+
+    def plan(self, deliveries, start, loaded=(), now=None):
+        """Plan a route from `start`.
+
+        deliveries: delivery dicts with id/pickup/destination/compartment
+        loaded:     ids of deliveries already picked up (only need delivering)
+        """
+        started = time.perf_counter()
+        now = robot_clock.time() if now is None else now
+        loaded = set(loaded)
+
+        jobs = []
+        for delivery in deliveries:
+            is_loaded = delivery['id'] in loaded
+            compartment = delivery.get('compartment')
+            if self.allocate_compartments and not is_loaded:
+                compartment = None  # Assigned after planning
+            jobs.append({
+                'delivery': delivery,
+                'pickup': delivery['pickup'] % self.node_count,
+                'destination': delivery['destination'] % self.node_count,
+                'compartment': compartment,
+                'deadline': effective_deadline(delivery),
+                'weight': priority_weight(delivery),
+                'loaded': is_loaded
+            })
+
+        unpicked = sum(1 for job in jobs if not job['loaded'])
+        if unpicked <= self.exact_limit:
+            events, segments, lateness = self._solve_exact(jobs, start, now)
+            method = 'exact'
+        else:
+            events, segments, lateness = self._solve_heuristic(jobs, start, now)
+            method = 'heuristic'
+
+        return RoutePlan(self._group_stops(events), segments, lateness,
+                         method, time.perf_counter() - started)
+
+    def finish_times(self, stops, start, now=None):
+        """Estimated drop-off time (epoch) of every delivery in a
+        [(room, tasks), ...] route, with the same timing model as plan()"""
+        clock = robot_clock.time() if now is None else now
+        position = start
+        finished = {}
+        for room, tasks in stops:
+            clock += self._travel(position, room)
+            position = room
+            for delivery, action in tasks:
+                clock += self.task_time
+                if action == 'deliver':
+                    finished[delivery['id']] = clock
+        return finished
+
+    def late_deliveries(self, stops, start, now=None):
+        """Ids of deliveries the route is estimated to finish past their deadline"""
+        finished = self.finish_times(stops, start, now)
+        late = set()
+        for room, tasks in stops:
+            for delivery, action in tasks:
+                deadline = effective_deadline(delivery)
+                if (action == 'deliver' and deadline is not None
+                        and finished[delivery['id']] > deadline):
+                    late.add(delivery['id'])
+        return late
+
+    # ---------- helpers ----------
+
+    def _distance(self, current, target):
+        return self.graph.hops(current, target)
+
+    def _travel(self, current, target):
+        return self.graph.travel_time(current, target)
+
+    def _sweep_distance(self, current, target, include_current):
+        # Coming back to the room we just left is a full lap, not 0 segments
+        distance = self._distance(current, target)
+        if distance == 0 and not include_current:
+            return self.graph.cycle_hops(current)
+        return distance
+
+    def _sweep_travel(self, current, target, include_current):
+        if current == target and not include_current:
+            return self.graph.cycle_time(current)
+        return self._travel(current, target)
+
+    def _lateness(self, job, finish_time):
+        if job['deadline'] is None:
+            return 0.0
+        return job['weight'] * max(0.0, finish_time - job['deadline'])
+
+    @staticmethod
+    def _group_stops(events):
+        """[(room, job, action), ...] → [(room, [(delivery, action), ...]), ...]"""
+        stops = []
+        for room, job, action in events:
+            if stops and stops[-1][0] == room:
+                stops[-1][1].append((job['delivery'], action))
+            else:
+                stops.append((room, [(job['delivery'], action)]))
+        return stops
+
+    # ---------- exact: branch-and-bound ----------
+
+    def _solve_exact(self, jobs, start, now):
+        UNPICKED, LOADED, DONE = 0, 1, 2
+        count = len(jobs)
+        best = {'key': None, 'events': []}
+        # (position, status) → [(time, lateness, segments), ...] seen so far
+        seen = {}
+
+        def lower_bound(position, status):
+            # Must at least reach the farthest outstanding room (via pickup first)
+            bound = 0
+            for i, job in enumerate(jobs):
+                if status[i] == UNPICKED:
+                    to_pickup = self._distance(position, job['pickup'])
+                    need = to_pickup + self._distance(job['pickup'], job['destination'])
+                elif status[i] == LOADED:
+                    need = self._distance(position, job['destination'])
+                else:
+                    continue
+                bound = max(bound, need)
+            return bound
+
+        def dominated(position, status, clock, lateness, segments):
+            key = (position, status)
+            entries = seen.setdefault(key, [])
+            for c, l, s in entries:
+                if c <= clock and l <= lateness and s <= segments:
+                    return True
+            entries.append((clock, lateness, segments))
+            return False
+
+        def arrive(position, status, clock, lateness, events):
+            # Deliver everything loaded for this room
+            status = list(status)
+            for i, job in enumerate(jobs):
+                if status[i] == LOADED and job['destination'] == position:
+                    clock += self.task_time
+                    lateness += self._lateness(job, clock)
+                    status[i] = DONE
+                    events = events + [(position, job, 'deliver')]
+            return tuple(status), clock, lateness, events
+
+        def search(position, status, clock, lateness, segments, events):
+            if all(s == DONE for s in status):
+                key = (lateness, segments)
+                if best['key'] is None or key < best['key']:
+                    best['key'] = key
+                    best['events'] = events
+                return
+
+            if best['key'] is not None:
+                bound = (lateness, segments + lower_bound(position, status))
+                if bound >= best['key']:
+                    return
+            if dominated(position, status, clock, lateness, segments):
+                return
+
+            loaded = [i for i in range(count) if status[i] == LOADED]
+            used = {jobs[i]['compartment'] for i in loaded}
+            candidates = []
+            for i, job in enumerate(jobs):
+                if status[i] == LOADED:
+                    candidates.append((self._distance(position, job['destination']), i, 'deliver'))
+                elif (status[i] == UNPICKED and len(loaded) < self.capacity
+                      and (job['compartment'] is None or job['compartment'] not in used)):
+                    candidates.append((self._distance(position, job['pickup']), i, 'pickup'))
+            # Nearest first finds a good incumbent early
+            candidates.sort(key=lambda c: c[0])
+
+            for distance, i, action in candidates:
+                job = jobs[i]
+                room = job['pickup'] if action == 'pickup' else job['destination']
+                next_status, next_clock, next_lateness, next_events = arrive(
+                    room, status, clock + self._travel(position, room), lateness, events)
+                if action == 'pickup':
+                    next_status = list(next_status)
+                    next_status[i] = LOADED
+                    next_clock += self.task_time
+                    next_events = next_events + [(room, job, 'pickup')]
+                    # A same-room round trip is delivered right away
+                    next_status, next_clock, next_lateness, next_events = arrive(
+                        room, next_status, next_clock, next_lateness, next_events)
+                search(room, tuple(next_status), next_clock, next_lateness,
+                       segments + distance, next_events)
+
+        status = tuple(LOADED if job['loaded'] else UNPICKED for job in jobs)
+        status, clock, lateness, events = arrive(start, status, now, 0.0, [])
+        search(start, status, clock, lateness, 0, events)
+
+        if best['key'] is None:
+            # Infeasible (e.g. more loaded than capacity) - fall back to sweep
+            return self._solve_heuristic(jobs, start, now)
+        lateness, segments = best['key']
+        return best['events'], segments, lateness
+
+    # ---------- heuristic: sweep ----------
+
+    def _solve_heuristic(self, jobs, start, now):
+        pickups_at = {}     # room: [job, ...] waiting to be picked up
+        deliveries_at = {}  # room: [job, ...] loaded, to be delivered
+        loaded_count = 0
+        used = set()
+        for job in jobs:
+            if job['loaded']:
+                deliveries_at.setdefault(job['destination'], []).append(job)
+                loaded_count += 1
+                used.add(job['compartment'])
+            else:
+                pickups_at.setdefault(job['pickup'], []).append(job)
+        # Earliest deadline first, then highest priority, then shortest ride
+        for room, waiting in pickups_at.items():
+            waiting.sort(key=lambda job: (job['deadline'] is None, job['deadline'] or 0, -job['weight'],
+                                          self._distance(job['pickup'], job['destination'])))
+
+        pickup_rooms = sorted(pickups_at)
+        delivery_rooms = sorted(deliveries_at)
+
+        def next_room(rooms, position, include_current):
+            if not rooms:
+                return None
+            if not self.graph.is_ring:
+                return min(rooms, key=lambda r: self._sweep_distance(position, r, include_current))
+            i = bisect.bisect_left(rooms, position)
+            if i < len(rooms) and rooms[i] == position and not include_current:
+                i += 1
+            return rooms[i % len(rooms)]
+
+        def add_room(rooms, room):
+            i = bisect.bisect_left(rooms, room)
+            if i == len(rooms) or rooms[i] != room:
+                rooms.insert(i, room)
+
+        events = []
+        position = start
+        clock = now
+        segments = 0
+        lateness = 0.0
+        include_current = True
+        remaining = len(jobs)
+        idle_stops = 0
+
+        while remaining:
+            candidates = [next_room(delivery_rooms, position, include_current)]
+            if loaded_count < self.capacity:
+                candidates.append(next_room(pickup_rooms, position, include_current))
+            candidates = [room for room in candidates if room is not None]
+            if not candidates:
+                break  # Nothing reachable (capacity 0) - leave rest unplanned
+            room = min(candidates, key=lambda r: self._sweep_distance(position, r, include_current))
+            distance = self._sweep_distance(position, room, include_current)
+            segments += distance
+            clock += self._sweep_travel(position, room, include_current)
+            position = room
+            include_current = False
+            acted = False
+
+            # Deliver first - frees compartments for pickups at the same room
+            for job in deliveries_at.pop(room, []):
+                clock += self.task_time
+                lateness += self._lateness(job, clock)
+                events.append((room, job, 'deliver'))
+                loaded_count -= 1
+                used.discard(job['compartment'])
+                remaining -= 1
+                acted = True
+            if room in delivery_rooms and room not in deliveries_at:
+                delivery_rooms.remove(room)
+
+            waiting = pickups_at.get(room, [])
+            still_waiting = []
+            for job in waiting:
+                if loaded_count < self.capacity and (job['compartment'] is None
+                                                     or job['compartment'] not in used):
+                    clock += self.task_time
+                    events.append((room, job, 'pickup'))
+                    loaded_count += 1
+                    used.add(job['compartment'])
+                    acted = True
+                    if job['destination'] == room:
+                        clock += self.task_time
+                        lateness += self._lateness(job, clock)
+                        events.append((room, job, 'deliver'))
+                        loaded_count -= 1
+                        used.discard(job['compartment'])
+                        remaining -= 1
+                    else:
+                        deliveries_at.setdefault(job['destination'], []).append(job)
+                        add_room(delivery_rooms, job['destination'])
+                else:
+                    still_waiting.append(job)
+            if still_waiting:
+                pickups_at[room] = still_waiting
+            elif room in pickups_at:
+                del pickups_at[room]
+                pickup_rooms.remove(room)
+
+            # Guard against circling when only blocked pickups remain
+            idle_stops = 0 if acted else idle_stops + 1
+            if idle_stops > self.node_count:
+                break
+
+        return events, segments, lateness
+
+
+class LivePlan:
+    """Mutable route that absorbs new and cancelled deliveries mid-route.
+
+    Changes are merged with cheap insertion (cheapest feasible pickup slot +
+    delivery slot after it) instead of re-solving, so it can run at every
+    room marker.
+    """
+
+    def __init__(self, stops, capacity=COMPARTMENT_COUNT, graph=None,
+                 allocate_compartments=ROBOT_ALLOCATES_COMPARTMENTS):
+        self.stops = [(room, list(tasks)) for room, tasks in stops]
+        self.capacity = capacity
+        self.graph = graph or TrackGraph.ring(ROOM_COUNT + 1)
+        self.allocate_compartments = allocate_compartments
+
+    def delivery_ids(self):
+        return {delivery['id'] for room, tasks in self.stops for delivery, action in tasks}
+
+    def pop_stop(self):
+        return self.stops.pop(0)
+
+    def remove(self, delivery_id):
+        """Drop all tasks of a delivery, and any stop left empty"""
+        stops = []
+        for room, tasks in self.stops:
+            tasks = [(d, a) for d, a in tasks if d['id'] != delivery_id]
+            if tasks:
+                stops.append((room, tasks))
+        self.stops = stops
+
+    def sync(self, active_deliveries, position, loaded):
+        """Merge Firebase's active deliveries into the plan.
+
+        Returns (added deliveries, dropped delivery_ids).
+        """
+        active_ids = {d['id'] for d in active_deliveries}
+        planned = self.delivery_ids()
+
+        dropped = [d_id for d_id in planned if d_id not in active_ids]
+        for delivery_id in dropped:
+            self.remove(delivery_id)
+
+        added = []
+        for delivery in active_deliveries:
+            if delivery['id'] not in planned:
+                self.insert(delivery, position, loaded)
+                added.append(delivery)
+        return added, dropped
+
+    def insert(self, delivery, position, loaded):
+        """Insert a delivery's tasks at the cheapest feasible place.
+
+        Every slot is scored by the segments it adds - d(prev, room) +
+        d(room, next) - d(prev, next) - and checked against the load and
+        compartments along the plan, computed once per call. Only the
+        winning plan is built.
+        """
+        rooms = [room for room, tasks in self.stops]
+        count = len(rooms)
+        hops = self.graph.hops
+        compartment = None if self.allocate_compartments else delivery.get('compartment')
+        load, held, blocked = self._occupancy(compartment, loaded)
+
+        def added(gap, *new_rooms):
+            """Segments added by new stops in front of stop `gap`"""
+            previous = position if gap == 0 else rooms[gap - 1]
+            path = [previous, *new_rooms]
+            cost = sum(hops(a, b) for a, b in zip(path, path[1:]))
+            if gap < count:
+                cost += hops(new_rooms[-1], rooms[gap]) - hops(previous, rooms[gap])
+            return cost
+
+        # (how, index, cost, first stop after the pickup); load/held index j is "before stop j"
+        if delivery['id'] in loaded:
+            # Already in a compartment - only the drop-off is missing
+            pickups = [('loaded', None, 0, 0)]
+        else:
+            pickups = []
+            for i in range(count + 1):
+                if i < count and rooms[i] == delivery['pickup'] and \
+                        load[i + 1] < self.capacity and not held[i + 1]:
+                    pickups.append(('merge', i, 0, i + 1))
+                if load[i] < self.capacity and not held[i]:
+                    pickups.append(('new', i, added(i, delivery['pickup']), i))
+
+        best = None
+        for how, index, pickup_cost, first in pickups:
+            for j in range(first, count + 1):
+                if j < count and rooms[j] == delivery['destination']:
+                    candidate = (pickup_cost, (how, index), ('merge', j))
+                    if best is None or candidate[0] < best[0]:
+                        best = candidate
+                if how == 'new' and j == index:
+                    cost = added(j, delivery['pickup'], delivery['destination'])
+                else:
+                    cost = pickup_cost + added(j, delivery['destination'])
+                if best is None or cost < best[0]:
+                    best = (cost, (how, index), ('new', j))
+                if j < count and blocked[j]:
+                    break  # The delivery can't stay on board past stop j
+
+        stops = [(room, list(tasks)) for room, tasks in self.stops]
+        if best is None:
+            # Capacity never frees up mid-plan - append to the end
+            if delivery['id'] not in loaded:
+                stops.append((delivery['pickup'], [(delivery, 'pickup')]))
+            stops.append((delivery['destination'], [(delivery, 'deliver')]))
+        else:
+            (pickup_how, pickup_index), (drop_how, drop_index) = best[1], best[2]
+            # Insert back to front so earlier indexes stay valid
+            if drop_how == 'merge':
+                stops[drop_index][1].insert(0, (delivery, 'deliver'))  # Deliver before picking up
+            else:
+                stops.insert(drop_index, (delivery['destination'], [(delivery, 'deliver')]))
+            if pickup_how == 'merge':
+                stops[pickup_index][1].append((delivery, 'pickup'))
+            elif pickup_how == 'new':
+                stops.insert(pickup_index, (delivery['pickup'], [(delivery, 'pickup')]))
+        self.stops = stops
+
+    def _occupancy(self, compartment, loaded):
+        """Load along the plan for one more delivery in `compartment`:
+        load[j] / held[j] - deliveries on board / compartment taken before
+        stop j (j == len(stops): at the end); blocked[j] - a new delivery
+        can't be on board through stop j (a pickup there would overflow
+        capacity, or take the same compartment)."""
+        on_board = {}  # delivery_id: compartment
+        for room, tasks in self.stops:
+            for delivery, action in tasks:
+                if action == 'deliver' and delivery['id'] in loaded:
+                    on_board.setdefault(delivery['id'], delivery.get('compartment'))
+        taken = Counter(on_board.values())
+        load, held, blocked = [len(on_board)], [compartment is not None and taken[compartment] > 0], []
+        for room, tasks in self.stops:
+            picks_up = False
+            for delivery, action in sorted(tasks, key=lambda task: task[1] != 'deliver'):
+                if action == 'deliver':
+                    if delivery['id'] in on_board:
+                        taken[on_board.pop(delivery['id'])] -= 1
+                else:
+                    other = None if self.allocate_compartments else delivery.get('compartment')
+                    picks_up = picks_up or (compartment is not None and other == compartment)
+                    on_board[delivery['id']] = other
+                    taken[other] += 1
+            has_pickups = any(action == 'pickup' for delivery, action in tasks)
+            blocked.append(picks_up or (has_pickups and len(on_board) >= self.capacity))
+            load.append(len(on_board))
+            held.append(compartment is not None and taken[compartment] > 0)
+        return load, held, blocked
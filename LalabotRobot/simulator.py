@@ -1,601 +1,559 @@
 """
-Robot Simulator - Test robot logic without hardware
-Run this on your PC to test the robot's behavior
+Robot Simulator - Run the real DeliveryRobot against a simulated building
+
+Discrete-event simulation on a virtual clock (robot_clock.py): the robot,
+planner and Firebase layer are the production code, only the hardware and
+the Firebase server are simulated. A full day of deliveries runs in seconds.
+
+    python simulator.py                          # 8 h at 6 requests/hour
+    python simulator.py --hours 24 --rate 10 --seed 3 --verbose
+    python simulator.py --workload busy_morning.json --hours 4
+    python simulator.py --network slow_wifi          # latency and faults (network_shim.py)
 """
 
-import time
+import copy
+import contextlib
+import hashlib
 import json
-import requests
-from datetime import datetime
-
-from main import DeliveryRobot
-
-class MockPin:
-    """Mock GPIO Pin"""
-    IN = 0
-    OUT = 1
-    
-    def __init__(self, pin, mode):
-        self.pin = pin
-        self.mode = mode
-        self._value = 1  # Default to white (1)
-    
-    def value(self, val=None):
-        if val is not None:
-            self._value = val
-        return self._value
-
-class MockPWM:
-    """Mock PWM"""
-    def __init__(self, pin):
-        self.pin = pin
-        self._freq = 50
-        self._duty = 0
-    
-    def freq(self, f=None):
-        if f: self._freq = f
-        return self._freq
-    
-    def duty_u16(self, d=None):
-        if d is not None: self._duty = d
-        return self._duty
-
-# Mock machine module
-class machine:
-    Pin = MockPin
-    PWM = MockPWM
-
-# Simulated hardware controllers
-class SimulatedLineFollower:
+import os
+import random
+import tempfile
+import threading
+import time
+
+import robot_clock
+from robot_clock import VirtualClock
+from firebase_handler import FirebaseHandler
+from track_map import TrackMap
+from track_graph import TrackGraph
+from workload import Workload, HourlyProfile, RoomChoice, load_history
+from network_shim import NetworkShim, load_profile
+from config import FIREBASE_URL, COMPARTMENT_COUNT, ROBOT_ALLOCATES_COMPARTMENTS
+
+# Monday 08:00 local time - fixed so runs are reproducible
+DEFAULT_START = time.mktime((2025, 1, 6, 8, 0, 0, 0, 0, -1))
+
+
+# ---------- simulated Firebase ----------
+
+class SimulatedResponse:
+    def __init__(self, status_code, data=None, etag=None):
+        self.status_code = status_code
+        self.data = data
+        self.headers = {'ETag': etag} if etag else {}
+
+    def json(self):
+        return self.data
+
+
+class SimulatedDatabase:
+    """In-memory Realtime Database speaking the REST calls the robot makes:
+    GET/PUT/PATCH/DELETE on <path>.json, multi-path PATCH at the root and
+    ETag / if-match conditional writes. Drop-in for FirebaseHandler.http
+    (network faults come from a NetworkShim in front of it)."""
+
+    def __init__(self, base_url=FIREBASE_URL):
+        self.base_url = base_url.rstrip('/')
+        self.root = {}
+        self.lock = threading.RLock()
+        self.listeners = []  # callback(path tuple, value) after every write
+        self.request_count = 0
+        self.byte_count = 0  # JSON bytes sent + received
+
+    # ---------- tree access ----------
+
+    def _parts(self, url):
+        path = url[len(self.base_url):] if url.startswith(self.base_url) else url
+        if path.endswith('.json'):
+            path = path[:-len('.json')]
+        return tuple(part for part in path.split('/') if part)
+
+    def read(self, parts):
+        node = self.root
+        for part in parts:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return copy.deepcopy(node)
+
+    def write(self, parts, value):
+        """Set a value (None deletes, like writing null) and notify listeners"""
+        with self.lock:
+            value = json.loads(json.dumps(value))  # Only JSON survives the trip
+            if not parts:
+                self.root = value or {}
+            else:
+                node = self.root
+                for part in parts[:-1]:
+                    node = node.setdefault(part, {})
+                if value is None:
+                    node.pop(parts[-1], None)
+                else:
+                    node[parts[-1]] = value
+        for listener in list(self.listeners):
+            listener(parts, value)
+
+    def _etag(self, parts):
+        return hashlib.md5(json.dumps(self.read(parts), sort_keys=True).encode()).hexdigest()
+
+    def _precondition_failed(self, parts, headers):
+        expected = (headers or {}).get('if-match')
+        return expected is not None and expected != self._etag(parts)
+
+    # ---------- REST verbs ----------
+
+    def _request(self, url, body=None):
+        """Count a request (and its payload)"""
+        with self.lock:
+            self.request_count += 1
+            self.byte_count += len(url) + (len(json.dumps(body)) if body is not None else 0)
+        return self._parts(url)
+
+    def _respond(self, status_code, data=None, etag=None):
+        with self.lock:
+            self.byte_count += len(json.dumps(data))
+        return SimulatedResponse(status_code, data, etag)
+
+    def get(self, url, headers=None, **kwargs):
+        parts = self._request(url)
+        with self.lock:
+            etag = self._etag(parts) if (headers or {}).get('X-Firebase-ETag') else None
+            return self._respond(200, self.read(parts), etag)
+
+    def put(self, url, json=None, headers=None, **kwargs):
+        parts = self._request(url, json)
+        with self.lock:
+            if self._precondition_failed(parts, headers):
+                return self._respond(412, self.read(parts), self._etag(parts))
+            self.write(parts, json)
+        return self._respond(200, json)
+
+    def patch(self, url, json=None, headers=None, **kwargs):
+        parts = self._request(url, json)
+        with self.lock:
+            if isinstance(json, dict):
+                for key, value in json.items():
+                    self.write(parts + self._parts(key), value)
+            else:
+                self.write(parts, json)
+        return self._respond(200, json)
+
+    def delete(self, url, headers=None, **kwargs):
+        parts = self._request(url)
+        with self.lock:
+            if self._precondition_failed(parts, headers):
+                return self._respond(412, None, self._etag(parts))
+            self.write(parts, None)
+        return self._respond(200, None)
+
+
+class SimulatedFirebase(FirebaseHandler):
+    """The real Firebase layer, talking to a SimulatedDatabase (through a
+    NetworkShim if given)"""
+
+    def __init__(self, database, network=None):
+        super().__init__()
+        self.database = database
+        self.network = network
+
+    @property
+    def http(self):
+        return self.network or self.database
+
+    def start_heartbeat(self):
+        """No heartbeat thread in virtual time (the clock has one driving thread)"""
+
+
+# ---------- simulated hardware ----------
+
+class SimulatedMotors:
     def __init__(self):
-        print("🤖 [SIM] Line follower initialized")
-        self.running = False
-        self.current_room = 0
-        
-    def start(self):
-        print("🚦 [SIM] Line following started")
-        self.running = True
-    
-    def detect_intersection(self):
-        # Simulate intersection detection
-        return False
-    
+        self.last_command = 'stop'
+
+    def forward(self, speed=1):
+        self.last_command = 'forward'
+
+    def turn_left(self, speed=1):
+        self.last_command = 'turn_left'
+
+    def turn_right(self, speed=1):
+        self.last_command = 'turn_right'
+
     def stop(self):
-        print("🛑 [SIM] Line follower stopped")
-        self.running = False
-    
-    def move_forward(self):
-        pass
-    
-    def turn_left(self):
-        pass
-    
-    def turn_right(self):
+        self.last_command = 'stop'
+
+    def cleanup(self):
+        self.stop()
+
+
+class SimulatedObstacleDetector:
+    def __init__(self):
+        self.last_distance = None
+
+    def get_distance(self):
+        return None
+
+    def is_path_clear(self):
+        return True
+
+    def cleanup(self):
         pass
 
+
 class SimulatedCompartments:
-    def __init__(self):
-        print("📦 [SIM] Compartment controller initialized")
-        self.states = {1: "closed", 2: "closed", 3: "closed"}
-    
-    def open(self, compartment):
-        self.states[compartment] = "open"
-        print(f"📂 [SIM] Compartment {compartment} opened")
-    
-    def close(self, compartment):
-        self.states[compartment] = "closed"
-        print(f"🔒 [SIM] Compartment {compartment} closed")
-    
+    def __init__(self, count=COMPARTMENT_COUNT):
+        self.states = {number: 'closed' for number in range(1, count + 1)}
+
+    def open_compartment(self, compartment_num):
+        self.states[compartment_num] = 'open'
+
+    def close_compartment(self, compartment_num):
+        self.states[compartment_num] = 'closed'
+
     def close_all(self):
-        for i in range(1, 4):
-            self.close(i)
+        for number in self.states:
+            self.close_compartment(number)
 
-class SimulatedFirebase:
-    """Simulated Firebase for testing"""
-    def __init__(self):
-        self.base_url = "https://lalabotapplication-default-rtdb.asia-southeast1.firebasedatabase.app"
-        print("🔥 [SIM] Firebase handler initialized")
-        print("📡 [SIM] Skipping WiFi connection (simulated)")
-    
-    def is_connected(self):
-        return True
-    
-    def reconnect(self):
+    def cleanup(self):
         pass
-    
-    def get_pending_deliveries(self):
-        """Get real pending deliveries from Firebase"""
-        try:
-            url = f"{self.base_url}/delivery_requests.json"
-            response = requests.get(url)
-            data = response.json()
-            
-            if data:
-                pending = {k: v for k, v in data.items() if v.get('status') == 'pending'}
-                return pending
-            return {}
-        except Exception as e:
-            print(f"⚠️ [SIM] Error getting deliveries: {e}")
-            return {}
-    
-    def update_delivery_compartment(self, delivery_id, compartment):
-        print(f"🔄 [SIM] Updated compartment: {delivery_id} → {compartment}")
-        try:
-            url = f"{self.base_url}/delivery_requests/{delivery_id}/compartment.json"
-            requests.patch(url, json=compartment)
-        except Exception as e:
-            print(f"⚠️ [SIM] Error: {e}")
-    
-    def update_delivery_stage(self, delivery_id, stage):
-        print(f"📍 [SIM] Stage {stage}: {delivery_id}")
-        try:
-            url = f"{self.base_url}/delivery_requests/{delivery_id}/progressStage.json"
-            requests.patch(url, json=stage)
-        except Exception as e:
-            print(f"⚠️ [SIM] Error: {e}")
-    
-    def update_delivery_location(self, delivery_id, location):
-        print(f"🗺️ [SIM] Location: Room {location}")
-        try:
-            url = f"{self.base_url}/delivery_requests/{delivery_id}/currentLocation.json"
-            requests.patch(url, json=location)
-        except Exception as e:
-            print(f"⚠️ [SIM] Error: {e}")
-    
-    def set_files_confirmed(self, delivery_id, confirmed):
-        print(f"✅ [SIM] Files confirmed: {confirmed}")
-        try:
-            url = f"{self.base_url}/delivery_requests/{delivery_id}/filesConfirmed.json"
-            requests.patch(url, json=confirmed)
-        except Exception as e:
-            print(f"⚠️ [SIM] Error: {e}")
-    
-    def get_files_confirmed(self, delivery_id):
-        try:
-            url = f"{self.base_url}/delivery_requests/{delivery_id}/filesConfirmed.json"
-            response = requests.get(url)
-            return response.json() == True
-        except:
-            return False
-    
-    def set_confirmation_deadline(self, delivery_id, deadline):
-        print(f"⏰ [SIM] Deadline set: {deadline}")
-    
-    def set_ready_for_pickup(self, delivery_id, ready):
-        print(f"📬 [SIM] Ready for pickup: {ready}")
-        try:
-            url = f"{self.base_url}/delivery_requests/{delivery_id}/readyForPickup.json"
-            requests.patch(url, json=ready)
-        except Exception as e:
-            print(f"⚠️ [SIM] Error: {e}")
-    
-    def get_files_received(self, delivery_id):
-        try:
-            url = f"{self.base_url}/delivery_requests/{delivery_id}/filesReceived.json"
-            response = requests.get(url)
-            return response.json() == True
-        except:
-            return False
-    
-    def mark_delivery_completed(self, delivery_id):
-        print(f"✅ [SIM] Marking completed: {delivery_id}")
-        try:
-            url = f"{self.base_url}/delivery_requests/{delivery_id}.json"
-            requests.patch(url, json={
-                "status": "completed",
-                "completedAt": datetime.utcnow().isoformat(),
-                "progressStage": 4
-            })
-        except Exception as e:
-            print(f"⚠️ [SIM] Error: {e}")
-    
-    def free_compartment(self, compartment):
-        print(f"🔓 [SIM] Freed compartment {compartment}")
-        try:
-            url = f"{self.base_url}/robot_status/currentDeliveries/compartment{compartment}.json"
-            requests.patch(url, json="")
-        except Exception as e:
-            print(f"⚠️ [SIM] Error: {e}")
-    
-    def cancel_delivery(self, delivery_id):
-        print(f"❌ [SIM] Cancelled: {delivery_id}")
-    
-    def notify_confirmation_timeout(self, delivery_id):
-        print(f"⏰ [SIM] Timeout: {delivery_id}")
-    
-    def report_error(self, error, location):
-        print(f"🆘 [SIM] Error at Room {location}: {error}")
-
-class SimulatedRobot:
-    """Simulated robot for testing logic"""
-    def __init__(self):
+
+
+class SimulatedLineFollower:
+    """Drives the track graph in virtual time - each segment takes the
+    edge cost, give or take `jitter` (fraction, normally distributed).
+    The robot may swap in its own graph for routing; drive times keep
+    coming from the track this was built with."""
+
+    def __init__(self, motors, obstacle_detector, graph=None, jitter=0.1, rng=None, scale=1.0):
+        self.motors = motors
+        self.obstacle_detector = obstacle_detector
+        self.track = graph if graph is not None else TrackGraph.for_track(TrackMap.load())
+        self.graph = self.track
+        self.jitter = jitter
+        self.scale = scale  # Drive time multiplier (a slower or faster robot)
+        self.rng = rng or random.Random(0)
         self.current_location = 0
-        self.is_moving = False
-        self.active_deliveries = []
-        
-        # Use simulated hardware
-        self.line_follower = SimulatedLineFollower()
-        self.firebase = SimulatedFirebase()
-        self.compartments = SimulatedCompartments()
-        
-        self.BASE = 0
-        self.MAX_DELIVERIES = 3
-        self.CONFIRMATION_TIMEOUT = 30
-        
-        print("🤖 [SIM] Lalabot initialized at BASE")
-        print("\n" + "="*50)
-        print("SIMULATOR MODE - Testing robot logic")
-        print("No hardware required!")
-        print("="*50 + "\n")
-    
-    def navigate_to(self, target_room):
-        """Simulated navigation"""
-        if self.current_location == target_room:
-            print(f"✓ [SIM] Already at Room {target_room}")
-            return
-        
-        print(f"🗺️ [SIM] Simulating navigation: Room {self.current_location} → Room {target_room}")
-        
-        # Simulate travel time (1 second per room)
-        rooms_to_pass = abs(target_room - self.current_location)
-        
-        for i in range(rooms_to_pass):
-            time.sleep(1)  # Simulate movement
-            if target_room > self.current_location:
-                self.current_location += 1
-            else:
-                self.current_location -= 1
-            print(f"   🏠 [SIM] Passing Room {self.current_location}...")
-        
-        print(f"✅ [SIM] Reached Room {target_room}\n")
-    
-    # Copy all other methods from main.py's DeliveryRobot class
-    # (check_for_new_deliveries, process_next_delivery, etc.)
-    # Just paste them here - they'll work with simulated hardware!
-    # main.py - Main entry point
-        
-    def start(self):
-        """Main robot loop"""
-        print("🚀 Starting delivery robot...")
-        
-        while True:
-            try:
-                # Check WiFi connection
-                if not self.firebase.is_connected():
-                    print("⚠️ WiFi disconnected, reconnecting...")
-                    self.stop_movement()
-                    self.firebase.reconnect()
-                    continue
-                
-                # Listen for new deliveries if we have space
-                if len(self.active_deliveries) < self.MAX_DELIVERIES:
-                    self.check_for_new_deliveries()
-                
-                # Process active deliveries
-                if self.active_deliveries and not self.is_moving:
-                    self.process_next_delivery()
-                
-                time.sleep(0.5)  # Small delay to prevent busy loop
-                
-            except Exception as e:
-                print(f"❌ Error in main loop: {e}")
-                self.handle_critical_error(e)
-    
-    def check_for_new_deliveries(self):
-        """Check Firebase for pending deliveries"""
-        try:
-            pending = self.firebase.get_pending_deliveries()
-            
-            for delivery_id, delivery_data in pending.items():
-                # Check if we already have this delivery
-                if any(d['id'] == delivery_id for d in self.active_deliveries):
-                    continue
-                
-                # Assign available compartment
-                available_compartment = self.get_available_compartment()
-                if available_compartment:
-                    delivery_data['id'] = delivery_id
-                    delivery_data['compartment'] = available_compartment
-                    delivery_data['state'] = 'assigned'
-                    
-                    self.active_deliveries.append(delivery_data)
-                    
-                    # Update Firebase with compartment assignment
-                    self.firebase.update_delivery_compartment(delivery_id, available_compartment)
-                    
-                    print(f"✅ Accepted delivery {delivery_id} → Compartment {available_compartment}")
-                    print(f"   From: Room {delivery_data['pickup']} → Room {delivery_data['destination']}")
-                    
-                    # If this is our first delivery, start immediately
-                    if len(self.active_deliveries) == 1:
-                        break
-                        
-        except Exception as e:
-            print(f"⚠️ Error checking deliveries: {e}")
-    
-    def get_available_compartment(self):
-        """Returns the first available compartment number (1-3) or None"""
-        used_compartments = [d['compartment'] for d in self.active_deliveries]
-        for i in range(1, 4):
-            if i not in used_compartments:
-                return i
+        self.previous_location = None
+        self.on_marker = None
+        self.on_tick = None
+        self.should_abort = None
+        self.segments_driven = 0
+        self.seconds_driven = 0.0
+
+    def navigate_to_room(self, target_room, firebase_handler, delivery_id):
+        path = self.graph.path(self.current_location, target_room)
+        for following in path[1:]:
+            base = self.track.edge_cost(self.current_location, following) * self.scale
+            seconds = max(0.1 * base, self.rng.gauss(base, self.jitter * base))
+            self.motors.forward()
+            robot_clock.sleep(seconds)
+            self.motors.stop()
+            self.segments_driven += 1
+            self.seconds_driven += seconds
+            self.previous_location, self.current_location = self.current_location, following
+            if self.on_marker is not None:
+                self.on_marker(self.current_location)
+            if delivery_id is not None:
+                firebase_handler.update_current_location(delivery_id, self.current_location)
+
+    def cleanup(self):
+        self.motors.stop()
+
+
+# ---------- simulation ----------
+
+def percentile(values, p):
+    """Nearest-rank percentile (None for no values)"""
+    if not values:
         return None
-    
-    def process_next_delivery(self):
-        """Process deliveries in order of pickup location"""
-        if not self.active_deliveries:
-            # No deliveries, return to base if not already there
-            if self.current_location != self.BASE:
-                print("📍 No deliveries, returning to base...")
-                self.navigate_to(self.BASE)
-            return
-        
-        # Sort deliveries by pickup location for efficient routing
-        self.active_deliveries.sort(key=lambda d: d['pickup'])
-        
-        # Process first delivery in queue
-        delivery = self.active_deliveries[0]
-        
-        if delivery['state'] == 'assigned':
-            # Go to pickup location
-            self.go_to_pickup(delivery)
-            
-        elif delivery['state'] == 'at_pickup':
-            # Wait for user to place files
-            self.wait_for_file_confirmation(delivery)
-            
-        elif delivery['state'] == 'files_confirmed':
-            # Go to destination
-            self.go_to_destination(delivery)
-            
-        elif delivery['state'] == 'at_destination':
-            # Wait for receiver verification and pickup
-            self.wait_for_receiver(delivery)
-            
-        elif delivery['state'] == 'completed':
-            # Remove from active list
-            self.active_deliveries.remove(delivery)
-            print(f"✅ Delivery {delivery['id']} completed!")
-    
-    def go_to_pickup(self, delivery):
-        """Navigate to pickup location and open compartment"""
-        pickup_room = delivery['pickup']
-        compartment = delivery['compartment']
-        
-        print(f"🚚 Going to pickup at Room {pickup_room} (Compartment {compartment})")
-        
-        # Update Firebase: in transit to pickup
-        self.firebase.update_delivery_stage(delivery['id'], 0)  # Stage 0: Processing
-        
-        # Navigate to pickup room
-        self.navigate_to(pickup_room)
-        
-        # We've arrived at pickup
-        print(f"📍 Arrived at Room {pickup_room}")
-        
-        # Open compartment
-        self.compartments.open(compartment)
-        print(f"📂 Compartment {compartment} opened")
-        
-        # Update state and Firebase
-        delivery['state'] = 'at_pickup'
-        self.firebase.update_delivery_location(delivery['id'], pickup_room)
-        self.firebase.set_files_confirmed(delivery['id'], False)
-        
-        # Set confirmation deadline (30 seconds from now)
-        deadline = time.time() + self.CONFIRMATION_TIMEOUT
-        delivery['confirmation_deadline'] = deadline
-        self.firebase.set_confirmation_deadline(delivery['id'], deadline)
-    
-    def wait_for_file_confirmation(self, delivery):
-        """Wait for sender to confirm files are placed"""
-        # Check if files confirmed in Firebase
-        files_confirmed = self.firebase.get_files_confirmed(delivery['id'])
-        
-        if files_confirmed:
-            print(f"✅ Files confirmed for delivery {delivery['id']}")
-            
-            # Close compartment
-            self.compartments.close(delivery['compartment'])
-            print(f"🔒 Compartment {delivery['compartment']} closed")
-            
-            # Update state
-            delivery['state'] = 'files_confirmed'
-            
-            # Update Firebase: Stage 1 (In Transit)
-            self.firebase.update_delivery_stage(delivery['id'], 1)
-            
-        else:
-            # Check timeout
-            if time.time() > delivery.get('confirmation_deadline', float('inf')):
-                print(f"⏰ Timeout waiting for file confirmation - {delivery['id']}")
-                
-                # Send notification (handled by app, we just update status)
-                self.firebase.notify_confirmation_timeout(delivery['id'])
-                
-                # Extend deadline by 30 seconds (give them another chance)
-                delivery['confirmation_deadline'] = time.time() + self.CONFIRMATION_TIMEOUT
-                
-                # After 2 timeouts, cancel delivery
-                delivery['timeout_count'] = delivery.get('timeout_count', 0) + 1
-                if delivery['timeout_count'] >= 2:
-                    print(f"❌ Cancelling delivery {delivery['id']} - no response")
-                    self.cancel_delivery(delivery)
-    
-    def go_to_destination(self, delivery):
-        """Navigate to destination"""
-        destination_room = delivery['destination']
-        
-        print(f"🚚 Delivering to Room {destination_room}")
-        
-        # Update Firebase: Stage 1 (In Transit)
-        self.firebase.update_delivery_stage(delivery['id'], 1)
-        
-        # Navigate to destination
-        self.navigate_to(destination_room)
-        
-        # Update Firebase: Stage 2 (Approaching)
-        self.firebase.update_delivery_stage(delivery['id'], 2)
-        
-        # Brief moment before arrival
-        time.sleep(1)
-        
-        # Update Firebase: Stage 3 (Arrived)
-        self.firebase.update_delivery_stage(delivery['id'], 3)
-        self.firebase.set_ready_for_pickup(delivery['id'], True)
-        
-        print(f"📍 Arrived at Room {destination_room} - waiting for receiver")
-        
-        # Update state
-        delivery['state'] = 'at_destination'
-        delivery['arrival_time'] = time.time()
-    
-    def wait_for_receiver(self, delivery):
-        """Wait for receiver to verify and collect files"""
-        # Check if receiver retrieved files
-        files_received = self.firebase.get_files_received(delivery['id'])
-        
-        if files_received:
-            print(f"✅ Files received - delivery {delivery['id']} complete!")
-            
-            # Close compartment
-            self.compartments.close(delivery['compartment'])
-            
-            # Mark as completed
-            delivery['state'] = 'completed'
-            self.firebase.mark_delivery_completed(delivery['id'])
-            
-            # Free the compartment
-            self.firebase.free_compartment(delivery['compartment'])
-    
-    def navigate_to(self, target_room):
-        """Navigate from current location to target room"""
-        if self.current_location == target_room:
-            print(f"✓ Already at target location: Room {target_room}")
-            return
-        
-        print(f"🗺️ Navigating: Room {self.current_location} → Room {target_room}")
-        
-        self.is_moving = True
-        
-        # Start following the line
-        self.line_follower.start()
-        
-        # Track room counter
-        rooms_to_pass = self.calculate_rooms_to_pass(self.current_location, target_room)
-        rooms_passed = 0
-        
-        while rooms_passed < rooms_to_pass:
-            if not self.firebase.is_connected():
-                print("⚠️ WiFi lost during navigation - stopping")
-                self.stop_movement()
-                self.firebase.reconnect()
-                # Resume from current position
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(p / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+class SimulationReport:
+    """Throughput, latency percentiles and compartment utilization of a run"""
+
+    def __init__(self, requests, timeline, start, hours, compartment_count,
+                 segments_driven, seconds_driven, firebase_requests, wall_time,
+                 firebase_bytes=0, firebase_failures=0, cpu_time=0.0, ticks=0, network=None):
+        self.hours = hours
+        self.requested = len(requests)
+        self.completed = [r for r in requests if timeline.get(r['id'], {}).get('completed')]
+        # Under network faults a delivery can be written to history twice - completed wins
+        self.cancelled = [r for r in requests if timeline.get(r['id'], {}).get('cancelled')
+                          and not timeline[r['id']].get('completed')]
+        self.unfinished = self.requested - len(self.completed) - len(self.cancelled)
+        self.segments_driven = segments_driven
+        self.seconds_driven = seconds_driven
+        self.firebase_requests = firebase_requests
+        self.firebase_bytes = firebase_bytes
+        self.firebase_failures = firebase_failures
+        self.network = network  # NetworkShim.summary() when the network was simulated
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.ticks = ticks  # Robot wake-ups (robot_clock.sleep calls)
+
+        def latencies(event):
+            return [timeline[r['id']][event] - r['createdAt'] / 1000
+                    for r in requests if timeline.get(r['id'], {}).get(event)]
+        self.pickup_latency = latencies('picked_up')
+        self.completion_latency = latencies('completed')
+        self.delivery_latency = [timeline[r['id']]['completed'] - timeline[r['id']]['picked_up']
+                                 for r in self.completed if timeline[r['id']].get('picked_up')]
+
+        # A compartment is busy from the sender's confirmation until the
+        # receiver collects (or the delivery is cancelled / the run ends)
+        end = start + hours * 3600
+        busy = {}
+        for r in requests:
+            events = timeline.get(r['id'], {})
+            if not events.get('picked_up'):
                 continue
-            
-            # Check for intersection (all sensors black = room detected)
-            if self.line_follower.detect_intersection():
-                rooms_passed += 1
-                self.current_location = self.get_next_room(self.current_location)
-                
-                print(f"🏠 Passed Room {self.current_location} ({rooms_passed}/{rooms_to_pass})")
-                
-                # Brief pause to avoid double-counting
-                time.sleep(0.3)
-        
-        # Stop at target
-        self.line_follower.stop()
-        self.is_moving = False
-        
-        print(f"✅ Reached Room {target_room}")
-    
-    def calculate_rooms_to_pass(self, current, target):
-        """Calculate how many rooms to pass (circular track)"""
-        # For circular: 0(Base) -> 1 -> 2 -> 3 -> 4 -> back to 0
-        if target >= current:
-            return target - current
-        else:
-            # Wrap around (e.g., from Room 4 to Base)
-            return (4 - current) + target
-    
-    def get_next_room(self, current):
-        """Get the next room number in circular fashion"""
-        next_room = current + 1
-        if next_room > 4:
-            return 0  # Back to base
-        return next_room
-    
-    def cancel_delivery(self, delivery):
-        """Cancel a delivery and return to base"""
-        print(f"🚫 Cancelling delivery {delivery['id']}")
-        
-        # Close compartment if open
-        self.compartments.close(delivery['compartment'])
-        
-        # Update Firebase
-        self.firebase.cancel_delivery(delivery['id'])
-        
-        # Remove from active list
-        self.active_deliveries.remove(delivery)
-    
-    def stop_movement(self):
-        """Emergency stop"""
-        self.line_follower.stop()
-        self.is_moving = False
-        print("🛑 Movement stopped")
-    
-    def handle_critical_error(self, error):
-        """Handle critical errors"""
-        print(f"🆘 Critical error: {error}")
-        self.stop_movement()
-        
-        # Try to save state
-        try:
-            self.firebase.report_error(str(error), self.current_location)
-        except:
-            pass
-        
-        # Wait before retrying
-        time.sleep(5)
+            finish = events.get('completed') or events.get('cancelled') or end
+            compartment = events.get('compartment')
+            busy[compartment] = (busy.get(compartment, 0.0)
+                                 + max(0.0, min(finish, end) - events['picked_up']))
+        self.compartment_busy = busy
+        self.utilization = sum(busy.values()) / (compartment_count * hours * 3600) if hours else 0.0
 
+    def summary(self):
+        def stats(values):
+            return {f"p{p}": None if percentile(values, p) is None else round(percentile(values, p), 1)
+                    for p in (50, 90, 99)}
+        return {
+            'hours': self.hours,
+            'requested': self.requested,
+            'completed': len(self.completed),
+            'cancelled': len(self.cancelled),
+            'unfinished': self.unfinished,
+            'throughputPerHour': round(len(self.completed) / self.hours, 2) if self.hours else 0.0,
+            'pickupLatency': stats(self.pickup_latency),
+            'deliveryLatency': stats(self.delivery_latency),
+            'completionLatency': stats(self.completion_latency),
+            'compartmentUtilization': round(self.utilization, 3),
+            'segmentsDriven': self.segments_driven,
+            'drivingHours': round(self.seconds_driven / 3600, 2),
+            'firebaseRequests': self.firebase_requests,
+            'firebaseBytes': self.firebase_bytes,
+            'firebaseFailures': self.firebase_failures,
+            'ticks': self.ticks,
+            'cpuSeconds': round(self.cpu_time, 3),
+            'wallSeconds': round(self.wall_time, 2),
+            **({'network': self.network} if self.network is not None else {})
+        }
 
-# Initialize and start the robot
-if __name__ == "__main__":
-    robot = DeliveryRobot()
-    robot.start()
-    
-    def start(self):
-        """Main simulation loop"""
-        print("🚀 [SIM] Starting delivery robot simulator...")
-        print("💡 Press Ctrl+C to stop\n")
-        
+    def print(self):
+        s = self.summary()
+        print(f"\n📊 Simulated {s['hours']}h in {s['wallSeconds']}s")
+        print(f"   Requests:    {s['requested']} ({s['completed']} completed, "
+              f"{s['cancelled']} cancelled, {s['unfinished']} unfinished)")
+        print(f"   Throughput:  {s['throughputPerHour']} deliveries/hour")
+        for name, key in (('Pickup', 'pickupLatency'), ('Delivery', 'deliveryLatency'),
+                          ('Completion', 'completionLatency')):
+            p = s[key]
+            print(f"   {name + ' latency:':<20} p50 {p['p50']}s  p90 {p['p90']}s  p99 {p['p99']}s")
+        print(f"   Compartments: {s['compartmentUtilization']:.1%} utilized")
+        print(f"   Driving:     {s['segmentsDriven']} segments, {s['drivingHours']}h")
+        print(f"   Firebase:    {s['firebaseRequests']} requests, {s['firebaseBytes'] / 1024:.0f} KiB, "
+              f"{s['firebaseFailures']} failed")
+        print(f"   CPU:         {s['cpuSeconds']}s over {s['ticks']} robot wake-ups")
+        if self.network:
+            print(f"   Network:     {sum(n['mainThreadSeconds'] for n in self.network.values()):.0f}s "
+                  f"blocking the main thread")
+            for caller, n in list(self.network.items())[:8]:
+                print(f"      {caller:<32} {n['calls']:>6} calls {n['failures']:>5} failed "
+                      f"{n['mainThreadSeconds']:>8}s main thread  worst {n['maxSeconds']}s")
+
+
+class Simulation:
+    """One simulated day (or any horizon) of the real robot.
+
+    requests: [{'at': seconds after start, 'pickup': room, 'destination':
+    room, optional 'priority'/'deadline'}, ...] (see workload.py). Senders
+    confirm and receivers collect after a delay drawn from sender_delay /
+    receiver_delay (uniform, seconds); no_show_rate of senders never come.
+    Requests may carry their own 'senderDelay' / 'receiverDelay' / 'noShow'.
+    network: NetworkShim profile (latency, drops, timeouts, 5xx, outages -
+    see network_shim.py); failure_rate: shortcut for its dropRate;
+    travel_scale: multiplies every drive time (e.g. measured lap time at
+    another MOTOR_SPEED over the lap time the track costs assume);
+    graph: TrackGraph to drive and plan on instead of the local
+    track_map.json / track_graph.json (reproducible across machines).
+    """
+
+    def __init__(self, requests, hours=8.0, start=DEFAULT_START, seed=0,
+                 sender_delay=(10, 60), receiver_delay=(20, 120), no_show_rate=0.02,
+                 travel_jitter=0.1, travel_scale=1.0, network=None, failure_rate=0.0, data_dir=None,
+                 graph=None):
+        self.hours = hours
+        self.graph = graph
+        self.start = start
+        self.rng = random.Random(seed)
+        self.data_dir = data_dir
+        self.travel_jitter = travel_jitter
+        self.travel_scale = travel_scale
+        self.clock = VirtualClock(start)
+        self.seed = seed
+        self.database = SimulatedDatabase()
+        self.network = dict(network or {})
+        if failure_rate:
+            self.network['dropRate'] = failure_rate
+        self.timeline = {}  # delivery_id: {event: epoch}
+
+        # Draw every random choice up front so thread timing can't change them
+        self.requests = []
+        for number, request in enumerate(sorted(requests, key=lambda r: r['at'])):
+            delivery = {
+                'id': f"sim-{number:05d}",
+                'pickup': request['pickup'],
+                'destination': request['destination'],
+                'compartment': 1 + number % COMPARTMENT_COUNT,
+                'sender': f"sender{request['pickup']}",
+                'receiver': f"receiver{request['destination']}",
+                'status': 'pending',
+                'progressStage': 0,
+                'createdAt': int((start + request['at']) * 1000),
+                'filesConfirmed': False,
+                'filesReceived': False
+            }
+            for key in ('priority', 'deadline'):
+                if key in request:
+                    delivery[key] = request[key]
+            self.requests.append(dict(delivery, at=request['at'],
+                                      senderDelay=request.get('senderDelay', self.rng.uniform(*sender_delay)),
+                                      receiverDelay=request.get('receiverDelay', self.rng.uniform(*receiver_delay)),
+                                      noShow=request.get('noShow', self.rng.random() < no_show_rate)))
+        self.by_id = {r['id']: r for r in self.requests}
+
+    # ---------- simulated people ----------
+
+    def on_write(self, parts, value):
+        """React to the robot's writes like the app's users would"""
+        now = self.clock.time()
+        if len(parts) == 3 and parts[0] == 'delivery_requests' and parts[1] in self.by_id:
+            delivery_id, field = parts[1], parts[2]
+            request = self.by_id[delivery_id]
+            if field == 'status' and value == 'at_pickup' and not request['noShow']:
+                self.clock.schedule(now + request['senderDelay'], self.set_flag,
+                                    delivery_id, 'filesConfirmed')
+            elif field == 'status' and value == 'in_progress':
+                events = self.timeline.setdefault(delivery_id, {})
+                events['picked_up'] = now
+                events['compartment'] = self.database.read(
+                    ('delivery_requests', delivery_id, 'compartment'))
+            elif field == 'readyForPickup' and value is True:
+                self.clock.schedule(now + request['receiverDelay'], self.set_flag,
+                                    delivery_id, 'filesReceived')
+        elif len(parts) == 2 and parts[0] == 'delivery_history' and parts[1] in self.by_id:
+            status = (value or {}).get('status')
+            if status in ('completed', 'cancelled'):
+                self.timeline.setdefault(parts[1], {})[status] = now
+
+    def set_flag(self, delivery_id, field):
+        if self.database.read(('delivery_requests', delivery_id)) is not None:
+            self.database.write(('delivery_requests', delivery_id, field), True)
+
+    def submit(self, request):
+        delivery = {k: v for k, v in request.items()
+                    if k not in ('at', 'senderDelay', 'receiverDelay', 'noShow')}
+        self.database.write(('delivery_requests', request['id']), delivery)
+
+    # ---------- run ----------
+
+    def run(self, verbose=False):
+        """Run the robot until the horizon; returns a SimulationReport"""
+        from main import DeliveryRobot  # After the clock is in place
+
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        previous_clock = robot_clock.install(self.clock)
+        shim = NetworkShim(self.database, self.network, self.seed) if self.network else None
+        self.database.listeners.append(self.on_write)
+        temporary = tempfile.TemporaryDirectory() if self.data_dir is None else None
+        data_dir = self.data_dir or temporary.name
+        output = open(os.devnull, 'w') if not verbose else None
         try:
-            while True:
-                # Check for new deliveries
-                if len(self.active_deliveries) < self.MAX_DELIVERIES:
-                    self.check_for_new_deliveries()
-                
-                # Process active deliveries
-                if self.active_deliveries and not self.is_moving:
-                    self.process_next_delivery()
-                
-                time.sleep(2)  # Check every 2 seconds
-                
-        except KeyboardInterrupt:
-            print("\n\n🛑 [SIM] Simulator stopped")
-            print("📊 [SIM] Final state:")
-            print(f"   Location: Room {self.current_location}")
-            print(f"   Active deliveries: {len(self.active_deliveries)}")
-            print(f"   Compartments: {self.compartments.states}")
-
-# Run simulator
+            with contextlib.redirect_stdout(output) if output else contextlib.nullcontext():
+                motors = SimulatedMotors()
+                obstacle_detector = SimulatedObstacleDetector()
+                # Separate copies - the robot learns its edge costs, the track keeps its own
+                track, robot_graph = ((None, None) if self.graph is None else
+                                      (TrackGraph(self.graph.nodes, self.graph.edges),
+                                       TrackGraph(self.graph.nodes, self.graph.edges)))
+                line_follower = SimulatedLineFollower(motors, obstacle_detector, graph=track,
+                                                      jitter=self.travel_jitter, scale=self.travel_scale,
+                                                      rng=random.Random(self.rng.random()))
+                robot = DeliveryRobot(components={
+                    'firebase': SimulatedFirebase(self.database, shim),
+                    'motors': motors,
+                    'obstacle_detector': obstacle_detector,
+                    'line_follower': line_follower,
+                    'compartments': SimulatedCompartments()
+                }, data_dir=data_dir, graph=robot_graph)
+
+                for request in self.requests:
+                    self.clock.schedule(self.start + request['at'], self.submit, request)
+
+                def stop():
+                    robot.running = False
+                self.clock.schedule(self.start + self.hours * 3600, stop)
+                robot.start()
+        finally:
+            robot_clock.install(previous_clock)
+            self.database.listeners.remove(self.on_write)
+            if output:
+                output.close()
+            if temporary is not None:
+                temporary.cleanup()
+
+        return SimulationReport(self.requests, self.timeline, self.start, self.hours, COMPARTMENT_COUNT,
+                                line_follower.segments_driven, line_follower.seconds_driven,
+                                self.database.request_count, time.perf_counter() - started,
+                                firebase_bytes=self.database.byte_count,
+                                firebase_failures=sum(s['failures'] for s in shim.summary().values()) if shim else 0,
+                                cpu_time=time.process_time() - cpu_started,
+                                ticks=self.clock.sleeps,
+                                network=shim.summary() if shim else None)
+
+
 if __name__ == "__main__":
-    print("""
-    ╔════════════════════════════════════════╗
-    ║   LALABOT DELIVERY ROBOT SIMULATOR     ║
-    ║   Test without Raspberry Pi hardware   ║
-    ╚════════════════════════════════════════╝
-    """)
-    
-    robot = SimulatedRobot()
-    robot.start()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Simulate the delivery robot in virtual time")
+    parser.add_argument('--hours', type=float, default=8.0)
+    parser.add_argument('--rate', type=float, default=6.0, help="Requests per hour")
+    parser.add_argument('--workload', help="Workload spec JSON (see workload.py) instead of --rate")
+    parser.add_argument('--history', help="delivery_history export for a time-of-day workload")
+    parser.add_argument('--network', help="Network profile (see network_shim.py) or profile JSON")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true', help="Show the robot's own output")
+    parser.add_argument('--json', action='store_true', help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    history = load_history(args.history) if args.history else None
+    if args.workload:
+        with open(args.workload) as f:
+            workload = Workload.from_spec(json.load(f), history)
+        description = f"workload {args.workload}"
+    elif history is not None:
+        workload = Workload.profile(HourlyProfile.from_history(history),
+                                    rooms=RoomChoice.from_history(history))
+        description = f"time-of-day profile from {args.history}"
+    else:
+        graph = TrackGraph.for_track(TrackMap.load())
+        rooms = [node for node in graph.stop_nodes() if node != 0]
+        workload = Workload.poisson(args.rate, rooms=RoomChoice.uniform(rooms))
+        description = f"{args.rate} requests/hour between rooms {rooms}"
+    network = load_profile(args.network) if args.network else None
+    print(f"🤖 [SIM] {args.hours}h, {description} "
+          f"(seed {args.seed}, robot allocates compartments: {ROBOT_ALLOCATES_COMPARTMENTS}"
+          f"{f', network: {args.network}' if network else ''})")
+
+    simulation = Simulation(workload.generate(args.hours, DEFAULT_START, args.seed),
+                            hours=args.hours, seed=args.seed, network=network)
+    report = simulation.run(verbose=args.verbose)
+    if args.json:
+        print(json.dumps(report.summary(), indent=2))
+    else:
+        report.print()
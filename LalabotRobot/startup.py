@@ -0,0 +1,110 @@
+# startup.py - Parallel component initialization with per-phase timing
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Reference point for the timing report - main.py imports this module before
+# the other robot modules, so the numbers include the time spent importing them
+PROCESS_START = time.perf_counter()
+
+
+class StartupOrchestrator:
+    """Initialize independent robot components concurrently.
+
+    Each phase is a factory callable with optional dependencies. Phases run
+    on a thread pool as soon as their dependencies finish. Foreground phases
+    gate "ready to dispatch"; background phases (e.g. servo homing) keep
+    running and are awaited on first use via result().
+    """
+
+    def __init__(self, max_workers=4):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix="startup")
+        self.phases = {}  # name: {factory, deps, background}
+        self.futures = {}
+        self.timings = {}  # name: (start, end) relative to PROCESS_START
+        self.lock = threading.Lock()
+        self.ready_time = None
+
+    def add(self, name, factory, deps=(), background=False):
+        """Register a startup phase"""
+        self.phases[name] = {
+            'factory': factory,
+            'deps': tuple(deps),
+            'background': background
+        }
+
+    def _run_phase(self, name):
+        phase = self.phases[name]
+        # Dependencies are passed to the factory in declared order
+        args = [self.futures[dep].result() for dep in phase['deps']]
+
+        start = time.perf_counter() - PROCESS_START
+        try:
+            return phase['factory'](*args)
+        finally:
+            end = time.perf_counter() - PROCESS_START
+            with self.lock:
+                self.timings[name] = (start, end)
+
+    def run(self):
+        """Start all phases, block until foreground phases are done"""
+        # Submit in dependency order so a phase's deps already have futures
+        pending = list(self.phases)
+        while pending:
+            progressed = False
+            for name in list(pending):
+                if all(dep in self.futures for dep in self.phases[name]['deps']):
+                    self.futures[name] = self.executor.submit(self._run_phase, name)
+                    if self.phases[name]['background']:
+                        # Nobody waits on these until first use - report failures right away
+                        self.futures[name].add_done_callback(
+                            lambda future, name=name: self._report_failure(name, future))
+                    pending.remove(name)
+                    progressed = True
+            if not progressed:
+                raise ValueError(f"Unresolvable startup dependencies: {pending}")
+
+        results = {}
+        for name, phase in self.phases.items():
+            if not phase['background']:
+                results[name] = self.futures[name].result()
+
+        self.ready_time = time.perf_counter() - PROCESS_START
+        return results
+
+    def result(self, name, timeout=None):
+        """Get a phase result, waiting for it if still initializing"""
+        return self.futures[name].result(timeout=timeout)
+
+    def is_done(self, name):
+        return name in self.futures and self.futures[name].done()
+
+    def failure(self, name):
+        """Exception a finished phase raised (None while running or if it succeeded)"""
+        if not self.is_done(name) or self.futures[name].cancelled():
+            return None
+        return self.futures[name].exception()
+
+    def _report_failure(self, name, future):
+        if not future.cancelled() and future.exception() is not None:
+            print(f"❌ Startup phase {name} failed: {future.exception()}")
+
+    def report(self):
+        """Print per-phase startup timing"""
+        print("\n⏱  Startup timing (seconds since launch)")
+        with self.lock:
+            timings = sorted(self.timings.items(), key=lambda item: item[1][0])
+        for name, (start, end) in timings:
+            tag = " (background)" if self.phases[name]['background'] else ""
+            print(f"   {name:<18} {start:6.3f} → {end:6.3f}  [{end - start:6.3f}s]{tag}")
+        finished = dict(timings)
+        for name in self.phases:
+            if name not in finished:
+                print(f"   {name:<18} still running (background)")
+        if self.ready_time is not None:
+            print(f"   {'READY TO DISPATCH':<18} {self.ready_time:6.3f}")
+
+    def shutdown(self):
+        """Stop the thread pool (waits for background phases still running)"""
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,260 @@
+"""
+Parameter Sweep - Tune robot settings in the simulators instead of on the track
+
+Every configuration overrides config.py values (MOTOR_SPEED,
+OBSTACLE_DISTANCE, WHITE_LINE_THRESHOLD, MARKER_PASS_TIME, PICKUP_TIMEOUT,
+...) and is evaluated on a process pool:
+- track_sim.py drives the real line follower around the oval with noise and
+  people stepping into the corridor → lap time, missed/false markers,
+  collisions (a swept MARKER_PASS_TIME replaces the surveyed pass time)
+- simulator.py runs a delivery workload with drive times scaled by the
+  measured lap time (over the lap the track's segment costs assume); a
+  track run with missed or false markers counts as failed
+  → deliveries per hour, pickup latency, cancellations
+Results are printed as a table with the Pareto-best configurations marked.
+
+    python sweep.py --param MOTOR_SPEED=0.4,0.6,0.8 --param OBSTACLE_DISTANCE=20,40
+    python sweep.py --param MOTOR_SPEED=0.3:0.9 --param PICKUP_TIMEOUT=60:180 --random 24 --workers 8
+    python sweep.py --param DELIVERY_TIMEOUT=120,300,600 --objective +deliveriesPerHour --out sweep.json
+
+--param NAME=a,b,c is a grid axis, NAME=low:high a range for --random
+(integers if both ends are). Objectives are metric names with + (maximize)
+or - (minimize).
+"""
+
+import ast
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import track_sim  # Selects the fake GPIO backend before any hardware module loads
+import config
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_OBJECTIVES = ['+deliveriesPerHour', '-pickupLatencyP90', '-failureRate']
+
+# metric: column header (also the order of the table)
+COLUMNS = {
+    'lapTime': 'lap',
+    'failureRate': 'failures',
+    'markerMissRate': 'miss',
+    'falseMarkerRate': 'false',
+    'collisions': 'hits',
+    'deliveriesPerHour': 'deliv/h',
+    'pickupLatencyP90': 'pickup p90',
+    'cancelledShare': 'cancelled',
+}
+
+
+# ---------- settings ----------
+
+def apply_settings(settings):
+    """Override config values in config.py and every robot module that
+    imported them (`from config import ...` copies the value)"""
+    import main, line_follower, obstacle_detector, track_map, firebase_handler  # noqa: F401 - bind first
+    for name, value in settings.items():
+        if not hasattr(config, name):
+            raise ValueError(f"Unknown setting {name!r} (not in config.py)")
+        for module in list(sys.modules.values()):
+            path = getattr(module, '__file__', None)
+            if path and os.path.dirname(os.path.abspath(path)) == HERE and hasattr(module, name):
+                setattr(module, name, value)
+
+
+def parse_param(text):
+    """'NAME=a,b,c' → (NAME, [a, b, c]); 'NAME=low:high' → (NAME, (low, high))"""
+    name, _, values = text.partition('=')
+    if not values:
+        raise ValueError(f"Expected NAME=values, got {text!r}")
+    name = name.strip()
+    if ':' in values:
+        low, high = (ast.literal_eval(v.strip()) for v in values.split(':', 1))
+        return name, (low, high)
+    return name, [ast.literal_eval(v.strip()) for v in values.split(',')]
+
+
+def grid_configs(params):
+    """Every combination of the grid axes (ranges count as their two ends)"""
+    names = sorted(params)
+    axes = [list(params[name]) for name in names]
+    return [dict(zip(names, values)) for values in itertools.product(*axes)]
+
+
+def random_configs(params, count, seed=0):
+    """count configurations drawn uniformly from the ranges / grid values"""
+    rng = random.Random(seed)
+    configs = []
+    for _ in range(count):
+        settings = {}
+        for name in sorted(params):
+            values = params[name]
+            if isinstance(values, tuple):
+                low, high = values
+                if isinstance(low, int) and isinstance(high, int):
+                    settings[name] = rng.randint(low, high)
+                else:
+                    settings[name] = round(rng.uniform(low, high), 3)
+            else:
+                settings[name] = rng.choice(values)
+        configs.append(settings)
+    return configs
+
+
+# ---------- evaluation (runs in the worker processes) ----------
+
+def evaluate(settings, options):
+    """Track run + delivery run of one configuration, flattened metrics"""
+    from simulator import Simulation, DEFAULT_START
+    from workload import Workload, RoomChoice
+    from track_graph import TrackGraph
+    from track_map import TrackMap
+
+    started = time.perf_counter()
+    apply_settings(settings)
+    metrics = {}
+
+    track = track_sim.Track.oval()
+    track.obstacles += track_sim.random_obstacles(track, options['obstacles'],
+                                                  duration=options['laps'] * 60, seed=options['seed'])
+    # Without a swept MARKER_PASS_TIME the track run uses what a survey would measure
+    report = track_sim.TrackSimulation(track, motor_speed=config.MOTOR_SPEED, laps=options['laps'],
+                                       seed=options['seed'], ir_spikes=options['spikes'],
+                                       pass_time=settings.get('MARKER_PASS_TIME')).run()
+    track_summary = report.summary()
+    lap = track_summary['lapTime']['mean']
+    failures = report.misses + report.false_markers + report.collisions
+    metrics.update({
+        'lapTime': lap,
+        'failureRate': 1.0 if report.aborted else round(failures / max(1, report.crossings), 4),
+        'markerMissRate': track_summary['markerMissRate'],
+        'falseMarkerRate': track_summary['falseMarkerRate'],
+        'collisions': report.collisions,
+        'trackAborted': report.aborted,
+    })
+
+    if report.aborted or lap is None or report.misses or report.false_markers:
+        # A robot that can't finish a lap - or loses count of the rooms - delivers nothing
+        metrics.update({'deliveriesPerHour': 0.0, 'pickupLatencyP90': None, 'cancelledShare': None})
+    else:
+        # The track's segment costs assume a lap of cycle_time(0) seconds
+        graph = TrackGraph.for_track(TrackMap.load())
+        scale = lap / graph.cycle_time(0)
+        rooms = [node for node in graph.stop_nodes() if node != 0]
+        requests = Workload.poisson(options['rate'], rooms=RoomChoice.uniform(rooms)).generate(
+            options['hours'], DEFAULT_START, options['seed'])
+        delivery = Simulation(requests, hours=options['hours'], seed=options['seed'],
+                              travel_scale=scale).run().summary()
+        metrics.update({
+            'travelScale': round(scale, 3),
+            'deliveriesPerHour': delivery['throughputPerHour'],
+            'pickupLatencyP90': delivery['pickupLatency']['p90'],
+            'cancelledShare': round(delivery['cancelled'] / max(1, delivery['requested']), 3),
+        })
+
+    metrics['wallSeconds'] = round(time.perf_counter() - started, 2)
+    return {'settings': settings, 'metrics': metrics}
+
+
+# ---------- Pareto front ----------
+
+def parse_objectives(objectives):
+    parsed = []
+    for objective in objectives:
+        sign, name = objective[0], objective[1:]
+        if sign not in '+-' or not name:
+            raise ValueError(f"Objective must start with + or -: {objective!r}")
+        parsed.append((name, 1 if sign == '+' else -1))
+    return parsed
+
+
+def _score(result, objectives):
+    """Objective values turned into 'bigger is better' (missing = worst)"""
+    return [-math.inf if result['metrics'].get(name) is None else sign * result['metrics'][name]
+            for name, sign in objectives]
+
+
+def pareto_front(results, objectives):
+    """Results no other result beats on every objective"""
+    scores = [_score(r, objectives) for r in results]
+
+    def dominates(a, b):
+        return all(x >= y for x, y in zip(a, b)) and any(x > y for x, y in zip(a, b))
+
+    return [r for r, s in zip(results, scores)
+            if not any(dominates(other, s) for other in scores if other is not s)]
+
+
+def print_table(results, front, names):
+    header = ' '.join(f"{name:>18}" for name in names)
+    columns = ' '.join(f"{title:>10}" for title in COLUMNS.values())
+    print(f"\n  {header} {columns}")
+    for result in results:
+        mark = '★' if result in front else ' '
+        settings = ' '.join(f"{str(result['settings'][name]):>18}" for name in names)
+        values = []
+        for metric in COLUMNS:
+            value = result['metrics'].get(metric)
+            values.append(f"{'-' if value is None else value:>10}")
+        print(f"{mark} {settings} {' '.join(values)}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sweep robot settings across the simulators")
+    parser.add_argument('--param', action='append', required=True,
+                        help="NAME=a,b,c (grid) or NAME=low:high (with --random); repeatable")
+    parser.add_argument('--random', type=int, default=0, help="Draw this many random configurations")
+    parser.add_argument('--objective', action='append', help=f"Default: {' '.join(DEFAULT_OBJECTIVES)}")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--laps', type=int, default=3, help="Track laps per configuration")
+    parser.add_argument('--obstacles', type=int, default=4, help="People stepping into the corridor")
+    parser.add_argument('--spikes', type=float, default=0.0, help="IR flip probability per read")
+    parser.add_argument('--rate', type=float, default=8.0, help="Delivery requests per hour")
+    parser.add_argument('--hours', type=float, default=4.0, help="Simulated delivery hours")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="Write every result and the Pareto front as JSON")
+    args = parser.parse_args()
+
+    params = dict(parse_param(p) for p in args.param)
+    for name in params:
+        if not hasattr(config, name):
+            parser.error(f"Unknown setting {name!r} (not in config.py)")
+    objectives = parse_objectives(args.objective or DEFAULT_OBJECTIVES)
+    names = sorted(params)
+    configs = random_configs(params, args.random, args.seed) if args.random else grid_configs(params)
+    defaults = {name: getattr(config, name) for name in names}
+    options = {'laps': args.laps, 'obstacles': args.obstacles, 'spikes': args.spikes,
+               'rate': args.rate, 'hours': args.hours, 'seed': args.seed}
+
+    print(f"🤖 [SWEEP] {len(configs)} configuration(s) of {', '.join(names)} on {args.workers} worker(s)")
+    started = time.perf_counter()
+    # Spawned workers - a fresh interpreter per worker, no forked threads or clocks
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context) as pool:
+        results = list(pool.map(evaluate, configs, [options] * len(configs)))
+
+    front = pareto_front(results, objectives)
+    print(f"\n📊 Current config.py: " + ', '.join(f"{k}={v}" for k, v in defaults.items()))
+    print_table(results, front, names)
+    print(f"\n★ {len(front)} Pareto-best configuration(s) for "
+          f"{', '.join(('max ' if s > 0 else 'min ') + n for n, s in objectives)} "
+          f"({time.perf_counter() - started:.1f}s)")
+    for result in sorted(front, key=lambda r: _score(r, objectives), reverse=True):
+        print("   " + ', '.join(f"{k}={v}" for k, v in result['settings'].items()))
+
+    if args.out:
+        try:
+            with open(args.out, 'w') as f:
+                json.dump({'objectives': args.objective or DEFAULT_OBJECTIVES, 'options': options,
+                           'results': results, 'pareto': front}, f, indent=2)
+            print(f"✓ Results written to {args.out}")
+        except Exception as e:
+            print(f"❌ Error writing results: {e}")
@@ -0,0 +1,72 @@
+# test_compartment_allocator.py - Compartment assignment along a planned route
+import pytest
+
+from compartment_allocator import CompartmentAllocator
+from route_planner import RoutePlanner
+from test_route_planner import make_deliveries
+
+
+def held_compartments(stops, loaded, assignments):
+    """Walk the route and fail if two deliveries on board share a compartment"""
+    on_board = dict(loaded)
+    for room, tasks in stops:
+        for delivery, action in tasks:
+            if action == 'deliver':
+                on_board.pop(delivery['id'], None)
+            else:
+                compartment = assignments[delivery['id']]
+                assert compartment not in on_board.values(), "compartment shared"
+                on_board[delivery['id']] = compartment
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_planned_route_fits_the_compartments(seed):
+    deliveries = make_deliveries(6, seed=seed)
+    plan = RoutePlanner(capacity=3).plan(deliveries, start=0, now=0)
+    assignments, occupancy, unassigned = CompartmentAllocator(3).allocate(plan.stops, {})
+    assert unassigned == []
+    assert set(assignments) == {d['id'] for d in deliveries}
+    assert set(assignments.values()) <= {1, 2, 3}
+    held_compartments(plan.stops, {}, assignments)
+
+
+def test_compartment_emptied_at_a_room_is_refilled_there():
+    a = {'id': 'a', 'pickup': 1, 'destination': 2}
+    b = {'id': 'b', 'pickup': 2, 'destination': 3}
+    stops = [(1, [(a, 'pickup')]), (2, [(a, 'deliver'), (b, 'pickup')]), (3, [(b, 'deliver')])]
+    assignments, occupancy, unassigned = CompartmentAllocator(1).allocate(stops, {})
+    assert assignments == {'a': 1, 'b': 1}
+    assert occupancy == {1: 'a'}
+    assert unassigned == []
+
+
+def test_loaded_deliveries_keep_their_compartment():
+    a = {'id': 'a', 'pickup': 1, 'destination': 3, 'compartment': 2}
+    b = {'id': 'b', 'pickup': 2, 'destination': 4, 'compartment': 2}
+    stops = [(2, [(b, 'pickup')]), (3, [(a, 'deliver')]), (4, [(b, 'deliver')])]
+    assignments, occupancy, unassigned = CompartmentAllocator(3).allocate(stops, {'a': 2})
+    assert 'a' not in assignments
+    assert assignments['b'] != 2
+    assert occupancy == {1: 'b', 2: 'a', 3: ''}
+
+
+def test_pickup_keeps_its_current_compartment_when_free():
+    a = {'id': 'a', 'pickup': 1, 'destination': 2, 'compartment': 3}
+    assignments, occupancy, unassigned = CompartmentAllocator(3).allocate(
+        [(1, [(a, 'pickup')]), (2, [(a, 'deliver')])], {})
+    assert assignments == {'a': 3}
+
+
+def test_overflow_is_reported_unassigned():
+    deliveries = [{'id': name, 'pickup': 1, 'destination': 2} for name in 'abc']
+    stops = [(1, [(d, 'pickup') for d in deliveries]), (2, [(d, 'deliver') for d in deliveries])]
+    assignments, occupancy, unassigned = CompartmentAllocator(2).allocate(stops, {})
+    assert unassigned == ['c']
+    assert sorted(assignments.values()) == [1, 2]
+
+
+def test_apply_reports_changed_compartments():
+    a = {'id': 'a', 'pickup': 1, 'destination': 2, 'compartment': 1}
+    stops = [(1, [(a, 'pickup')]), (2, [(a, 'deliver')])]
+    assert CompartmentAllocator(3).apply(stops, {'a': 2}) == {'a': (1, 2)}
+    assert a['compartment'] == 2
@@ -0,0 +1,45 @@
+# test_control_process.py - Shared-memory block layout between the two processes
+import pytest
+
+from control_process import (SharedBlock, CMD_NAVIGATE, STATE_NAVIGATING,
+                             STATUS_FIELDS, BLOCK_SIZE, STATUS_OFFSET, COMMAND_LAYOUT)
+
+
+@pytest.fixture
+def blocks():
+    """The orchestrator's block and the control process's view of it"""
+    owner = SharedBlock()
+    peer = SharedBlock(owner.name)
+    yield owner, peer
+    peer.close()
+    owner.close(unlink=True)
+
+
+def test_layout_fits_the_block():
+    assert COMMAND_LAYOUT.size <= STATUS_OFFSET
+    assert BLOCK_SIZE > STATUS_OFFSET
+
+
+@pytest.mark.parametrize('node', [0, 127, 128, 300, 70000])
+def test_command_round_trip_with_large_node_ids(blocks, node):
+    owner, peer = blocks
+    owner.write_command(7, CMD_NAVIGATE, target_room=node, start_room=node + 1, costs_revision=3)
+    assert peer.read_command() == (7, CMD_NAVIGATE, node, node + 1, 3)
+
+
+@pytest.mark.parametrize('node', [300, 70000])
+def test_status_round_trip_with_large_node_ids(blocks, node):
+    owner, peer = blocks
+    status = {field: 0 for field in STATUS_FIELDS}
+    status.update(state=STATE_NAVIGATING, done_command=6, location=node, markers_seen=12,
+                  last_marker_time=1234.5, ir_left=1, distance=42.5, obstacle=1,
+                  motor_command=2, tick_count=900, max_tick_ms=12.25, heartbeat=99.75)
+    peer.write_status(status)
+    assert owner.read_status() == status
+
+
+def test_sequence_stays_even_after_each_write(blocks):
+    owner, peer = blocks
+    for command_id in range(3):
+        owner.write_command(command_id, CMD_NAVIGATE, target_room=300)
+        assert owner.command_seq == 2 * (command_id + 1)
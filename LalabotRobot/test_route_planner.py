@@ -0,0 +1,153 @@
+# test_route_planner.py - Precedence, capacity and compartment checks for the planner
+import random
+
+import pytest
+
+from route_planner import LivePlan, RoutePlanner, route_cost
+from track_graph import TrackGraph
+
+
+def make_deliveries(count, rooms=4, seed=0, compartments=None):
+    rng = random.Random(seed)
+    deliveries = []
+    for number in range(count):
+        pickup, destination = rng.sample(range(rooms + 1), 2)
+        delivery = {'id': f"d{number}", 'pickup': pickup, 'destination': destination}
+        if compartments:
+            delivery['compartment'] = 1 + number % compartments
+        deliveries.append(delivery)
+    return deliveries
+
+
+def check_route(stops, deliveries, capacity, loaded=(), compartments=False):
+    """Walk the route as the robot does (drop-offs before pickups at a stop)
+    and fail on any broken constraint; every delivery must be dropped off"""
+    by_id = {d['id']: d for d in deliveries}
+    on_board = {d_id: by_id[d_id].get('compartment') for d_id in loaded}
+    delivered = set()
+    for room, tasks in stops:
+        for delivery, action in sorted(tasks, key=lambda task: task[1] != 'deliver'):
+            if action == 'deliver':
+                assert room == delivery['destination']
+                assert delivery['id'] in on_board, f"{delivery['id']} dropped off before pickup"
+                del on_board[delivery['id']]
+                delivered.add(delivery['id'])
+            else:
+                assert room == delivery['pickup']
+                assert delivery['id'] not in delivered
+                if compartments and delivery.get('compartment') is not None:
+                    assert delivery['compartment'] not in on_board.values(), "compartment clash"
+                on_board[delivery['id']] = delivery.get('compartment')
+                assert len(on_board) <= capacity, "over capacity"
+    assert delivered == set(by_id)
+    assert not on_board
+
+
+@pytest.mark.parametrize('exact_limit', [7, 0])  # Branch-and-bound, sweep heuristic
+@pytest.mark.parametrize('seed', range(5))
+def test_plan_keeps_precedence_and_capacity(exact_limit, seed):
+    deliveries = make_deliveries(6, seed=seed)
+    planner = RoutePlanner(capacity=2, exact_limit=exact_limit)
+    plan = planner.plan(deliveries, start=0, now=0)
+    check_route(plan.stops, deliveries, capacity=2)
+    assert plan.segments == route_cost(plan.stops, 0, graph=planner.graph)
+
+
+@pytest.mark.parametrize('exact_limit', [7, 0])
+def test_plan_never_loads_two_deliveries_into_one_compartment(exact_limit):
+    deliveries = make_deliveries(6, seed=3, compartments=2)
+    planner = RoutePlanner(capacity=3, exact_limit=exact_limit, allocate_compartments=False)
+    plan = planner.plan(deliveries, start=0, now=0)
+    check_route(plan.stops, deliveries, capacity=3, compartments=True)
+
+
+def test_loaded_deliveries_are_only_dropped_off():
+    deliveries = make_deliveries(4, seed=1)
+    loaded = {'d0', 'd1'}
+    plan = RoutePlanner(capacity=3).plan(deliveries, start=2, loaded=loaded, now=0)
+    actions = [(d['id'], action) for room, tasks in plan.stops for d, action in tasks]
+    assert ('d0', 'pickup') not in actions and ('d1', 'pickup') not in actions
+    check_route(plan.stops, deliveries, capacity=3, loaded=loaded)
+
+
+def test_exact_plan_is_no_longer_than_the_heuristic():
+    deliveries = make_deliveries(5, seed=7)
+    exact = RoutePlanner(capacity=2).plan(deliveries, start=0, now=0)
+    heuristic = RoutePlanner(capacity=2, exact_limit=0).plan(deliveries, start=0, now=0)
+    assert exact.segments <= heuristic.segments
+
+
+def test_plan_on_a_graph_with_a_spur():
+    # Loop 0 → 1 → 2 → 3 → 0 with a spur 2 ↔ 4
+    nodes = {0: 'base', 1: 'room', 2: 'junction', 3: 'room', 4: 'room'}
+    edges = {(0, 1): {}, (1, 2): {}, (2, 3): {}, (3, 0): {},
+             (2, 4): {'turn': 'right'}, (4, 2): {'turn': 'uturn'}}
+    graph = TrackGraph(nodes, edges)
+    deliveries = [{'id': 'a', 'pickup': 4, 'destination': 1},
+                  {'id': 'b', 'pickup': 3, 'destination': 4}]
+    plan = RoutePlanner(capacity=1, graph=graph).plan(deliveries, start=0, now=0)
+    check_route(plan.stops, deliveries, capacity=1)
+
+
+# ---------- LivePlan.insert ----------
+
+def best_insertion_cost(live, delivery, position, loaded, deliveries):
+    """Brute force: fewest segments over every feasible pickup/drop-off slot"""
+    best = None
+    count = len(live.stops)
+    for i in range(count + 1):
+        for j in range(i, count + 1):
+            stops = [(room, list(tasks)) for room, tasks in live.stops]
+            stops.insert(j, (delivery['destination'], [(delivery, 'deliver')]))
+            stops.insert(i, (delivery['pickup'], [(delivery, 'pickup')]))
+            try:
+                check_route(stops, deliveries, capacity=live.capacity, loaded=loaded)
+            except AssertionError:
+                continue
+            cost = route_cost(stops, position, graph=live.graph)
+            best = cost if best is None else min(best, cost)
+    return best
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_insert_keeps_precedence_and_capacity(seed):
+    deliveries = make_deliveries(5, seed=seed)
+    planned, new = deliveries[:4], deliveries[4]
+    loaded = {'d0'}
+    plan = RoutePlanner(capacity=2).plan(planned, start=1, loaded=loaded, now=0)
+    live = LivePlan(plan.stops, capacity=2)
+    expected = best_insertion_cost(live, new, 1, loaded, deliveries)
+
+    live.insert(new, position=1, loaded=loaded)
+
+    check_route(live.stops, deliveries, capacity=2, loaded=loaded)
+    if expected is not None:
+        assert route_cost(live.stops, 1, graph=live.graph) == expected
+
+
+def test_insert_loaded_delivery_only_adds_the_drop_off():
+    deliveries = make_deliveries(3, seed=2)
+    live = LivePlan(RoutePlanner(capacity=3).plan(deliveries[:2], start=0, now=0).stops, capacity=3)
+    live.insert(deliveries[2], position=0, loaded={'d2'})
+    actions = [action for room, tasks in live.stops for d, action in tasks if d['id'] == 'd2']
+    assert actions == ['deliver']
+
+
+def test_insert_waits_until_a_compartment_frees_up():
+    # Both compartments stay full until the last stop
+    a = {'id': 'a', 'pickup': 1, 'destination': 3}
+    b = {'id': 'b', 'pickup': 1, 'destination': 3}
+    live = LivePlan([(3, [(a, 'deliver'), (b, 'deliver')])], capacity=2)
+    new = {'id': 'c', 'pickup': 2, 'destination': 4}
+    live.insert(new, position=1, loaded={'a', 'b'})
+    check_route(live.stops, [a, b, new], capacity=2, loaded={'a', 'b'})
+    assert [room for room, tasks in live.stops] == [3, 2, 4]
+
+
+def test_insert_respects_fixed_compartments():
+    a = {'id': 'a', 'pickup': 1, 'destination': 3, 'compartment': 1}
+    live = LivePlan([(1, [(a, 'pickup')]), (3, [(a, 'deliver')])],
+                    capacity=3, allocate_compartments=False)
+    new = {'id': 'b', 'pickup': 2, 'destination': 4, 'compartment': 1}
+    live.insert(new, position=0, loaded=set())
+    check_route(live.stops, [a, new], capacity=3, compartments=True)
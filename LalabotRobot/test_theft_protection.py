@@ -0,0 +1,109 @@
+# test_theft_protection.py - Detection latency and false alarms on a virtual clock
+import os
+os.environ.setdefault('LALABOT_FAKE_GPIO', '1')
+
+import pytest
+
+import fake_lgpio
+import robot_clock
+from config import THEFT_CHECK_INTERVAL, THEFT_OFF_LINE_THRESHOLD, THEFT_FUSED_THRESHOLD
+from theft_protection import TheftProtection
+
+LINE = (1, 0, 1)   # Centered on the line
+WHITE = (1, 1, 1)  # No floor under the robot (or a white marker)
+# One check to notice the change, one more if float drift lands a check just short of the threshold
+LATENCY_SLACK = 2 * THEFT_CHECK_INTERVAL
+
+
+class FakeLineFollower:
+    """IR readings as a function of clock time"""
+
+    def __init__(self, sensors):
+        self.sensors = sensors
+
+    def read_sensors(self):
+        return self.sensors(robot_clock.monotonic())
+
+
+class FakeFirebase:
+    def __init__(self):
+        self.reports = []
+
+    def report_theft(self, reason):
+        self.reports.append(reason)
+        return True
+
+
+@pytest.fixture
+def clock():
+    clock = robot_clock.VirtualClock()
+    previous = robot_clock.install(clock)
+    yield clock
+    robot_clock.install(previous)
+    fake_lgpio.reset()
+
+
+def monitor(sensors, distance=lambda now: 100.0, moving=False):
+    return TheftProtection(FakeLineFollower(sensors), FakeFirebase(),
+                           is_moving=lambda: moving,
+                           read_distance=lambda: distance(robot_clock.monotonic()))
+
+
+def test_lift_is_detected_after_the_off_line_threshold(clock):
+    theft = monitor(lambda now: WHITE if now >= 10 else LINE)
+    theft.run(duration=20)
+    assert theft.alarm_active
+    assert theft.detected_at - 10 == pytest.approx(THEFT_OFF_LINE_THRESHOLD, abs=LATENCY_SLACK)
+    assert theft.detection_latency == pytest.approx(THEFT_OFF_LINE_THRESHOLD, abs=THEFT_CHECK_INTERVAL)
+    theft.cleanup()
+
+
+def test_lift_with_a_distance_jump_uses_the_fused_threshold(clock):
+    theft = monitor(lambda now: WHITE if now >= 10 else LINE,
+                    distance=lambda now: 20.0 if now >= 10 else 100.0)
+    theft.run(duration=20)
+    assert theft.alarm_active
+    assert theft.detected_at - 10 == pytest.approx(THEFT_FUSED_THRESHOLD, abs=LATENCY_SLACK)
+    theft.cleanup()
+
+
+def test_parked_on_a_white_marker_is_not_a_theft(clock):
+    theft = monitor(lambda now: WHITE)
+    theft.run(duration=60)
+    assert not theft.alarm_active
+    theft.cleanup()
+
+
+def test_single_noisy_readings_are_not_a_theft(clock):
+    # One all-white sample each second, the line otherwise
+    theft = monitor(lambda now: WHITE if round(now / THEFT_CHECK_INTERVAL) % 10 == 0 else LINE)
+    theft.run(duration=60)
+    assert not theft.alarm_active
+    theft.cleanup()
+
+
+def test_no_lift_checks_while_moving(clock):
+    theft = monitor(lambda now: WHITE if now >= 10 else LINE, moving=True)
+    theft.run(duration=20)
+    assert not theft.alarm_active
+    theft.cleanup()
+
+
+def test_step_drives_the_checks_at_given_times(clock):
+    theft = monitor(lambda now: LINE)
+    assert theft.step(now=0.0) is None
+    assert theft.step(now=1.0) is None  # Line seen for THEFT_CLEAR_TIME
+    theft.line_follower.sensors = lambda now: WHITE
+    assert theft.step(now=2.0) is None
+    assert theft.step(now=2.0 + THEFT_OFF_LINE_THRESHOLD) == "Robot lifted off track"
+    theft.cleanup()
+
+
+def test_check_for_theft_is_refused_while_the_monitor_runs(clock):
+    theft = monitor(lambda now: LINE)
+    theft.thread = type('Alive', (), {'is_alive': lambda self: True})()
+    with pytest.raises(RuntimeError):
+        theft.check_for_theft(False)
+    theft.thread = None
+    assert theft.check_for_theft(False) is False
+    theft.cleanup()
@@ -1,92 +1,232 @@
 # theft_protection.py - Theft detection and alarm system
-import time
-import lgpio
-from config import THEFT_OFF_LINE_THRESHOLD, WIFI_CHECK_INTERVAL, BUZZER_PIN
+#
+# A monitor sampling at a fixed rate (THEFT_CHECK_INTERVAL) on monotonic time,
+# so detection latency doesn't depend on how fast the caller loops. While the
+# robot is parked it fuses three signals:
+#   - IR: all three sensors white (no floor under the robot) after the line was seen
+#   - Ultrasonic: the distance ahead jumping away from its parked baseline
+#   - Connectivity: firebase.is_connected() (if the handler has it)
+# All-white alone must last THEFT_OFF_LINE_THRESHOLD seconds; together with a
+# distance jump THEFT_FUSED_THRESHOLD is enough. Losing Wi-Fi for
+# THEFT_WIFI_TIMEOUT seconds raises the alarm on its own.
+import threading
+import robot_clock
+from gpio_backend import lgpio
+from config import (THEFT_CHECK_INTERVAL, THEFT_OFF_LINE_THRESHOLD, THEFT_FUSED_THRESHOLD,
+                    THEFT_DISTANCE_JUMP, THEFT_CLEAR_TIME, THEFT_WIFI_TIMEOUT, WIFI_CHECK_INTERVAL,
+                    BUZZER_PIN, ALARM_BEEPS, ALARM_BEEP_FREQUENCY, THEFT_REPORT_RETRY_INTERVAL)
 
 class TheftProtection:
-    def __init__(self, line_follower, firebase, gpio_handle):
+    def __init__(self, line_follower, firebase, gpio_handle=None, obstacle_detector=None,
+                 is_moving=None, read_distance=None, is_connected=None):
+        """gpio_handle: gpiochip handle for the buzzer (default: opens its own);
+        is_moving: callable, True while the robot drives (no lift checks);
+        read_distance: callable → cm or None (default obstacle_detector.get_distance);
+        is_connected: callable (default firebase.is_connected, if it exists)"""
         self.line_follower = line_follower
         self.firebase = firebase
-        self.h = gpio_handle
-        
+        self.owns_handle = gpio_handle is None
+        self.h = lgpio.gpiochip_open(0) if gpio_handle is None else gpio_handle
+        self.is_moving = is_moving or (lambda: False)
+        if read_distance is None and obstacle_detector is not None:
+            read_distance = obstacle_detector.get_distance
+        self.read_distance = read_distance
+        self.is_connected = is_connected or getattr(firebase, 'is_connected', None)
+
         # Buzzer setup
         self.buzzer_pin = BUZZER_PIN
         lgpio.gpio_claim_output(self.h, self.buzzer_pin)
         lgpio.gpio_write(self.h, self.buzzer_pin, 0)  # Off initially
-        
-        # Thresholds
-        self.off_line_duration = 0
-        self.off_line_threshold = THEFT_OFF_LINE_THRESHOLD
-        self.wifi_check_interval = WIFI_CHECK_INTERVAL
-        self.last_wifi_check = time.time()
-        
+
+        # Evidence windows (robot_clock.monotonic() when each signal started, or None)
+        self.line_seen = False       # Line under the robot since it parked
+        self.white_since = None
+        self.not_white_since = None  # Debounce: a single noisy reading doesn't clear white_since
+        self.jump_since = None
+        self.baseline = None         # Parked distance ahead (cm), smoothed
+        self.disconnected_since = None
+        self.last_wifi_check = None
+
         self.alarm_active = False
+        self.alarm_cleared = threading.Event()  # Stops the theft report retries
+        self.detected_at = None       # monotonic time of the last alarm
+        self.detection_latency = None  # Seconds from first evidence to the alarm
+        self.running = False
+        self.thread = None
         print("✅ Theft protection initialized")
-    
+
+    # ---------- monitor ----------
+
+    def start(self):
+        """Run the monitor on its own thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+
+    def run(self, duration=None):
+        """Check at a fixed rate until stop() (or for `duration` seconds).
+        Deadlines advance by the interval, so slow sensor reads don't add drift."""
+        self.running = True
+        now = robot_clock.monotonic()
+        end = None if duration is None else now + duration
+        next_check = now
+        while self.running and (end is None or next_check < end):
+            try:
+                self.step()
+            except Exception as e:
+                print(f"⚠ Theft check failed: {e}")
+            next_check += THEFT_CHECK_INTERVAL
+            delay = next_check - robot_clock.monotonic()
+            if delay > 0:
+                robot_clock.sleep(delay)
+            else:
+                next_check = robot_clock.monotonic()  # Fell behind - don't burst to catch up
+
+    def step(self, now=None, moving=None):
+        """One check; returns the alarm reason if theft was detected.
+        moving overrides is_moving() for this check."""
+        now = robot_clock.monotonic() if now is None else now
+        moving = self.is_moving() if moving is None else moving
+        latency = self.detection_latency
+        reason = None
+        if moving:
+            self.reset_evidence()
+        else:
+            reason = self.check_lifted(now)
+        if reason is None:
+            reason = self.check_connection(now)
+        if reason is not None:
+            if self.alarm_active:
+                self.detection_latency = latency  # Keep the latency of the alarm that is sounding
+            self.trigger_alarm(reason)
+        return reason
+
     def check_for_theft(self, is_robot_moving):
-        """Main theft detection logic - returns True if theft detected"""
-        
-        # Check 1: Line sensors (only when not moving)
-        if not is_robot_moving:
-            if self.check_lifted():
-                self.trigger_alarm("Robot lifted off track")
-                return True
-        
-        # Check 2: WiFi connection (periodic check)
-        current_time = time.time()
-        if current_time - self.last_wifi_check > self.wifi_check_interval:
-            self.last_wifi_check = current_time
-            
-            if not self.firebase.is_connected():
-                time_disconnected = current_time - self.firebase.last_connected_time
-                
-                if time_disconnected > 30:  # 30 seconds without WiFi
-                    self.trigger_alarm("WiFi disconnected - possible theft")
-                    return True
-        
-        return False
-    
-    def check_lifted(self):
-        """Check if robot is lifted using line sensors"""
-        # All sensors see white = robot lifted
-        if self.line_follower.all_sensors_white():
-            self.off_line_duration += 0.1
-            
-            if self.off_line_duration > self.off_line_threshold:
-                return True
+        """Single check for callers with their own loop - returns True if theft detected"""
+        if self.thread is not None and self.thread.is_alive():
+            raise RuntimeError("Theft monitor is running - check_for_theft would race its thread")
+        return self.step(moving=is_robot_moving) is not None
+
+    def reset_evidence(self):
+        """Robot moved: new surroundings, start over"""
+        self.line_seen = False
+        self.white_since = None
+        self.not_white_since = None
+        self.jump_since = None
+        self.baseline = None
+
+    # ---------- signals ----------
+
+    def check_lifted(self, now):
+        """Fuse IR and ultrasonic evidence; reason string once lifted"""
+        left, center, right = self.line_follower.read_sensors()
+        all_white = left == 1 and center == 1 and right == 1
+        if not all_white:
+            if self.not_white_since is None:
+                self.not_white_since = now
+            if now - self.not_white_since >= THEFT_CLEAR_TIME:
+                self.line_seen = True  # A single noisy reading on a marker isn't the line
+                self.white_since = None
         else:
-            self.off_line_duration = 0  # Reset counter
-        
-        return False
-    
+            self.not_white_since = None
+            if self.line_seen:
+                # Parked on a white marker never counts - only white appearing under a parked robot
+                if self.white_since is None:
+                    self.white_since = now
+
+        distance = self.read_distance() if self.read_distance is not None else None
+        if distance is not None:
+            if self.baseline is None:
+                self.baseline = distance
+            if abs(distance - self.baseline) > THEFT_DISTANCE_JUMP:
+                if self.jump_since is None:
+                    self.jump_since = now
+            else:
+                self.jump_since = None
+                if self.white_since is None:
+                    self.baseline += 0.2 * (distance - self.baseline)
+
+        if self.white_since is None:
+            return None
+        if now - self.white_since >= THEFT_OFF_LINE_THRESHOLD:
+            self.detection_latency = now - self.white_since
+            return "Robot lifted off track"
+        if self.jump_since is not None and now - max(self.white_since, self.jump_since) >= THEFT_FUSED_THRESHOLD:
+            self.detection_latency = now - min(self.white_since, self.jump_since)
+            return "Robot lifted off track (floor and distance changed)"
+        return None
+
+    def check_connection(self, now):
+        """Reason string once Firebase has been unreachable for THEFT_WIFI_TIMEOUT"""
+        if self.is_connected is None:
+            return None
+        if self.last_wifi_check is not None and now - self.last_wifi_check < WIFI_CHECK_INTERVAL:
+            return None
+        self.last_wifi_check = now
+        if self.is_connected():
+            self.disconnected_since = None
+            return None
+        if self.disconnected_since is None:
+            self.disconnected_since = now
+        if now - self.disconnected_since >= THEFT_WIFI_TIMEOUT:
+            self.detection_latency = now - self.disconnected_since
+            return "WiFi disconnected - possible theft"
+        return None
+
+    # ---------- alarm ----------
+
     def trigger_alarm(self, reason):
-        """Sound alarm and notify Firebase"""
+        """Sound alarm and notify Firebase - returns immediately"""
         if self.alarm_active:
             return  # Already alarming
-        
+
         self.alarm_active = True
+        self.alarm_cleared.clear()
+        self.detected_at = robot_clock.monotonic()
         print(f"🚨🚨🚨 THEFT ALERT: {reason} 🚨🚨🚨")
-        
-        # Sound buzzer (loud pattern)
-        for _ in range(20):
-            lgpio.gpio_write(self.h, self.buzzer_pin, 1)
-            time.sleep(0.1)
-            lgpio.gpio_write(self.h, self.buzzer_pin, 0)
-            time.sleep(0.1)
-        
-        # Report to Firebase
-        try:
-            self.firebase.report_theft(reason)
-        except:
-            pass
-    
+
+        # Beep pattern timed by lgpio itself (50% duty = on/off halves),
+        # so motors and obstacle checks keep running meanwhile
+        lgpio.tx_pwm(self.h, self.buzzer_pin, ALARM_BEEP_FREQUENCY, 50, 0, ALARM_BEEPS)
+
+        # Report to Firebase in parallel
+        threading.Thread(target=self.report_theft, args=(reason,), daemon=True).start()
+
+    def report_theft(self, reason):
+        """Send the theft report, retrying while the alarm stays active
+        (a thief may just have taken the robot out of Wi-Fi range)"""
+        while self.alarm_active:
+            try:
+                if self.firebase.report_theft(reason):
+                    return
+            except Exception as e:
+                print(f"❌ Theft report failed: {e}")
+            self.alarm_cleared.wait(THEFT_REPORT_RETRY_INTERVAL)
+
     def disable_alarm(self):
         """Turn off alarm (for authorized reset)"""
         self.alarm_active = False
+        self.alarm_cleared.set()
+        lgpio.tx_pwm(self.h, self.buzzer_pin, 0, 0)  # Stop the beep pattern
         lgpio.gpio_write(self.h, self.buzzer_pin, 0)
-        self.off_line_duration = 0
+        self.reset_evidence()
+        self.disconnected_since = None
         print("✅ Theft alarm disabled")
-    
+
     def cleanup(self):
         """Cleanup GPIO"""
-        lgpio.gpio_write(self.h, self.buzzer_pin, 0)
\ No newline at end of file
+        self.stop()
+        self.alarm_active = False
+        self.alarm_cleared.set()
+        lgpio.tx_pwm(self.h, self.buzzer_pin, 0, 0)
+        lgpio.gpio_write(self.h, self.buzzer_pin, 0)
+        if self.owns_handle:
+            try:
+                lgpio.gpiochip_close(self.h)
+            except Exception:
+                pass
@@ -0,0 +1,258 @@
+"""
+Theft Simulator - Detection latency and false alarms of the theft monitor
+
+Runs the real TheftProtection monitor, LineFollower sensor reads and
+ObstacleDetector on fake GPIO and a virtual clock, through hours of a
+parked/driving robot: noisy IR, people walking past the ultrasonic sensor,
+stops on a white marker, Wi-Fi dropouts - and now and then someone lifting
+the robot. Every alarm is checked against what really happened.
+
+    python theft_sim.py                               # 8 h, 12 lifts
+    python theft_sim.py --hours 24 --lifts 40 --spikes 0.05 --outages 4 --seed 3
+    python theft_sim.py --json
+"""
+
+import os
+os.environ['LALABOT_FAKE_GPIO'] = '1'  # Before any hardware module picks its lgpio
+
+import bisect
+import contextlib
+import json
+import random
+import time
+
+import gpio_backend
+import fake_lgpio
+import robot_clock
+from robot_clock import VirtualClock
+from simulator import percentile
+from config import IR_LEFT, IR_CENTER, IR_RIGHT, TRIG, ECHO, THEFT_DISTANCE_JUMP
+
+
+class Intervals:
+    """Non-overlapping [start, end) intervals with a payload, looked up by time"""
+
+    def __init__(self, items):
+        self.items = sorted(items, key=lambda item: item['start'])
+        self.starts = [item['start'] for item in self.items]
+
+    def at(self, t):
+        index = bisect.bisect_right(self.starts, t) - 1
+        if index >= 0 and t < self.items[index]['end']:
+            return self.items[index]
+        return None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _sequence(rng, hours, rate_per_hour, duration):
+    """Non-overlapping Poisson events, duration() seconds each"""
+    items, t = [], 0.0
+    if rate_per_hour <= 0:
+        return items
+    while True:
+        t += rng.expovariate(rate_per_hour / 3600)
+        if t >= hours * 3600:
+            return items
+        length = duration()
+        items.append({'start': t, 'end': t + length})
+        t += length
+
+
+class TheftSimulation:
+    """A parked / driving robot with lifts, passers-by and Wi-Fi dropouts.
+
+    stops: parked 60-600 s, driving 10-40 s in between; marker_stops share
+    of stops ends on a white marker (all IR white without a theft).
+    lifts: thefts, each during a different stop; keep_level share of them
+    hold the robot level so the distance ahead barely changes.
+    """
+
+    def __init__(self, hours=8.0, lifts=12, seed=0, ir_spikes=0.01, echo_noise=2.0,
+                 passers_per_hour=20, outages_per_hour=0.5, marker_stops=0.1, keep_level=0.3,
+                 lift_duration=60.0, read_time=0.0002):
+        self.hours = hours
+        self.rng = random.Random(seed)
+        self.ir_spikes = ir_spikes
+        self.echo_noise = echo_noise
+        self.read_time = read_time
+        self.clock = VirtualClock(0.0)
+        rng = random.Random(seed + 1)  # Scenario draws, independent of the sensor noise
+
+        stops, t = [], rng.uniform(0, 30)
+        while t < hours * 3600:
+            length = rng.uniform(60, 600)
+            stops.append({'start': t, 'end': t + length, 'marker': rng.random() < marker_stops,
+                          'distance': rng.uniform(40, 300)})
+            t += length + rng.uniform(10, 40)
+        self.stops = Intervals(stops)
+
+        lifts_at = []
+        for stop in rng.sample(stops, min(lifts, len(stops))):
+            if stop['end'] - stop['start'] < 20:
+                continue
+            start = rng.uniform(stop['start'] + 5, stop['end'] - 10)
+            lifted = stop['distance'] if rng.random() < keep_level else rng.choice(
+                [rng.uniform(5, max(6, stop['distance'] - 2 * THEFT_DISTANCE_JUMP)),
+                 stop['distance'] + rng.uniform(2 * THEFT_DISTANCE_JUMP, 300)])
+            lifts_at.append({'start': start, 'end': min(stop['end'], start + lift_duration),
+                             'distance': lifted, 'detected': None})
+        self.lifts = Intervals(lifts_at)
+        self.passers = Intervals([dict(p, distance=rng.uniform(20, 80)) for p in
+                                  _sequence(rng, hours, passers_per_hour, lambda: rng.uniform(1, 4))])
+        self.outages = Intervals(_sequence(rng, hours, outages_per_hour,
+                                           lambda: rng.lognormvariate(2.5, 1.0)))
+        self.alarms = []  # (time, reason, lift or None)
+
+    # ---------- world ----------
+
+    def is_moving(self):
+        return self.stops.at(robot_clock.time()) is None
+
+    def lift(self, t):
+        lift = self.lifts.at(t)
+        return lift if lift is not None and lift['detected'] is None else None
+
+    def ir_reader(self, black_when_parked):
+        def read():
+            t = robot_clock.time()
+            stop = self.stops.at(t)
+            white = self.lift(t) is not None or (stop is not None and stop['marker'])
+            black = black_when_parked and not white
+            if self.rng.random() < self.ir_spikes:
+                black = not black
+            return 0 if black else 1
+        return read
+
+    def sonar_distance(self):
+        t = robot_clock.time()
+        stop = self.stops.at(t)
+        lift = self.lift(t)
+        if stop is None:
+            distance = 250.0
+        elif lift is not None:
+            distance = lift['distance']
+        elif self.passers.at(t) is not None:
+            distance = self.passers.at(t)['distance']
+        else:
+            distance = stop['distance']
+        return max(2.0, distance + self.rng.gauss(0.0, self.echo_noise))
+
+    def is_connected(self):
+        return self.outages.at(robot_clock.time()) is None
+
+    def report_theft(self, reason):
+        return True
+
+    # ---------- run ----------
+
+    def run(self, verbose=False):
+        """Run the monitor for `hours`; returns the summary dict"""
+        from motor_controller import MotorController
+        from obstacle_detector import ObstacleDetector
+        from line_follower import LineFollower
+        from theft_protection import TheftProtection
+
+        if not gpio_backend.FAKE_GPIO:
+            raise RuntimeError("theft_sim needs the fake GPIO backend (LALABOT_FAKE_GPIO=1)")
+
+        started = time.perf_counter()
+        previous_clock = robot_clock.install(self.clock)
+        fake_lgpio.reset()
+        fake_lgpio.set_reader(IR_LEFT, self.ir_reader(False))
+        fake_lgpio.set_reader(IR_CENTER, self.ir_reader(True))
+        fake_lgpio.set_reader(IR_RIGHT, self.ir_reader(False))
+        fake_lgpio.set_echo(TRIG, ECHO, self.sonar_distance)
+        fake_lgpio.set_read_time(self.read_time)
+        output = open(os.devnull, 'w') if not verbose else None
+        try:
+            with contextlib.redirect_stdout(output) if output else contextlib.nullcontext():
+                detector = ObstacleDetector()
+                follower = LineFollower(MotorController(), detector)
+                monitor = TheftProtection(follower, self, follower.h, obstacle_detector=detector,
+                                          is_moving=self.is_moving, is_connected=self.is_connected)
+                sound = monitor.trigger_alarm
+
+                def on_alarm(reason):
+                    sound(reason)
+                    now = robot_clock.time()
+                    lift = self.lift(now)
+                    if lift is not None:
+                        lift['detected'] = now  # Robot put back on the track
+                    self.alarms.append((now, reason, lift, monitor.detection_latency))
+                    monitor.disable_alarm()  # Authorized reset
+
+                monitor.trigger_alarm = on_alarm
+                monitor.run(duration=self.hours * 3600)
+        finally:
+            robot_clock.install(previous_clock)
+            fake_lgpio.reset()
+            if output:
+                output.close()
+
+        return self.summary(time.perf_counter() - started)
+
+    def summary(self, wall_time=0.0):
+        latencies = [lift['detected'] - lift['start'] for lift in self.lifts if lift['detected'] is not None]
+        measured = [latency for t, reason, lift, latency in self.alarms if lift is not None]
+        false_lift = [a for a in self.alarms if a[2] is None and not a[1].startswith('WiFi')]
+        wifi = [a for a in self.alarms if a[1].startswith('WiFi')]
+
+        def stats(values):
+            return {f"p{p}": None if percentile(values, p) is None else round(percentile(values, p), 2)
+                    for p in (50, 90)} | {'max': round(max(values), 2) if values else None}
+
+        return {
+            'hours': self.hours,
+            'stops': len(self.stops),
+            'markerStops': sum(1 for s in self.stops if s['marker']),
+            'lifts': len(self.lifts),
+            'detected': len(latencies),
+            'missed': len(self.lifts) - len(latencies),
+            'detectionLatency': stats(latencies),
+            'measuredLatency': stats([m for m in measured if m is not None]),
+            'falseLiftAlarms': len(false_lift),
+            'falseLiftAlarmsPerHour': round(len(false_lift) / self.hours, 3) if self.hours else 0.0,
+            'outages': len(self.outages),
+            'longOutages': sum(1 for o in self.outages if o['end'] - o['start'] >= 30),
+            'wifiAlarms': len(wifi),
+            'simulatedSeconds': round(self.clock.time(), 1),
+            'wallSeconds': round(wall_time, 2)
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure the theft monitor on a simulated robot")
+    parser.add_argument('--hours', type=float, default=8.0)
+    parser.add_argument('--lifts', type=int, default=12, help="Thefts (robot lifted while parked)")
+    parser.add_argument('--spikes', type=float, default=0.01, help="IR flip probability per read")
+    parser.add_argument('--passers', type=float, default=20, help="People passing the sensor per hour")
+    parser.add_argument('--outages', type=float, default=0.5, help="Wi-Fi dropouts per hour")
+    parser.add_argument('--marker-stops', type=float, default=0.1, help="Share of stops on a white marker")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true', help="Show the robot's own output")
+    parser.add_argument('--json', action='store_true', help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    simulation = TheftSimulation(hours=args.hours, lifts=args.lifts, seed=args.seed, ir_spikes=args.spikes,
+                                 passers_per_hour=args.passers, outages_per_hour=args.outages,
+                                 marker_stops=args.marker_stops)
+    s = simulation.run(verbose=args.verbose)
+    if args.json:
+        print(json.dumps(s, indent=2))
+    else:
+        latency = s['detectionLatency']
+        print(f"\n🚨 Theft monitor over {s['hours']}h ({s['stops']} stops, {s['markerStops']} on a marker) "
+              f"in {s['wallSeconds']}s")
+        print(f"   Lifts:        {s['detected']}/{s['lifts']} detected, {s['missed']} missed")
+        print(f"   Latency:      p50 {latency['p50']}s  p90 {latency['p90']}s  max {latency['max']}s "
+              f"(monitor's own estimate p50 {s['measuredLatency']['p50']}s)")
+        print(f"   False alarms: {s['falseLiftAlarms']} lift ({s['falseLiftAlarmsPerHour']}/h)")
+        print(f"   Wi-Fi:        {s['wifiAlarms']} alarm(s) over {s['outages']} dropout(s), "
+              f"{s['longOutages']} longer than 30s")
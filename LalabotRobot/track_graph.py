@@ -0,0 +1,195 @@
+# track_graph.py - Track topology: markers/junctions as nodes, directed edges
+#
+# track_graph.json (optional - without it the track is the single loop
+# 0 → 1 → ... → ROOM_COUNT → 0):
+# {
+#   "version": 1,
+#   "nodes": [{"id": 0, "kind": "base"}, {"id": 1, "kind": "room"},
+#             {"id": 2, "kind": "junction"}, {"id": 3, "kind": "room"}, ...],
+#   "edges": [{"from": 1, "to": 2, "cost": 8.5},
+#             {"from": 2, "to": 3, "turn": "left", "turns": {"5": "right"}},
+#             {"from": 3, "to": 2, "turn": "uturn"}, ...]
+# }
+# `turn` is the command used when leaving the edge's start node (straight,
+# left, right or uturn); `turns` overrides it by the node the robot came from.
+import heapq
+import json
+import os
+from config import ROOM_COUNT, SEGMENT_TRAVEL_TIME, TRACK_GRAPH_FILE, TRACK_GRAPH_VERSION
+
+TURNS = ('straight', 'left', 'right', 'uturn')
+STOP_KINDS = ('base', 'room')  # Junctions are pass-through only
+
+
+class TrackGraph:
+    """Directed track graph with precomputed all-pairs shortest paths.
+
+    Paths minimize travel time (edge cost in seconds); hops counts the
+    markers passed along that path, which is what the planner minimizes as
+    "segments" and what the line follower counts.
+    """
+
+    def __init__(self, nodes, edges):
+        self.nodes = dict(nodes)  # id: kind
+        self.edges = {}           # (from, to): {'cost': s, 'turn': str, 'turns': {prev: str}}
+        self.out = {node: [] for node in self.nodes}
+        for (a, b), edge in edges.items():
+            if edge.get('turn', 'straight') not in TURNS:
+                raise ValueError(f"Unknown turn {edge['turn']!r} on edge {a}→{b}")
+            self.edges[(a, b)] = {'cost': edge.get('cost', SEGMENT_TRAVEL_TIME),
+                                  'turn': edge.get('turn', 'straight'),
+                                  'turns': dict(edge.get('turns', {}))}
+            self.out[a].append(b)
+        self.node_count = len(self.nodes)
+        self.is_ring = self._is_ring()
+        self._solve()
+
+    # ---------- construction ----------
+
+    @classmethod
+    def ring(cls, node_count, segment_time=SEGMENT_TRAVEL_TIME):
+        """The single clockwise loop 0 → 1 → ... → node_count - 1 → 0"""
+        nodes = {node: 'base' if node == 0 else 'room' for node in range(node_count)}
+        edges = {}
+        for node in range(node_count):
+            following = (node + 1) % node_count
+            cost = segment_time(node, following) if callable(segment_time) else segment_time
+            edges[(node, following)] = {'cost': cost}
+        return cls(nodes, edges)
+
+    @classmethod
+    def load(cls, path=TRACK_GRAPH_FILE):
+        """Load track_graph.json, or None if there is no usable graph file"""
+        if not os.path.isabs(path):
+            path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"⚠ Could not read track graph ({e}) - assuming a single loop")
+            return None
+        if data.get('version') != TRACK_GRAPH_VERSION:
+            print(f"⚠ Track graph version {data.get('version')} not supported - assuming a single loop")
+            return None
+
+        nodes = {n['id']: n.get('kind', 'room') for n in data.get('nodes', [])}
+        edges = {}
+        for e in data.get('edges', []):
+            edges[(e['from'], e['to'])] = {
+                'cost': e.get('cost', SEGMENT_TRAVEL_TIME),
+                'turn': e.get('turn', 'straight'),
+                'turns': {int(prev): turn for prev, turn in e.get('turns', {}).items()}
+            }
+        try:
+            return cls(nodes, edges)
+        except (KeyError, ValueError) as e:
+            print(f"⚠ Invalid track graph ({e}) - assuming a single loop")
+            return None
+
+    @classmethod
+    def for_track(cls, track_map=None):
+        """Graph file if present, else the loop from the track map / config"""
+        graph = cls.load()
+        if graph is None:
+            if track_map is not None:
+                graph = cls.ring(track_map.node_count,
+                                 lambda a, b: track_map.segment_time(a, b) or SEGMENT_TRAVEL_TIME)
+            else:
+                graph = cls.ring(ROOM_COUNT + 1)
+        elif track_map is not None:
+            graph.update_costs(track_map.segment_time)
+        return graph
+
+    def update_costs(self, segment_time):
+        """Replace edge costs with measured times (segment_time(a, b) → seconds
+        or None to keep the current cost) and re-solve shortest paths"""
+        for (a, b), edge in self.edges.items():
+            seconds = segment_time(a, b)
+            if seconds is not None:
+                edge['cost'] = seconds
+        self._solve()
+
+    def _is_ring(self):
+        ids = sorted(self.nodes)
+        return (ids == list(range(len(ids)))
+                and set(self.edges) == {(n, (n + 1) % len(ids)) for n in ids})
+
+    # ---------- all-pairs shortest paths ----------
+
+    def _solve(self):
+        """Dijkstra from every node: travel time, hop count and first hop"""
+        self.time = {}
+        self.hop_count = {}
+        self.first_hop = {}
+        for source in self.nodes:
+            times = {source: 0.0}
+            hops = {source: 0}
+            first = {}
+            queue = [(0.0, 0, source)]
+            while queue:
+                seconds, count, node = heapq.heappop(queue)
+                if seconds > times[node] or (seconds == times[node] and count > hops[node]):
+                    continue
+                for following in self.out[node]:
+                    candidate = (seconds + self.edges[(node, following)]['cost'], count + 1)
+                    if following not in times or candidate < (times[following], hops[following]):
+                        times[following], hops[following] = candidate
+                        first[following] = following if node == source else first[node]
+                        heapq.heappush(queue, (candidate[0], candidate[1], following))
+            self.time[source] = times
+            self.hop_count[source] = hops
+            self.first_hop[source] = first
+
+            # Every stop must be reachable from everywhere or the robot gets stuck
+            unreachable = set(self.nodes) - set(times)
+            if unreachable:
+                raise ValueError(f"nodes {sorted(unreachable)} unreachable from {source}")
+
+    # ---------- queries ----------
+
+    def reachable(self, start, target):
+        return target in self.time.get(start, {})
+
+    def hops(self, start, target):
+        """Markers passed on the fastest path (0 if already there)"""
+        return self.hop_count[start][target]
+
+    def travel_time(self, start, target):
+        return self.time[start][target]
+
+    def edge_cost(self, start, following):
+        edge = self.edges.get((start, following))
+        return edge['cost'] if edge else None
+
+    def next_node(self, start, target):
+        """First marker on the way from start to target"""
+        return self.first_hop[start][target]
+
+    def path(self, start, target):
+        """Nodes from start to target, both included"""
+        nodes = [start]
+        while nodes[-1] != target:
+            nodes.append(self.next_node(nodes[-1], target))
+        return nodes
+
+    def _cycle(self, node):
+        """Fastest way to leave a node and come back to it (a full lap on the loop)"""
+        return min((self.edges[(node, following)]['cost'] + self.travel_time(following, node),
+                    1 + self.hops(following, node)) for following in self.out[node])
+
+    def cycle_hops(self, node):
+        return self._cycle(node)[1]
+
+    def cycle_time(self, node):
+        return self._cycle(node)[0]
+
+    def turn(self, start, following, previous=None):
+        """Turn command for leaving `start` towards `following`"""
+        edge = self.edges[(start, following)]
+        return edge['turns'].get(previous, edge['turn'])
+
+    def stop_nodes(self):
+        """Nodes the robot may stop at (base and rooms, not junctions)"""
+        return sorted(node for node, kind in self.nodes.items() if kind in STOP_KINDS)
@@ -0,0 +1,273 @@
+# track_map.py - Track survey / calibration and the persistent track map
+#
+# Survey (robot at base, on the line, facing clockwise):
+#   python track_map.py                 # TRACK_SURVEY_LAPS laps of ROOM_COUNT + 1 markers
+#   python track_map.py --laps 3 --nodes 6
+import json
+import os
+import statistics
+import time
+from config import (ROOM_COUNT, SEGMENT_TRAVEL_TIME, TRACK_MAP_FILE, TRACK_MAP_VERSION,
+                    TRACK_SURVEY_LAPS, MARKER_PASS_TIME, MARKER_PASS_MARGIN,
+                    MARKER_SETTLE_TIME, SENSOR_NOISE_LIMIT)
+
+SENSOR_NAMES = ('left', 'center', 'right')
+
+
+def _resolve(path):
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    return path
+
+
+class TrackMap:
+    """Surveyed track: node count, per-segment drive times, per-marker
+    widths and sensor noise. Stored as JSON with a schema version and a
+    revision that increases with every survey."""
+
+    def __init__(self, node_count, segments=None, markers=None, sensor_noise=None,
+                 revision=1, surveyed_at=None, laps=0):
+        self.node_count = node_count
+        self.segments = segments or {}    # (from, to): {'seconds': s, 'samples': [...]}
+        self.markers = markers or {}      # node: {'width': s, 'passTime': s}
+        self.sensor_noise = sensor_noise or {name: 0.0 for name in SENSOR_NAMES}
+        self.revision = revision
+        self.surveyed_at = surveyed_at
+        self.laps = laps
+
+    # ---------- persistence ----------
+
+    @classmethod
+    def load(cls, path=TRACK_MAP_FILE):
+        """Load the track map, or None if there is no usable map"""
+        path = _resolve(path)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"⚠ Could not read track map ({e}) - using config.py")
+            return None
+
+        if data.get('version') != TRACK_MAP_VERSION:
+            print(f"⚠ Track map version {data.get('version')} not supported - using config.py")
+            return None
+
+        return cls(
+            node_count=data['nodeCount'],
+            segments={(s['from'], s['to']): {'seconds': s['seconds'], 'samples': s.get('samples', [])}
+                      for s in data.get('segments', [])},
+            markers={m['node']: {'width': m['width'], 'passTime': m['passTime']}
+                     for m in data.get('markers', [])},
+            sensor_noise=data.get('sensorNoise'),
+            revision=data.get('revision', 1),
+            surveyed_at=data.get('surveyedAt'),
+            laps=data.get('laps', 0)
+        )
+
+    def save(self, path=TRACK_MAP_FILE):
+        """Atomically write the map (write-to-temp + os.replace)"""
+        path = _resolve(path)
+        data = {
+            'version': TRACK_MAP_VERSION,
+            'revision': self.revision,
+            'surveyedAt': self.surveyed_at,
+            'laps': self.laps,
+            'nodeCount': self.node_count,
+            'segments': [{'from': a, 'to': b, 'seconds': round(s['seconds'], 3),
+                          'samples': [round(x, 3) for x in s['samples']]}
+                         for (a, b), s in sorted(self.segments.items())],
+            'markers': [{'node': node, 'width': round(m['width'], 3),
+                         'passTime': round(m['passTime'], 3)}
+                        for node, m in sorted(self.markers.items())],
+            'sensorNoise': {name: round(rate, 4) for name, rate in self.sensor_noise.items()},
+            'markerConfirmTicks': self.marker_confirm_ticks()
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+
+    # ---------- lookups ----------
+
+    @property
+    def room_count(self):
+        return self.node_count - 1
+
+    def marker_pass_time(self, node):
+        """Seconds to drive forward after detecting a marker to clear it"""
+        marker = self.markers.get(node)
+        return marker['passTime'] if marker else MARKER_PASS_TIME
+
+    def marker_confirm_ticks(self):
+        """Consecutive all-white readings needed to accept a marker - noisy
+        sensors need two so a single glitch isn't counted as a room"""
+        return 2 if max(self.sensor_noise.values(), default=0.0) > SENSOR_NOISE_LIMIT else 1
+
+    def segment_time(self, start, end):
+        """Drive time for one segment, including the stop-and-pass at the
+        marker that ends it (None if the segment wasn't surveyed)"""
+        segment = self.segments.get((start, end))
+        if segment is None:
+            return None
+        return segment['seconds'] + self.marker_pass_time(end) + MARKER_SETTLE_TIME
+
+    def mean_segment_time(self):
+        times = [self.segment_time(a, b) for a, b in self.segments]
+        return statistics.mean(times) if times else SEGMENT_TRAVEL_TIME
+
+
+class TrackSurvey:
+    """Drive full laps with the line follower and build a TrackMap.
+
+    Markers are crossed without stopping so their width (time spent on
+    white at driving speed) can be measured. Segment times run from leaving
+    one marker to reaching the next, with obstacle waits left out.
+    """
+
+    def __init__(self, line_follower, tick=0.05, max_marker_time=3.0):
+        self.line_follower = line_follower
+        self.motors = line_follower.motors
+        self.obstacle_detector = line_follower.obstacle_detector
+        self.tick = tick
+        self.max_marker_time = max_marker_time
+
+    def run(self, laps=TRACK_SURVEY_LAPS, node_count=ROOM_COUNT + 1):
+        print(f"\n📐 Surveying {laps} lap(s) of {node_count} markers - robot must start at base")
+        samples = {}  # (from, to): [seconds, ...]
+        widths = {}   # node: [seconds, ...]
+        readings = []  # Off-marker sensor readings, for noise estimation
+
+        # Parked on the base marker - drive off it before counting
+        started = time.monotonic()
+        while sum(self.line_follower.read_sensors()) == 3:
+            if time.monotonic() - started > self.max_marker_time:
+                self.motors.stop()
+                raise RuntimeError("Robot is not on the line")
+            self.motors.forward()
+            time.sleep(self.tick)
+
+        location = 0
+        markers_left = laps * node_count
+        on_marker = False
+        segment_start = time.monotonic()
+        marker_start = None
+        paused = 0.0
+
+        try:
+            while markers_left:
+                if not self.obstacle_detector.is_path_clear():
+                    self.motors.stop()
+                    print(f"  ⚠ Obstacle at {self.obstacle_detector.get_distance()}cm - waiting")
+                    wait_start = time.monotonic()
+                    time.sleep(1)
+                    paused += time.monotonic() - wait_start
+                    continue
+
+                reading = self.line_follower.read_sensors()
+                all_white = sum(reading) == 3
+                now = time.monotonic()
+
+                if on_marker:
+                    if not all_white:
+                        # Left the marker - record its width, start next segment
+                        widths.setdefault(location, []).append(now - marker_start)
+                        on_marker = False
+                        segment_start = now
+                        paused = 0.0
+                        markers_left -= 1
+                    elif now - marker_start > self.max_marker_time:
+                        raise RuntimeError(f"Lost the line at Room {location}")
+                    else:
+                        self.motors.forward()  # Cross at driving speed
+                elif all_white:
+                    following = (location + 1) % node_count
+                    seconds = now - segment_start - paused
+                    samples.setdefault((location, following), []).append(seconds)
+                    location = following
+                    on_marker = True
+                    marker_start = now
+                    print(f"  🏁 Room {location}: segment {seconds:.2f}s")
+                    self.motors.forward()
+                else:
+                    readings.append(reading)
+                    self.line_follower.follow_line()
+
+                time.sleep(self.tick)
+        finally:
+            self.motors.stop()
+
+        return self.build_map(node_count, laps, samples, widths, readings)
+
+    def build_map(self, node_count, laps, samples, widths, readings):
+        segments = {
+            key: {'seconds': statistics.median(values), 'samples': values}
+            for key, values in samples.items()
+        }
+        markers = {}
+        for node, values in widths.items():
+            width = statistics.median(values)
+            markers[node] = {'width': width, 'passTime': width * MARKER_PASS_MARGIN}
+
+        # Single-tick spikes (a reading that differs from both neighbours)
+        noise = {}
+        for i, name in enumerate(SENSOR_NAMES):
+            spikes = sum(
+                1 for before, current, after in zip(readings, readings[1:], readings[2:])
+                if before[i] == after[i] != current[i]
+            )
+            noise[name] = spikes / max(1, len(readings) - 2)
+
+        previous = TrackMap.load()
+        track_map = TrackMap(node_count, segments, markers, noise,
+                             revision=previous.revision + 1 if previous else 1,
+                             surveyed_at=time.strftime('%Y-%m-%dT%H:%M:%S'), laps=laps)
+
+        # Laps that disagree usually mean a missed or extra marker
+        for (a, b), segment in sorted(segments.items()):
+            spread = max(segment['samples']) - min(segment['samples'])
+            if segment['seconds'] > 0 and spread / segment['seconds'] > 0.3:
+                print(f"  ⚠ Segment {a}→{b} varies {spread:.2f}s between laps - check markers / --nodes")
+        return track_map
+
+
+def print_map(track_map):
+    print(f"\n🗺️ Track map rev {track_map.revision}: {track_map.node_count} nodes "
+          f"(base + {track_map.room_count} rooms)")
+    for (a, b), segment in sorted(track_map.segments.items()):
+        print(f"  Segment {a}→{b}: {segment['seconds']:.2f}s")
+    for node, marker in sorted(track_map.markers.items()):
+        print(f"  Marker {node}: width {marker['width']:.2f}s, pass {marker['passTime']:.2f}s")
+    noise = ', '.join(f"{name} {rate:.1%}" for name, rate in track_map.sensor_noise.items())
+    print(f"  Sensor noise: {noise} → confirm markers over {track_map.marker_confirm_ticks()} tick(s)")
+
+
+if __name__ == "__main__":
+    import argparse
+    from motor_controller import MotorController
+    from obstacle_detector import ObstacleDetector
+    from line_follower import LineFollower
+
+    parser = argparse.ArgumentParser(description="Survey the track and write the track map")
+    parser.add_argument('--laps', type=int, default=TRACK_SURVEY_LAPS)
+    parser.add_argument('--nodes', type=int, default=ROOM_COUNT + 1,
+                        help="Markers per lap, base included")
+    args = parser.parse_args()
+
+    motors = MotorController()
+    obstacle_detector = ObstacleDetector()
+    line_follower = LineFollower(motors, obstacle_detector)
+    try:
+        track_map = TrackSurvey(line_follower).run(args.laps, args.nodes)
+        track_map.save()
+        print_map(track_map)
+        print(f"\n✓ Track map saved to {_resolve(TRACK_MAP_FILE)}")
+    except KeyboardInterrupt:
+        print("\n⚠️ Survey interrupted - track map not changed")
+    except Exception as e:
+        print(f"\n❌ Survey failed: {e}")
+    finally:
+        line_follower.cleanup()
+        obstacle_detector.cleanup()
+        motors.cleanup()
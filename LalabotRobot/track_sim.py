@@ -0,0 +1,518 @@
+"""
+Track Simulator - Drive the real line-following code over a 2D track model
+
+MotorController, LineFollower and ObstacleDetector run unchanged on the fake
+GPIO backend (fake_lgpio.py) and a virtual clock. Motor pin writes move a
+differential-drive robot along a line on the floor; the IR and ultrasonic
+pins report what its sensors would see, with noise. Measures lap time,
+line losses and missed / false markers at different motor speeds.
+
+    python track_sim.py                                  # default oval, MOTOR_SPEED
+    python track_sim.py --speeds 0.5 0.7 0.9 --laps 5 --seed 2
+    python track_sim.py --track my_track.json --obstacles 4 --json
+
+Track file (lengths in cm, arcs turn left for a positive angle):
+{
+  "segments": [{"straight": 300}, {"arc": 40, "angle": 180},
+               {"straight": 300}, {"arc": 40, "angle": 180}],
+  "markers": [40, 103, 167, 466, 561],
+  "lineWidth": 1.9, "markerLength": 4,
+  "obstacles": [{"s": 200, "start": 20, "stop": 25}, {"s": 0, "speed": 15}]
+}
+"""
+
+import os
+os.environ['LALABOT_FAKE_GPIO'] = '1'  # Before any hardware module picks its lgpio
+
+import bisect
+import contextlib
+import json
+import math
+import random
+import time
+
+import gpio_backend
+import fake_lgpio
+import robot_clock
+from robot_clock import VirtualClock
+from track_graph import TrackGraph
+from simulator import percentile
+from config import (ROOM_COUNT, MOTOR_SPEED, SENSOR_NOISE_LIMIT, MARKER_PASS_MARGIN, IR_LEFT, IR_CENTER, IR_RIGHT, TRIG, ECHO,
+                    PWMA, AIN1, AIN2, PWMB, BIN1, BIN2, STBY)
+
+MOTOR_PINS = (PWMA, AIN1, AIN2, PWMB, BIN1, BIN2, STBY)
+
+
+# ---------- track ----------
+
+class Obstacle:
+    """Something in the corridor at arc length `s` (cm), moving along the
+    track at `speed` cm/s while start <= t < stop (seconds of run time)"""
+
+    def __init__(self, s, speed=0.0, start=0.0, stop=None):
+        self.s = s
+        self.speed = speed
+        self.start = start
+        self.stop = stop
+
+    def position(self, t, length):
+        if t < self.start or (self.stop is not None and t >= self.stop):
+            return None
+        return (self.s + self.speed * (t - self.start)) % length
+
+
+class Track:
+    """Closed black line sampled every `step` cm, with white marker gaps.
+
+    segments: [{'straight': cm} or {'arc': radius cm, 'angle': degrees}]
+    markers: arc length (cm) where each node's gap starts, indexed by node
+    id (default: node_count markers evenly spaced, node 0 at the start)
+    """
+
+    def __init__(self, segments, markers=None, node_count=ROOM_COUNT + 1,
+                 line_width=1.9, marker_length=4.0, obstacles=(), step=0.5):
+        self.points = []  # (x, y, heading) at the start of each sample
+        self.s = []       # Arc length of each sample
+        x = y = heading = 0.0
+        length = 0.0
+        for segment in segments:
+            if 'straight' in segment:
+                span, turn = segment['straight'], 0.0
+            else:
+                turn = math.radians(segment['angle'])
+                span = abs(turn) * segment['arc']
+            count = max(1, round(span / step))
+            for _ in range(count):
+                self.points.append((x, y, heading))
+                self.s.append(length)
+                mid = heading + turn / count / 2
+                x += span / count * math.cos(mid)
+                y += span / count * math.sin(mid)
+                heading += turn / count
+                length += span / count
+        if math.hypot(x, y) > 2 * step:
+            raise ValueError(f"track does not close ({math.hypot(x, y):.1f} cm gap)")
+
+        self.length = length
+        self.line_width = line_width
+        self.marker_length = marker_length
+        if markers is None:
+            markers = [node * length / node_count for node in range(node_count)]
+        self.markers = list(markers)
+        self.node_count = len(self.markers)
+        self.obstacles = list(obstacles)
+
+    @classmethod
+    def oval(cls, straight=300.0, radius=40.0, node_count=ROOM_COUNT + 1, **kwargs):
+        """Two straights joined by half circles (anticlockwise). Markers are
+        spread over the straights, clear of the curves: the robot settles on
+        the line after a curve and drives past each marker blind."""
+        segments = [{'straight': straight}, {'arc': radius, 'angle': 180},
+                    {'straight': straight}, {'arc': radius, 'angle': 180}]
+        first = (node_count + 1) // 2
+        markers = []
+        for side, count in ((0, first), (1, node_count - first)):
+            offset = side * (straight + math.pi * radius)
+            spacing = (straight - 110.0) / max(1, count)
+            markers += [offset + 40.0 + i * spacing for i in range(count)]
+        return cls(segments, markers=kwargs.pop('markers', markers), **kwargs)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data['segments'], markers=data.get('markers'),
+                   line_width=data.get('lineWidth', 1.9),
+                   marker_length=data.get('markerLength', 4.0),
+                   obstacles=[Obstacle(o['s'], o.get('speed', 0.0), o.get('start', 0.0), o.get('stop'))
+                              for o in data.get('obstacles', [])])
+
+    def locate(self, x, y, hint=None, window=24):
+        """Nearest sample to (x, y): (index, arc length, signed offset cm,
+        positive = left of the line). Searches around `hint` if given."""
+        count = len(self.points)
+        candidates = range(count) if hint is None else (
+            (hint + i) % count for i in range(-window, window + 1))
+        best = None
+        for index in candidates:
+            px, py, heading = self.points[index]
+            distance = (x - px) ** 2 + (y - py) ** 2
+            if best is None or distance < best[0]:
+                best = (distance, index)
+        index = best[1]
+        px, py, heading = self.points[index]
+        along = math.cos(heading) * (x - px) + math.sin(heading) * (y - py)
+        offset = math.cos(heading) * (y - py) - math.sin(heading) * (x - px)
+        return index, (self.s[index] + along) % self.length, offset
+
+    def in_marker(self, s):
+        return any((s - marker) % self.length < self.marker_length for marker in self.markers)
+
+    def is_black(self, s, offset):
+        return abs(offset) < self.line_width / 2 and not self.in_marker(s)
+
+
+# ---------- robot model ----------
+
+class TrackReport:
+    """Lap times, line losses and marker detection quality of one run.
+
+    A lap is a full track length of line actually driven, not a round of
+    navigate_to_room calls - false markers end legs early and would make a
+    bad run look fast. Only clean laps (every marker detected once, nothing
+    else) count for the lap time.
+    """
+
+    def __init__(self, motor_speed, laps, simulation, wall_time):
+        self.motor_speed = motor_speed
+        self.laps = laps
+        self.laps_driven = len(simulation.lap_ends)
+        self.lap_times = []
+        previous_time, previous_errors = 0.0, 0
+        for end, errors in simulation.lap_ends:
+            if errors == previous_errors:
+                self.lap_times.append(end - previous_time)
+            previous_time, previous_errors = end, errors
+        self.line_losses = simulation.line_losses
+        self.lost_time = simulation.lost_time
+        self.crossings = simulation.crossings
+        self.misses = simulation.misses
+        self.detections = simulation.detections
+        self.false_markers = simulation.false_markers
+        self.collisions = simulation.collisions
+        self.distance = simulation.distance
+        self.driving_time = simulation.t
+        self.aborted = simulation.aborted
+        self.wall_time = wall_time
+
+    def summary(self):
+        completed = len(self.lap_times)
+        return {
+            'motorSpeed': self.motor_speed,
+            'laps': self.laps,
+            'lapsDriven': self.laps_driven,
+            'lapsCompleted': completed,
+            'lapTime': {'mean': round(sum(self.lap_times) / completed, 2) if completed else None,
+                        **{f"p{p}": None if percentile(self.lap_times, p) is None
+                           else round(percentile(self.lap_times, p), 2) for p in (50, 90)}},
+            'lineLosses': self.line_losses,
+            'lineLossesPerLap': round(self.line_losses / max(1, self.laps_driven), 2),
+            'lineLostFraction': round(self.lost_time / self.driving_time, 4) if self.driving_time else 0.0,
+            'markersCrossed': self.crossings,
+            'markerMissRate': round(self.misses / self.crossings, 4) if self.crossings else 0.0,
+            'falseMarkerRate': round(self.false_markers / self.detections, 4) if self.detections else 0.0,
+            'collisions': self.collisions,
+            'distanceMeters': round(self.distance / 100, 2),
+            'simulatedSeconds': round(self.driving_time, 1),
+            'aborted': self.aborted,
+            'wallSeconds': round(self.wall_time, 2)
+        }
+
+
+class TrackSimulation:
+    """The real control code driving a kinematic robot around a Track.
+
+    Motor pins set each wheel's target speed (direction pins x PWM duty x
+    motor_speed x max_wheel_speed); wheels follow with a first-order lag of
+    motor_lag seconds, and tyre scrub makes pivot turns slower than ideal
+    differential drive (turn_grip scales the turn rate). The pose is
+    integrated in step_time slices whenever the robot writes a motor pin or
+    reads a sensor.
+
+    The sensor bar sits sensor_offset cm ahead of the axle, outer sensors
+    sensor_spacing cm to each side. IR noise is edge jitter - the line edge
+    each read sees is off by a normal error of ir_noise cm - plus spikes:
+    a flipped read with probability ir_spikes. Markers need as many
+    consecutive white readings as a survey would choose for that spike
+    rate (TrackMap.marker_confirm_ticks). After a marker the robot drives
+    blind for pass_time seconds - by default what a survey would measure
+    (time on white x MARKER_PASS_MARGIN). The unsurveyed MARKER_PASS_TIME
+    (1.5 s) is 30-40 cm of blind driving: the bang-bang follower's heading
+    error carries it off the line, and the all-white reading that follows
+    counts as another marker.
+
+    The ultrasonic echo is a pulse on the virtual clock; every GPIO read
+    takes read_time, so ObstacleDetector's busy-wait measures it (and the
+    control loop pays for it) like on the Pi. With nothing in the corridor
+    the sonar sees whatever is open_distance cm ahead (a wall, a door).
+    """
+
+    def __init__(self, track, motor_speed=MOTOR_SPEED, laps=3, seed=0,
+                 ir_noise=0.05, ir_spikes=0.0, echo_noise=1.0,
+                 max_wheel_speed=40.0, wheel_base=12.0, turn_grip=0.25, motor_lag=0.08,
+                 sensor_offset=6.0, sensor_spacing=1.2, open_distance=250.0, pass_time=None,
+                 read_time=0.00002, leg_timeout=60.0, derail_distance=15.0, step_time=0.002):
+        self.track = track
+        self.motor_speed = motor_speed
+        self.laps = laps
+        self.rng = random.Random(seed)
+        self.ir_noise = ir_noise
+        self.ir_spikes = ir_spikes
+        self.echo_noise = echo_noise
+        self.max_wheel_speed = max_wheel_speed
+        self.wheel_base = wheel_base
+        self.turn_grip = turn_grip
+        self.motor_lag = motor_lag
+        self.sensor_offset = sensor_offset
+        self.sensor_spacing = sensor_spacing
+        self.open_distance = open_distance
+        if pass_time is None:
+            pass_time = track.marker_length / (max_wheel_speed * motor_speed) * MARKER_PASS_MARGIN
+        self.pass_time = pass_time
+        self.read_time = read_time
+        self.leg_timeout = leg_timeout
+        self.derail_distance = derail_distance
+        self.step_time = step_time
+        self.clock = VirtualClock(0.0)
+
+        # Pose: start on the line just past the base marker
+        start = track.markers[0] + track.marker_length + 1.0
+        index = bisect.bisect(track.s, start) - 1
+        x, y, self.heading = track.points[index]
+        self.x = x - sensor_offset * math.cos(self.heading)
+        self.y = y - sensor_offset * math.sin(self.heading)
+        self.left_speed = self.right_speed = 0.0
+        self.target = (0.0, 0.0)
+        self.t = 0.0
+        self.hint = index
+        self.bar_s = track.s[index]
+        self.progress = 0.0    # Net arc length driven along the line (cm)
+        self.lap_ends = []     # (time, marker errors so far) each time progress passes a track length
+        self.lost = False
+        self.pending = False   # Crossed a marker the robot hasn't reported yet
+        self.colliding = set()
+        self.deadline = None
+
+        self.line_losses = 0
+        self.lost_time = 0.0
+        self.crossings = 0
+        self.misses = 0
+        self.detections = 0
+        self.false_markers = 0
+        self.collisions = 0
+        self.distance = 0.0
+        self.aborted = None
+
+    # ---------- kinematics ----------
+
+    def wheel_targets(self):
+        """Target wheel speeds (cm/s) from the motor driver pins"""
+        if not fake_lgpio.level(STBY):
+            return 0.0, 0.0
+
+        def duty(pin):
+            pwm = fake_lgpio.pwm(pin)
+            if pwm and 'dutyCycle' in pwm:
+                return pwm['dutyCycle'] / 100
+            return fake_lgpio.level(pin)
+
+        # Motor A (left) is wired reversed - forward is 0,1
+        left = {(0, 1): 1, (1, 0): -1}.get((fake_lgpio.level(AIN1), fake_lgpio.level(AIN2)), 0)
+        right = {(1, 0): 1, (0, 1): -1}.get((fake_lgpio.level(BIN1), fake_lgpio.level(BIN2)), 0)
+        top = self.max_wheel_speed * self.motor_speed
+        return left * duty(PWMA) * top, right * duty(PWMB) * top
+
+    def update(self, now):
+        """Integrate the pose up to `now`"""
+        while self.t < now:
+            dt = min(self.step_time, now - self.t)
+            k = 1 - math.exp(-dt / self.motor_lag)
+            self.left_speed += (self.target[0] - self.left_speed) * k
+            self.right_speed += (self.target[1] - self.right_speed) * k
+            speed = (self.left_speed + self.right_speed) / 2
+            self.heading += (self.right_speed - self.left_speed) / self.wheel_base * self.turn_grip * dt
+            self.x += speed * math.cos(self.heading) * dt
+            self.y += speed * math.sin(self.heading) * dt
+            self.distance += abs(speed) * dt
+            self.t += dt
+            self.observe(dt)
+
+    def sensor_point(self, side):
+        """Floor position of an IR sensor (side: +1 left, 0 center, -1 right)"""
+        cos, sin = math.cos(self.heading), math.sin(self.heading)
+        along = self.sensor_offset
+        across = side * self.sensor_spacing
+        return self.x + along * cos - across * sin, self.y + along * sin + across * cos
+
+    def sees_black(self, side, jitter=0.0):
+        index, s, offset = self.track.locate(*self.sensor_point(side), hint=self.hint)
+        return self.track.is_black(s, offset + jitter)
+
+    def observe(self, dt):
+        """Bookkeeping after each slice: marker crossings, line loss, derailing"""
+        track = self.track
+        self.hint, s, offset = track.locate(*self.sensor_point(0), hint=self.hint)
+        moved = (s - self.bar_s + track.length / 2) % track.length - track.length / 2
+        self.progress += moved
+        if self.progress >= (len(self.lap_ends) + 1) * track.length:
+            self.lap_ends.append((self.t, self.misses + self.false_markers))
+        if moved > 0:
+            for marker in track.markers:
+                if (marker - self.bar_s) % track.length < moved:
+                    self.crossings += 1
+                    if self.pending:
+                        self.misses += 1
+                    self.pending = True
+        self.bar_s = s
+
+        lost = not track.in_marker(s) and not any(self.sees_black(side) for side in (1, 0, -1))
+        if lost:
+            self.lost_time += dt
+            if not self.lost:
+                self.line_losses += 1
+        self.lost = lost
+
+        if abs(offset) > self.derail_distance and self.aborted is None:
+            self.aborted = 'derailed'
+
+        for obstacle in track.obstacles:
+            position = obstacle.position(self.t, track.length)
+            touching = position is not None and (position - s) % track.length < 1.0
+            if touching and obstacle not in self.colliding:
+                self.collisions += 1
+                self.colliding.add(obstacle)
+            elif not touching:
+                self.colliding.discard(obstacle)
+
+    # ---------- fake GPIO hooks ----------
+
+    def on_write(self, gpio, level):
+        if gpio in MOTOR_PINS:
+            self.update(robot_clock.time())
+            self.target = self.wheel_targets()
+
+    def ir_reader(self, side):
+        def read():
+            self.update(robot_clock.time())
+            black = self.sees_black(side, self.rng.gauss(0.0, self.ir_noise))
+            if self.rng.random() < self.ir_spikes:
+                black = not black
+            return 0 if black else 1
+        return read
+
+    def sonar_distance(self):
+        self.update(robot_clock.time())
+        gaps = [(position - self.bar_s) % self.track.length
+                for position in (o.position(self.t, self.track.length) for o in self.track.obstacles)
+                if position is not None]
+        distance = min(gaps) if gaps and min(gaps) < self.open_distance else self.open_distance
+        return max(2.0, distance + self.rng.gauss(0.0, self.echo_noise))
+
+    def on_marker(self, location):
+        self.detections += 1
+        if self.pending:
+            self.pending = False
+        else:
+            self.false_markers += 1
+
+    def should_abort(self):
+        if self.aborted is None and robot_clock.time() > self.deadline:
+            self.aborted = 'timeout'
+        return self.aborted is not None
+
+    # ---------- run ----------
+
+    def run(self, verbose=False):
+        """Drive `laps` laps (base → every room → base); returns a TrackReport"""
+        from motor_controller import MotorController
+        from obstacle_detector import ObstacleDetector
+        from line_follower import LineFollower
+
+        if not gpio_backend.FAKE_GPIO:
+            raise RuntimeError("track_sim needs the fake GPIO backend (LALABOT_FAKE_GPIO=1)")
+
+        started = time.perf_counter()
+        previous_clock = robot_clock.install(self.clock)
+        fake_lgpio.reset()
+        fake_lgpio.set_reader(IR_LEFT, self.ir_reader(1))
+        fake_lgpio.set_reader(IR_CENTER, self.ir_reader(0))
+        fake_lgpio.set_reader(IR_RIGHT, self.ir_reader(-1))
+        fake_lgpio.set_echo(TRIG, ECHO, self.sonar_distance)
+        fake_lgpio.on_write(self.on_write)
+        fake_lgpio.set_read_time(self.read_time)
+        output = open(os.devnull, 'w') if not verbose else None
+        try:
+            with contextlib.redirect_stdout(output) if output else contextlib.nullcontext():
+                motors = MotorController()
+                follower = LineFollower(motors, ObstacleDetector(),
+                                        graph=TrackGraph.ring(self.track.node_count))
+                follower.track_map = None  # The sim track, not the robot's survey
+                follower.marker_confirm_ticks = 2 if self.ir_spikes > SENSOR_NOISE_LIMIT else 1
+                follower.marker_pass_time = lambda node: self.pass_time
+                follower.on_marker = self.on_marker
+                follower.should_abort = self.should_abort
+
+                for lap in range(self.laps):
+                    for room in list(range(1, self.track.node_count)) + [0]:
+                        self.deadline = self.clock.time() + self.leg_timeout
+                        follower.navigate_to_room(room, None, None)
+                        if self.aborted:
+                            break
+                    if self.aborted:
+                        break
+                motors.stop()
+        finally:
+            robot_clock.install(previous_clock)
+            fake_lgpio.reset()
+            if output:
+                output.close()
+
+        return TrackReport(self.motor_speed, self.laps, self, time.perf_counter() - started)
+
+
+def random_obstacles(track, count, duration, seed=0):
+    """People stepping into the corridor: count static obstacles at random
+    places, each present for 2-6 s at a random time within `duration`"""
+    rng = random.Random(seed)
+    obstacles = []
+    for _ in range(count):
+        start = rng.uniform(0, duration)
+        obstacles.append(Obstacle(rng.uniform(0, track.length), start=start,
+                                  stop=start + rng.uniform(2, 6)))
+    return obstacles
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the line follower on a simulated track")
+    parser.add_argument('--track', help="Track JSON file (default: an oval with ROOM_COUNT + 1 markers)")
+    parser.add_argument('--speeds', type=float, nargs='+', default=[MOTOR_SPEED],
+                        help="Motor speeds (fraction of full PWM) to compare")
+    parser.add_argument('--laps', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--noise', type=float, default=0.05, help="IR edge jitter (cm)")
+    parser.add_argument('--spikes', type=float, default=0.0, help="IR flip probability per read")
+    parser.add_argument('--pass-time', type=float,
+                        help="Seconds driven blind past a marker (default: as surveyed)")
+    parser.add_argument('--obstacles', type=int, default=0,
+                        help="Random obstacles stepping into the corridor")
+    parser.add_argument('--verbose', action='store_true', help="Show the robot's own output")
+    parser.add_argument('--json', action='store_true', help="Print the summaries as JSON")
+    args = parser.parse_args()
+
+    track = Track.load(args.track) if args.track else Track.oval()
+    if args.obstacles:
+        track.obstacles += random_obstacles(track, args.obstacles, duration=args.laps * 60, seed=args.seed)
+    print(f"🛤️ [TRACK SIM] {track.length:.0f} cm loop, {track.node_count} markers, "
+          f"{len(track.obstacles)} obstacle(s), {args.laps} lap(s) per speed (seed {args.seed})")
+
+    summaries = []
+    for speed in args.speeds:
+        report = TrackSimulation(track, motor_speed=speed, laps=args.laps, seed=args.seed,
+                                 ir_noise=args.noise, ir_spikes=args.spikes,
+                                 pass_time=args.pass_time).run(verbose=args.verbose)
+        summaries.append(report.summary())
+
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+    else:
+        print(f"\n{'speed':>6} {'laps':>5} {'driven':>6} {'lap p50':>8} {'losses/lap':>11} {'lost':>7} "
+              f"{'miss':>7} {'false':>7} {'collisions':>10}  result")
+        for s in summaries:
+            lap = s['lapTime']['p50']
+            print(f"{s['motorSpeed']:>6.2f} {s['lapsCompleted']:>2}/{s['laps']:<2} {s['lapsDriven']:>6} "
+                  f"{'-' if lap is None else f'{lap:.1f}s':>8} {s['lineLossesPerLap']:>11} "
+                  f"{s['lineLostFraction']:>7.1%} {s['markerMissRate']:>7.1%} "
+                  f"{s['falseMarkerRate']:>7.1%} {s['collisions']:>10}  "
+                  f"{s['aborted'] or 'ok'} ({s['wallSeconds']}s)")
@@ -0,0 +1,298 @@
+"""
+Workload Generator - Synthetic delivery traffic for the simulator
+
+Arrival processes (Poisson, bursty, time-of-day profile), room choice and
+sender/receiver response times, all seeded. Produces the request list that
+simulator.Simulation writes into its Firebase stand-in as time passes, or a
+JSON file of it.
+
+    python workload.py --rate 12 --hours 4                    # Poisson, JSON on stdout
+    python workload.py --spec busy_morning.json --seed 7 --out requests.json
+    python workload.py --history delivery_history.json --hours 24 --summary
+
+Spec file:
+{
+  "arrivals": {"process": "poisson", "rate": 10}
+           or {"process": "bursty", "rate": 10, "burstSize": 4, "burstSpread": 120}
+           or {"process": "profile", "history": "delivery_history.json", "scale": 1.5}
+           or {"process": "profile", "hourly": {"8": 20, "9": 14, "12": 6}},
+  "rooms": "uniform" or "history" or {"pickup": {"1": 3, "2": 1}, "destination": {"4": 1}},
+  "sender": {"dist": "lognormal", "median": 30, "sigma": 0.6},
+  "receiver": {"dist": "uniform", "low": 20, "high": 120},
+  "noShowRate": 0.02,
+  "priorityRate": 0.1
+}
+Rates are requests per hour. "history" is a /delivery_history export
+(the Firebase JSON object or a list of records).
+"""
+
+import json
+import math
+import random
+import time
+
+from route_planner import parse_timestamp
+from config import ROOM_COUNT
+
+
+# ---------- arrival processes ----------
+
+def poisson_arrivals(rate_per_hour, hours, rng):
+    """Seconds after start of a homogeneous Poisson process"""
+    arrivals = []
+    if rate_per_hour <= 0:
+        return arrivals
+    at = rng.expovariate(rate_per_hour / 3600)
+    while at < hours * 3600:
+        arrivals.append(at)
+        at += rng.expovariate(rate_per_hour / 3600)
+    return arrivals
+
+
+def bursty_arrivals(rate_per_hour, hours, rng, burst_size=4.0, burst_spread=120.0):
+    """Bursts at Poisson times, each with a geometric number of requests
+    (mean burst_size) spread over burst_spread seconds - same mean rate as
+    poisson_arrivals(rate_per_hour), much higher peaks"""
+    arrivals = []
+    for burst in poisson_arrivals(rate_per_hour / burst_size, hours, rng):
+        count = 1
+        while rng.random() > 1 / burst_size:
+            count += 1
+        arrivals += [burst + rng.uniform(0, burst_spread) for _ in range(count)]
+    return sorted(at for at in arrivals if at < hours * 3600)
+
+
+def profile_arrivals(profile, hours, rng, start):
+    """Non-homogeneous Poisson process following profile.rate(epoch) (thinning)"""
+    peak = profile.peak()
+    arrivals = []
+    for at in poisson_arrivals(peak, hours, rng):
+        if rng.random() * peak < profile.rate(start + at):
+            arrivals.append(at)
+    return arrivals
+
+
+class HourlyProfile:
+    """Requests per hour by (weekday, hour) in local time"""
+
+    def __init__(self, rates):
+        self.rates = dict(rates)  # (weekday, hour): requests/hour
+
+    @classmethod
+    def daily(cls, hourly, scale=1.0):
+        """Same shape every day: {hour: requests/hour}"""
+        return cls({(weekday, int(hour)): rate * scale
+                    for weekday in range(7) for hour, rate in hourly.items()})
+
+    @classmethod
+    def from_history(cls, history, scale=1.0):
+        """Average requests per hour of each weekday/hour slot over the weeks
+        the history covers"""
+        created = [t for t in (parse_timestamp(r.get('createdAt')) for r in history) if t is not None]
+        if not created:
+            raise ValueError("history has no createdAt timestamps")
+        weeks = max(1.0, (max(created) - min(created)) / (7 * 86400))
+        counts = {}
+        for t in created:
+            local = time.localtime(t)
+            slot = (local.tm_wday, local.tm_hour)
+            counts[slot] = counts.get(slot, 0) + 1
+        return cls({slot: count / weeks * scale for slot, count in counts.items()})
+
+    def rate(self, epoch):
+        local = time.localtime(epoch)
+        return self.rates.get((local.tm_wday, local.tm_hour), 0.0)
+
+    def peak(self):
+        return max(self.rates.values(), default=0.0)
+
+
+# ---------- rooms and response times ----------
+
+class RoomChoice:
+    """Weighted pickup and destination rooms (never the same room twice)"""
+
+    def __init__(self, pickup, destination=None):
+        self.pickup = {int(room): w for room, w in pickup.items() if w > 0}
+        self.destination = {int(room): w for room, w in (destination or pickup).items() if w > 0}
+        if not self.pickup or len(set(self.pickup) | set(self.destination)) < 2:
+            raise ValueError("room weights need at least two rooms")
+
+    @classmethod
+    def uniform(cls, rooms=None):
+        rooms = rooms or range(1, ROOM_COUNT + 1)
+        return cls({room: 1.0 for room in rooms})
+
+    @classmethod
+    def from_history(cls, history):
+        pickup, destination = {}, {}
+        for record in history:
+            for field, counts in (('pickup', pickup), ('destination', destination)):
+                if record.get(field) is not None:
+                    room = int(record[field])
+                    counts[room] = counts.get(room, 0) + 1
+        return cls(pickup, destination)
+
+    def draw(self, rng):
+        pickup = _weighted(self.pickup, rng)
+        destinations = {room: w for room, w in self.destination.items() if room != pickup}
+        if not destinations:
+            destinations = {room: 1.0 for room in self.pickup if room != pickup}
+        return pickup, _weighted(destinations, rng)
+
+
+def _weighted(weights, rng):
+    rooms = sorted(weights)
+    return rng.choices(rooms, weights=[weights[room] for room in rooms])[0]
+
+
+def response_time(spec, rng):
+    """Seconds drawn from {'dist': 'uniform'|'exponential'|'lognormal'|'fixed', ...}"""
+    dist = spec.get('dist', 'uniform')
+    if dist == 'uniform':
+        return rng.uniform(spec.get('low', 0.0), spec['high'])
+    if dist == 'exponential':
+        return spec.get('low', 0.0) + rng.expovariate(1 / spec['mean'])
+    if dist == 'lognormal':
+        return rng.lognormvariate(math.log(spec['median']), spec.get('sigma', 0.5))
+    if dist == 'fixed':
+        return float(spec['seconds'])
+    raise ValueError(f"Unknown response time distribution {dist!r}")
+
+
+# ---------- workload ----------
+
+class Workload:
+    """Arrivals + rooms + response times; generate() is deterministic per seed.
+
+    sender / receiver: response_time specs (None leaves the draw to the
+    simulator's defaults); no_show_rate: share of senders that never come
+    (None = simulator default); priority_rate: share of 'urgent' requests.
+    """
+
+    def __init__(self, arrivals, rooms=None, sender=None, receiver=None,
+                 no_show_rate=None, priority_rate=0.0):
+        self.arrivals = arrivals  # callable(hours, rng, start) → [seconds after start]
+        self.rooms = rooms or RoomChoice.uniform()
+        self.sender = sender
+        self.receiver = receiver
+        self.no_show_rate = no_show_rate
+        self.priority_rate = priority_rate
+
+    @classmethod
+    def poisson(cls, rate_per_hour, **kwargs):
+        return cls(lambda hours, rng, start: poisson_arrivals(rate_per_hour, hours, rng), **kwargs)
+
+    @classmethod
+    def bursty(cls, rate_per_hour, burst_size=4.0, burst_spread=120.0, **kwargs):
+        return cls(lambda hours, rng, start: bursty_arrivals(rate_per_hour, hours, rng,
+                                                             burst_size, burst_spread), **kwargs)
+
+    @classmethod
+    def profile(cls, profile, **kwargs):
+        return cls(lambda hours, rng, start: profile_arrivals(profile, hours, rng, start), **kwargs)
+
+    @classmethod
+    def from_spec(cls, spec, history=None):
+        """Workload from a spec dict (see the module docstring)"""
+        arrivals = spec.get('arrivals', {'process': 'poisson', 'rate': 6})
+        process = arrivals.get('process', 'poisson')
+
+        def needs_history():
+            nonlocal history
+            if history is None:
+                if 'history' not in arrivals:
+                    raise ValueError("spec uses the delivery history but none was given")
+                history = load_history(arrivals['history'])
+            return history
+
+        rooms = spec.get('rooms', 'uniform')
+        if rooms == 'history':
+            rooms = RoomChoice.from_history(needs_history())
+        elif rooms == 'uniform':
+            rooms = RoomChoice.uniform()
+        else:
+            rooms = RoomChoice(rooms['pickup'], rooms.get('destination'))
+
+        options = dict(rooms=rooms, sender=spec.get('sender'), receiver=spec.get('receiver'),
+                       no_show_rate=spec.get('noShowRate'), priority_rate=spec.get('priorityRate', 0.0))
+        if process == 'poisson':
+            return cls.poisson(arrivals['rate'], **options)
+        if process == 'bursty':
+            return cls.bursty(arrivals['rate'], arrivals.get('burstSize', 4.0),
+                              arrivals.get('burstSpread', 120.0), **options)
+        if process == 'profile':
+            scale = arrivals.get('scale', 1.0)
+            if 'hourly' in arrivals:
+                profile = HourlyProfile.daily({int(h): r for h, r in arrivals['hourly'].items()}, scale)
+            else:
+                profile = HourlyProfile.from_history(needs_history(), scale)
+            return cls.profile(profile, **options)
+        raise ValueError(f"Unknown arrival process {process!r}")
+
+    def generate(self, hours, start, seed=0):
+        """Requests for simulator.Simulation: {'at', 'pickup', 'destination',
+        optional 'senderDelay', 'receiverDelay', 'noShow', 'priority'}"""
+        rng = random.Random(seed)
+        requests = []
+        for at in self.arrivals(hours, rng, start):
+            pickup, destination = self.rooms.draw(rng)
+            request = {'at': at, 'pickup': pickup, 'destination': destination}
+            if self.sender is not None:
+                request['senderDelay'] = response_time(self.sender, rng)
+            if self.receiver is not None:
+                request['receiverDelay'] = response_time(self.receiver, rng)
+            if self.no_show_rate is not None:
+                request['noShow'] = rng.random() < self.no_show_rate
+            if self.priority_rate and rng.random() < self.priority_rate:
+                request['priority'] = 'urgent'
+            requests.append(request)
+        return requests
+
+
+def load_history(path):
+    """Records of a /delivery_history export (object keyed by id, or a list)"""
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = list(data.values())
+    return [record for record in data if isinstance(record, dict)]
+
+
+if __name__ == "__main__":
+    import argparse
+    from simulator import DEFAULT_START
+
+    parser = argparse.ArgumentParser(description="Generate synthetic delivery requests")
+    parser.add_argument('--spec', help="Workload spec JSON (default: Poisson at --rate)")
+    parser.add_argument('--history', help="delivery_history export for a time-of-day profile")
+    parser.add_argument('--rate', type=float, default=6.0, help="Requests per hour (Poisson)")
+    parser.add_argument('--hours', type=float, default=8.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="Write the requests here instead of stdout")
+    parser.add_argument('--summary', action='store_true', help="Print requests per hour only")
+    args = parser.parse_args()
+
+    history = load_history(args.history) if args.history else None
+    if args.spec:
+        with open(args.spec) as f:
+            workload = Workload.from_spec(json.load(f), history)
+    elif history is not None:
+        workload = Workload.profile(HourlyProfile.from_history(history),
+                                    rooms=RoomChoice.from_history(history))
+    else:
+        workload = Workload.poisson(args.rate)
+
+    requests = workload.generate(args.hours, DEFAULT_START, args.seed)
+    if args.summary:
+        print(f"📦 {len(requests)} requests in {args.hours}h (seed {args.seed})")
+        for hour in range(math.ceil(args.hours)):
+            count = sum(1 for r in requests if hour * 3600 <= r['at'] < (hour + 1) * 3600)
+            label = time.strftime('%a %H:00', time.localtime(DEFAULT_START + hour * 3600))
+            print(f"   {label}  {'█' * count} {count}")
+    elif args.out:
+        with open(args.out, 'w') as f:
+            json.dump(requests, f, indent=2)
+        print(f"✓ {len(requests)} requests written to {args.out}")
+    else:
+        print(json.dumps(requests, indent=2))